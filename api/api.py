@@ -1,8 +1,10 @@
 ########################################################################################################################
 #
 ########################################################################################################################
+from .tree.compiledfilter   import CompiledFilter
 from requests.models        import Response
 from network.communicator   import Communicator
+from urllib.parse           import quote, unquote
 
 
 ########################################################################################################################
@@ -21,7 +23,32 @@ class API:
         if not url.endswith('?'):
             url += '?'
 
-        return url + ('&'.join([f'{k}={v}' for k,v in params.items()]))
+        return url + '&'.join(f'{quote(str(k), safe="")}={API.encode_param(v)}' for k,v in params.items())
+
+    ####################################################################################################################
+    # compiled filters carry their own encoding, anything else is encoded here
+    ####################################################################################################################
+    @staticmethod
+    def encode_param(value) -> str:
+        if isinstance(value, CompiledFilter):
+            return value.encoded
+
+        return quote(str(value), safe='')
+
+    ####################################################################################################################
+    # full job name -> what goes after the first /job/ of its url, so "folder/job" becomes "folder/job/job"
+    ####################################################################################################################
+    @staticmethod
+    def job_path(job_name:str) -> str:
+        return '/job/'.join(quote(part, safe='') for part in job_name.split('/'))
+
+    ####################################################################################################################
+    # inverse of job_path, takes a job url relative to the server root such as "job/folder/job/job/"
+    ####################################################################################################################
+    @staticmethod
+    def job_name(url:str) -> str:
+        parts = url.strip('/').split('/')
+        return '/'.join(unquote(name) for kind, name in zip(parts[0::2], parts[1::2]) if kind == 'job')
 
     ####################################################################################################################
     #
@@ -31,16 +58,26 @@ class API:
         self.url_base = url_base
         self.format:str = format
 
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def url(self, url:str, params:dict[str,str]={}) -> str:
+        return self.__apply_params(url=(self.url_base + url), params=params)
+
     ####################################################################################################################
     #
     ####################################################################################################################
     def get(self, url:str, params:dict[str,str]={}) -> Response:
-        url = self.__apply_params(url=(self.url_base + url), params=params)
-        return self.communicator.get(url)
+        return self.communicator.get(self.url(url, params=params))
+
+    ####################################################################################################################
+    # GET that reads the body as it is consumed, bypassing any response cache
+    ####################################################################################################################
+    def stream(self, url:str, params:dict[str,str]={}) -> Response:
+        return self.communicator.stream(self.url(url, params=params))
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def post(self, url:str, params:dict[str,str]={}) -> Response:
-        url = self.__apply_params(url=(self.url_base + url), params=params)
-        return self.communicator.post(url)
+        return self.communicator.post(self.url(url, params=params))
@@ -0,0 +1,29 @@
+########################################################################################################################
+#
+########################################################################################################################
+from api.api                        import API
+from network.asynccommunicator      import AsyncResponse
+
+
+########################################################################################################################
+# Same url handling as API, but requests go through an AsyncCommunicator and have to be awaited
+########################################################################################################################
+class AsyncAPI(API):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def get(self, url:str, params:dict[str,str]={}) -> AsyncResponse:
+        return await self.communicator.get(self.url(url, params=params))
+
+    ####################################################################################################################
+    # responses are read whole by AsyncCommunicator, which never caches, so this is a plain GET
+    ####################################################################################################################
+    async def stream(self, url:str, params:dict[str,str]={}) -> AsyncResponse:
+        return await self.communicator.get(self.url(url, params=params))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def post(self, url:str, params:dict[str,str]={}) -> AsyncResponse:
+        return await self.communicator.post(self.url(url, params=params))
@@ -0,0 +1,95 @@
+########################################################################################################################
+#
+########################################################################################################################
+from .asynctreeapi                  import AsyncTreeAPI
+from .buildapi                      import BuildAPI
+from .computerapi                   import ComputerAPI
+from .crumbapi                      import CrumbAPI
+from .hostapi                       import HostAPI
+from .jobapi                        import JobAPI
+from .peopleapi                     import PeopleAPI
+from .queueapi                      import QueueAPI
+
+from decoding                       import Decoder
+from metrics                        import endpoint
+from network.asynccommunicator      import AsyncCommunicator
+
+
+########################################################################################################################
+# The endpoint methods are inherited untouched, they return the coroutine from AsyncTreeAPI.get/post
+########################################################################################################################
+class AsyncHostAPI(AsyncTreeAPI, HostAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncBuildAPI(AsyncTreeAPI, BuildAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncJobAPI(AsyncTreeAPI, JobAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncQueueAPI(AsyncTreeAPI, QueueAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncComputerAPI(AsyncTreeAPI, ComputerAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncPeopleAPI(AsyncTreeAPI, PeopleAPI):
+    pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncCrumbAPI(AsyncTreeAPI, CrumbAPI):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @endpoint(name='CrumbAPI.crumb')
+    async def crumb(self) -> tuple[str,str]:
+        return self.crumb_from_response(await self.get(self.crumb_extension))
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class AsyncJenkinsAPI:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self,url_base:str,communicator:AsyncCommunicator,decoder:Decoder=None):
+
+        self.host_api:AsyncHostAPI          = AsyncHostAPI(     url_base=url_base, communicator=communicator)
+        self.build_api:AsyncBuildAPI        = AsyncBuildAPI(    url_base=url_base, communicator=communicator)
+        self.crumb_api:AsyncCrumbAPI        = AsyncCrumbAPI(    url_base=url_base, communicator=communicator)
+        self.job_api:AsyncJobAPI            = AsyncJobAPI(      url_base=url_base, communicator=communicator)
+        self.queue_api:AsyncQueueAPI        = AsyncQueueAPI(    url_base=url_base, communicator=communicator)
+        self.computer_api:AsyncComputerAPI  = AsyncComputerAPI( url_base=url_base, communicator=communicator)
+        self.people_api:AsyncPeopleAPI      = AsyncPeopleAPI(   url_base=url_base, communicator=communicator)
+
+        # see JenkinsAPI
+        self.decoder:Decoder = decoder if decoder is not None else Decoder()
+
+        # the communicator asks for a crumb the first time it has to POST
+        communicator.set_crumb_provider(self.crumb_api.crumb)
@@ -0,0 +1,21 @@
+########################################################################################################################
+#
+########################################################################################################################
+from .asyncapi                      import AsyncAPI
+from .treeapi                       import TreeAPI
+from .tree.compiledfilter           import CompiledFilter
+from .tree.filterlist               import FilterList
+from network.asynccommunicator      import AsyncResponse
+
+
+########################################################################################################################
+# Endpoint classes mix this in ahead of their synchronous counterpart, e.g. AsyncJobAPI(AsyncTreeAPI, JobAPI), so
+# they keep the same url templates while every get/post becomes awaitable
+########################################################################################################################
+class AsyncTreeAPI(AsyncAPI, TreeAPI):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def get(self, url:str, params:dict[str,str]={}, filter:FilterList|CompiledFilter=None, depth=0) -> AsyncResponse:
+        return await super().get(url, params=self.tree_params(params, filter=filter, depth=depth))
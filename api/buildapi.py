@@ -5,6 +5,7 @@ from api.tree.filterlist    import FilterList
 from network.communicator   import Communicator
 from api.treeapi            import TreeAPI
 from requests.models        import Response
+from metrics                import endpoint
 
 
 ########################################################################################################################
@@ -23,27 +24,43 @@ class BuildAPI(TreeAPI):
         self.stop_extension:str         = f'{self.job_extension}/{{1}}/stop'
         self.kill_extension:str         = f'{self.job_extension}/{{1}}/kill'
         self.terminate_extension:str    = f'{self.job_extension}/{{1}}/term'
+        self.progressive_text_extension = f'{self.job_extension}/{{1}}/logText/progressiveText'
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def stop(self, job_name:str, build_id:int) -> Response:
-        return self.post(self.stop_extension.format(job_name, build_id))
+        return self.post(self.stop_extension.format(self.job_path(job_name), build_id))
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def kill(self, job_name:str, build_id:int) -> Response:
-        return self.post(self.kill_extension.format(job_name, build_id))
+        return self.post(self.kill_extension.format(self.job_path(job_name), build_id))
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def terminate(self, job_name:str, build_id:int) -> Response:
-        return self.post(self.terminate_extension.format(job_name, build_id))
+        return self.post(self.terminate_extension.format(self.job_path(job_name), build_id))
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, job_name:str, build_id:int, **kwargs) -> Response:
-        return self.get(self.info_extension.format(job_name, build_id), **kwargs)
+        return self.get(self.info_extension.format(self.job_path(job_name), build_id), **kwargs)
+
+    ####################################################################################################################
+    # console output from byte offset start onwards.  X-Text-Size in the response is the offset to ask for next, and
+    # X-More-Data is set while the build can still write more
+    ####################################################################################################################
+    @endpoint
+    def progressive_text(self, job_name:str, build_id:int, start:int=0) -> Response:
+        return self.stream(
+            self.progressive_text_extension.format(self.job_path(job_name), build_id),
+            params={'start': start}
+        )
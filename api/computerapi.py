@@ -4,6 +4,7 @@
 from requests.models        import Response
 from network.communicator   import Communicator
 from api.treeapi            import TreeAPI
+from metrics                import endpoint
 
 
 ########################################################################################################################
@@ -22,5 +23,6 @@ class ComputerAPI(TreeAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, **kwargs) -> Response:
         return self.get(self.info_extension, **kwargs)
@@ -4,6 +4,7 @@
 from api.hostapi            import HostAPI
 from requests.models        import Response
 from network.communicator   import Communicator
+from metrics                import endpoint
 import json
 
 ########################################################################################################################
@@ -21,10 +22,16 @@ class CrumbAPI(HostAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def crumb(self) -> tuple[str,str]:
-        resp:Response = self.get(self.crumb_extension)
+        return self.crumb_from_response(self.get(self.crumb_extension))
 
-        if resp.status_code != 200:
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def crumb_from_response(resp:Response) -> tuple[str,str]:
+        if resp is None or resp.status_code != 200:
             return (None, None)
 
         # unpack crumb data and store
@@ -3,6 +3,7 @@
 ########################################################################################################################
 from requests.models    import Response
 from api.treeapi        import TreeAPI
+from metrics            import endpoint
 
 ########################################################################################################################
 #
@@ -18,6 +19,7 @@ class HostAPI(TreeAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, **kwargs) -> Response:
         return self.get(self.format, **kwargs)
 
@@ -9,6 +9,8 @@ from .queueapi      import QueueAPI
 from .computerapi   import ComputerAPI
 from .peopleapi     import PeopleAPI
 
+from decoding               import Decoder
+
 from network.communicator   import Communicator
 
 
@@ -20,7 +22,7 @@ class JenkinsAPI:
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __init__(self,url_base:str,communicator:Communicator):
+    def __init__(self,url_base:str,communicator:Communicator,decoder:Decoder=None):
 
         self.host_api:HostAPI           = HostAPI(      url_base=url_base, communicator=communicator)
         self.build_api:BuildAPI         = BuildAPI(     url_base=url_base, communicator=communicator)
@@ -29,3 +31,9 @@ class JenkinsAPI:
         self.queue_api:QueueAPI         = QueueAPI(     url_base=url_base, communicator=communicator)
         self.computer_api:ComputerAPI   = ComputerAPI(  url_base=url_base, communicator=communicator)
         self.people_api:PeopleAPI       = PeopleAPI(    url_base=url_base, communicator=communicator)
+
+        # turns response bodies into dicts, or records for the shapes it knows
+        self.decoder:Decoder = decoder if decoder is not None else Decoder()
+
+        # the communicator asks for a crumb the first time it has to POST
+        communicator.set_crumb_provider(self.crumb_api.crumb)
@@ -5,6 +5,7 @@ from requests.models        import Response
 from network.communicator   import Communicator
 from api.treeapi            import TreeAPI
 from .tree.filterlist       import FilterList
+from metrics                import endpoint
 
 
 ########################################################################################################################
@@ -25,20 +26,23 @@ class JobAPI(TreeAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def build(self, job_name:str, params:dict[str,str]={}) -> Response:
         if params != {}:
             return self.build_with_parameters(job_name=job_name, params=params)
         else:
-            return self.post(self.build_extension.format(job_name))
+            return self.post(self.build_extension.format(self.job_path(job_name)))
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def build_with_parameters(self, job_name:str, params:dict) -> Response:
-        return self.post(self.parameter_build_extension.format(job_name), params=params)
+        return self.post(self.parameter_build_extension.format(self.job_path(job_name)), params=params)
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, job_name:str, **kwargs) -> Response:
-        return self.get(self.info_extension.format(job_name), **kwargs)
+        return self.get(self.info_extension.format(self.job_path(job_name)), **kwargs)
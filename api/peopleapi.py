@@ -4,6 +4,7 @@
 from requests.models        import Response
 from network.communicator   import Communicator
 from api.treeapi            import TreeAPI
+from metrics                import endpoint
 
 
 ########################################################################################################################
@@ -24,17 +25,20 @@ class PeopleAPI(TreeAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def user_info(self, username:str, **kwargs) -> Response:
         return self.get(self.user_extension.format(username), **kwargs)
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def user_configure(self, username:str, **kwargs) -> Response:
         return self.get(self.user_configure_extension.format(username), **kwargs)
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, **kwargs) -> Response:
         return self.get(self.info_extension, **kwargs)
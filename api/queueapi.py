@@ -5,6 +5,7 @@ from requests.models        import Response
 from network.communicator   import Communicator
 from api.treeapi            import TreeAPI
 from .tree.filterlist       import FilterList
+from metrics                import endpoint
 
 ########################################################################################################################
 #
@@ -22,11 +23,13 @@ class QueueAPI(TreeAPI):
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def info(self, **kwargs) -> Response:
         return self.get(self.info_extension, **kwargs)
 
     ####################################################################################################################
     #
     ####################################################################################################################
+    @endpoint
     def item_info(self, queue_id:int, **kwargs) -> Response:
         return  self.get(self.item_info_extension.format(queue_id), **kwargs)
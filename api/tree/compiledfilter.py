@@ -0,0 +1,58 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    threading               import Lock
+from    urllib.parse            import quote
+from    weakref                 import WeakValueDictionary
+
+
+########################################################################################################################
+# Immutable form of a FilterList, made by FilterList.compile().  The tree string and its url encoded form are worked out
+# once, and every filter of the same shape is the same object so it can be shared freely between threads and instances
+########################################################################################################################
+class CompiledFilter:
+
+    __slots__ = ('tree', 'encoded', '__weakref__')
+
+    # tree string -> the one CompiledFilter for it, dropped once nobody holds on to it
+    __interned:WeakValueDictionary = WeakValueDictionary()
+    __interned_lock:Lock = Lock()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __new__(cls, tree:str):
+        with cls.__interned_lock:
+            compiled = cls.__interned.get(tree)
+
+            if compiled is None:
+                compiled = super().__new__(cls)
+                object.__setattr__(compiled, 'tree', tree)
+                object.__setattr__(compiled, 'encoded', quote(tree, safe=''))
+                cls.__interned[tree] = compiled
+
+            return compiled
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __str__(self) -> str:
+        return self.tree
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.tree!r})"
+
+    ####################################################################################################################
+    # already interned, so compiling again is a no-op
+    ####################################################################################################################
+    def compile(self) -> 'CompiledFilter':
+        return self
@@ -1,7 +1,8 @@
 ########################################################################################################################
 #
 ########################################################################################################################
-from .filternode import FilterNode
+from .compiledfilter    import CompiledFilter
+from .filternode        import FilterNode
 
 
 ########################################################################################################################
@@ -9,6 +10,8 @@ from .filternode import FilterNode
 ########################################################################################################################
 class FilterList:
 
+    __slots__ = ('filters',)
+
     ####################################################################################################################
     #
     ####################################################################################################################
@@ -21,6 +24,12 @@ class FilterList:
     def __str__(self) -> str:
         return f"{','.join([str(f) for f in self.filters])}"
 
+    ####################################################################################################################
+    # freeze the current shape, the result is shared with every other filter of the same shape
+    ####################################################################################################################
+    def compile(self) -> CompiledFilter:
+        return CompiledFilter(str(self))
+
     ####################################################################################################################
     #
     ####################################################################################################################
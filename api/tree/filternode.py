@@ -3,6 +3,8 @@
 ########################################################################################################################
 class FilterNode:
 
+    __slots__ = ('name', 'lower_bound', 'upper_bound', 'all', 'parent', 'children')
+
     ####################################################################################################################
     #
     ####################################################################################################################
@@ -37,7 +39,7 @@ class FilterNode:
             bound = f"{{{self.lower_bound},}}"
         # user specified only upper bound
         elif self.upper_bound is not None:
-            bound = f",{{{self.upper_bound}}}"
+            bound = f"{{,{self.upper_bound}}}"
         else:
             bound = ""
 
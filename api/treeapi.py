@@ -3,7 +3,8 @@
 ########################################################################################################################
 from .api                   import API
 from network.communicator   import Communicator
-from .tree.filterlist        import FilterList
+from .tree.compiledfilter   import CompiledFilter
+from .tree.filterlist       import FilterList
 from .tree.filternode        import FilterNode
 from requests.models        import Response
 
@@ -22,14 +23,21 @@ class TreeAPI(API):
     ####################################################################################################################
     #
     ####################################################################################################################
-    def get(self, url:str, params:dict[str,str]={}, filter:FilterList=None, depth=0) -> Response:
+    @staticmethod
+    def tree_params(params:dict[str,str]={}, filter:FilterList|CompiledFilter=None, depth=0) -> dict[str,str]:
 
         local_params = dict(params)
 
         local_params['depth'] = depth
 
-        # apply tree filter if any
+        # apply tree filter if any.  Compiled filters are passed through as is so their cached encoding is used
         if filter:
-            local_params['tree'] = f'{str(filter)}'
+            local_params['tree'] = filter if isinstance(filter, CompiledFilter) else str(filter)
 
-        return super().get(url, params=local_params)
+        return local_params
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get(self, url:str, params:dict[str,str]={}, filter:FilterList|CompiledFilter=None, depth=0) -> Response:
+        return super().get(url, params=self.tree_params(params, filter=filter, depth=depth))
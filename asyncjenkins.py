@@ -0,0 +1,375 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    api.asyncjenkinsapi             import AsyncJenkinsAPI
+
+import  asyncio
+from    decoding                        import SHAPE_JOB, Decoder
+from    discovery                       import JobDiscovery
+from    exceptions                      import CommunicationError, InvalidResponse
+from    jobinstance                     import JobInstance
+from    metrics                         import Metrics
+from    network.asynccommunicator       import AsyncCommunicator, AsyncResponse
+from    job                             import Job
+from    queuetracker                    import QueueTracker
+from    scheduler                       import HOST_POLL_KEY, PollScheduler
+import  time
+from    typing                          import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# asyncio counterpart of Jenkins.  The poller is a task on the running loop and every request goes through a pooled
+# AsyncCommunicator, so any number of controllers can be followed from one thread.  Job and JobInstance are reused for
+# state, but their own blocking request methods (update, spawn_instance, stop, ...) must not be called, use the
+# coroutines on this class instead
+########################################################################################################################
+class AsyncJenkins:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        url_base:str,
+        username:str,
+        password:str=None,
+        api_token:str=None,
+        api_token_file:str=None,
+        max_history:int=100,
+        active_poll_interval:float=.25,
+        max_poll_interval:float=30.0,
+        poll_backoff:float=2.0,
+        pool_size:int=10,
+        connect_timeout:float=5.0,
+        read_timeout:float=30.0,
+        metrics:Metrics=None,
+        decoder:Decoder=None,
+        folder_depth:int=3
+    ):
+
+        # request, poll and tracking metrics, see Jenkins
+        self.metrics:Metrics = metrics if metrics is not None else Metrics()
+
+        # Create the communicator
+        self.communicator = AsyncCommunicator(
+            username=username,
+            password=password,
+            api_token=api_token,
+            api_token_file=api_token_file,
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            metrics=self.metrics
+        )
+
+        # create the api
+        self.api:AsyncJenkinsAPI = AsyncJenkinsAPI(
+            url_base=url_base,
+            communicator=self.communicator,
+            decoder=decoder
+        )
+
+        # list of jobs that we have
+        self.jobs:dict[str, Job] = {}
+
+        self.max_history:int = max_history
+
+        # walks folders for jobs, every job with its most recent builds.  See Jenkins, this is its tree mode
+        self.discovery:JobDiscovery = JobDiscovery(
+            max_depth=folder_depth,
+            leaf_fields=lambda node: Job.add_builds_filter(node, self.max_history),
+            refetch_all=True
+        )
+
+        self.scheduler:PollScheduler = PollScheduler(
+            active_interval=active_poll_interval,
+            max_interval=max_poll_interval,
+            backoff=poll_backoff
+        )
+
+        # resolves every queued instance from a single /queue request
+        self.queue_tracker:QueueTracker = QueueTracker(self.api)
+
+        self.job_change_listeners:list[Callable[[Job, bool]]] = []
+
+        self.metrics.tracked_jobs.set_function(lambda: len(self.jobs))
+        self.metrics.tracked_instances.set_function(
+            lambda: sum(len(job.store) for job in list(self.jobs.values()))
+        )
+
+        # created in start() so they belong to the running loop
+        self.initialized:asyncio.Event  = None
+        self.poll_wakeup:asyncio.Event  = None
+        self.poll_task:asyncio.Task     = None
+        self.poll_exit:bool             = False
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def start(self):
+        if self.poll_task is not None:
+            return
+
+        self.initialized    = asyncio.Event()
+        self.poll_wakeup    = asyncio.Event()
+        self.poll_exit      = False
+        self.poll_task      = asyncio.create_task(self.__poll_entry(), name='AsyncJenkinsPoller')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def stop(self):
+        if self.poll_task is not None:
+            # before Python 3.12 asyncio.wait_for() can swallow a cancel that arrives as what it waits on completes, the
+            # poller may carry on after it.  It still stops at the end of its cycle
+            self.poll_exit = True
+            self.poll_wakeup.set()
+            self.poll_task.cancel()
+            try:
+                await self.poll_task
+            except asyncio.CancelledError:
+                pass
+            self.poll_task = None
+
+        await self.communicator.close()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def wait_initialized(self):
+        await self.initialized.wait()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __poll_entry(self):
+
+        self.scheduler.reset(HOST_POLL_KEY)
+
+        while not self.poll_exit:
+
+            # a wakeup while we poll isn't lost, the next sleep ends straight away
+            self.poll_wakeup.clear()
+
+            if HOST_POLL_KEY in self.scheduler.due():
+                start = time.monotonic()
+                await self.__poll_tree()
+                self.metrics.poll_cycle_seconds.observe(time.monotonic() - start, 'tree')
+
+            self.initialized.set()
+
+            # sleep until the next deadline, a spawned instance wakes us up early
+            try:
+                await asyncio.wait_for(self.poll_wakeup.wait(), timeout=self.scheduler.time_until_next())
+            except asyncio.TimeoutError:
+                pass
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __poll_tree(self):
+
+        changed = False
+        try:
+            found, changed = await self.__discover(
+                self.__validate(await self.api.host_api.info(filter=self.discovery.filter))
+            )
+
+            for job_name, job_data in found.items():
+                job = self.jobs.get(job_name)
+                if job is None:
+                    continue
+
+                changed |= job.from_json(job_data, refresh_instances=False)
+
+        except (InvalidResponse, CommunicationError):
+            pass
+
+        # instances still sitting in the queue don't show up in the builds list yet, ask the queue about them
+        changed |= await self.__update_queue()
+
+        self.scheduler.reschedule(
+            HOST_POLL_KEY,
+            active=any(job.has_active_builds() for job in self.jobs.values()),
+            changed=changed
+        )
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __update_queue(self) -> bool:
+        if len(self.queue_tracker) == 0:
+            return False
+
+        try:
+            changed, vanished = self.queue_tracker.from_response(
+                await self.api.queue_api.info(filter=self.queue_tracker.queue_filter)
+            )
+        except (InvalidResponse, CommunicationError):
+            return False
+
+        return changed | any(await asyncio.gather(*(self.__update_queued(inst) for inst in vanished)))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __update_queued(self, inst:JobInstance) -> bool:
+        try:
+            return inst.from_queue_response(
+                await self.api.queue_api.item_info(queue_id=inst.queue_id, filter=inst.queue_filter)
+            )
+        except (InvalidResponse, CommunicationError):
+            return False
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __validate(self, response:AsyncResponse) -> dict:
+        if response is None or response.status_code != 200:
+            raise InvalidResponse("Invalid Response")
+
+        # only ever given responses to the discovery filter
+        return self.api.decoder.decode(response, SHAPE_JOB)
+
+    ####################################################################################################################
+    # walk the folders from the host level response, see Jenkins.  The folders out of reach of it are fetched a level
+    # at a time, each level all at once.  Returns the data of every job seen keyed by full name, and whether any job was
+    # added or removed
+    ####################################################################################################################
+    async def __discover(self, data:dict) -> tuple[dict[str, dict], bool]:
+        found:dict[str, dict] = {}
+
+        folders_changed, pending = self.discovery.walk(data, found)
+
+        while len(pending) > 0:
+            changed, pending = self.discovery.walk_folders(
+                pending,
+                await asyncio.gather(*(self.__fetch_folder(path) for path in pending)),
+                found
+            )
+            folders_changed |= changed
+
+        # nothing moved, no need to diff every job we know about
+        if not folders_changed:
+            return found, False
+
+        return found, self.__jobs_from_names(self.discovery.job_names())
+
+    ####################################################################################################################
+    # None if the folder couldn't be fetched, discovery tries it again next time
+    ####################################################################################################################
+    async def __fetch_folder(self, path:str) -> dict:
+        try:
+            return self.__validate(await self.api.job_api.info(job_name=path, filter=self.discovery.filter))
+        except (InvalidResponse, CommunicationError):
+            return None
+
+    ####################################################################################################################
+    # returns True if any job was added or removed
+    ####################################################################################################################
+    def __jobs_from_names(self, job_names:set[str]) -> bool:
+
+        jobs_to_add     = list(set(job_names).difference(set(self.jobs.keys())))
+        jobs_to_remove  = list(set(self.jobs.keys()).difference(set(job_names)))
+
+        for job in jobs_to_remove:
+            for c in self.job_change_listeners:
+                c(job, False)
+            del self.jobs[job]
+
+        for job in jobs_to_add:
+            self.jobs[job] = self.__create_job(job)
+            for c in self.job_change_listeners:
+                c(self.jobs[job], True)
+
+        return len(jobs_to_add) > 0 or len(jobs_to_remove) > 0
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __create_job(self, job_name:str) -> Job:
+        job:Job = Job(
+            name=job_name,
+            api=self.api,
+            max_history=self.max_history
+        )
+
+        job.register_spawn(self.__on_spawn)
+
+        return job
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __on_spawn(self, job:Job, job_instance:JobInstance):
+        self.queue_tracker.track(job_instance)
+        self.scheduler.reset(HOST_POLL_KEY)
+        if self.poll_wakeup is not None:
+            self.poll_wakeup.set()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get_job(self, job_name:str) -> Job:
+        if job_name not in self.jobs:
+            self.jobs[job_name] = self.__create_job(job_name)
+
+        return self.jobs[job_name]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def start_job_instance(
+        self,
+        job_name:str,
+        job_params_kvp:list=[],
+        job_params_dict:dict={},
+        status_callback:Callable[[JobInstance], None]=None
+    ) -> JobInstance:
+
+        # Copy of the passed in dict so we don't modify the source
+        params = dict(job_params_dict)
+
+        # split on '=' and push into params
+        for param in job_params_kvp:
+            key,value = param.split('=')
+            params[key] = value
+
+        job:Job = self.get_job(job_name)
+
+        return job.from_spawn_response(await self.api.job_api.build(job_name, params=params), status_callback)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def stop_instance(self, job_instance:JobInstance) -> AsyncResponse:
+        if not job_instance.complete:
+            return await self.api.build_api.stop(job_name=job_instance.name, build_id=job_instance.build_id)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def job_list(self) -> list[str]:
+        return list(self.jobs.keys())
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def register_job_change(self, callback:Callable[[Job, bool], None]):
+        self.job_change_listeners.append(callback)
@@ -0,0 +1,108 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    concurrent.futures      import Future, ThreadPoolExecutor
+import  csv
+import  json
+from    jobinstance             import JobInstance
+from    network.ratelimiter     import RateLimiter
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# Starts many builds at once.  Requests are submitted from a pool of max_in_flight threads, optionally capped to
+# requests_per_second, and identical (job, params) pairs are only started once.  A JobInstance can't exist before the
+# server hands out its queue id, so callers get a Future for each one straight away
+########################################################################################################################
+class BatchLauncher:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        spawn:Callable[[str, dict, Callable[[JobInstance], None]], JobInstance],
+        max_in_flight:int=8,
+        requests_per_second:float=None
+    ):
+        # starts a single build and returns its instance, or None if the server refused
+        self.spawn = spawn
+
+        self.executor:ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_in_flight,
+            thread_name_prefix='BatchLauncher'
+        )
+
+        self.rate_limiter:RateLimiter = None
+        if requests_per_second is not None:
+            self.rate_limiter = RateLimiter(rate=requests_per_second, burst=max_in_flight)
+
+    ####################################################################################################################
+    # a (job, params) pair that compares equal regardless of parameter order
+    ####################################################################################################################
+    @staticmethod
+    def key(job_name:str, params:dict) -> tuple:
+        return (job_name, tuple(sorted((str(k), str(v)) for k,v in params.items())))
+
+    ####################################################################################################################
+    # returns one future per request, in order.  Duplicate requests share a future
+    ####################################################################################################################
+    def launch(
+        self,
+        requests:list[tuple[str, dict]],
+        status_callback:Callable[[JobInstance], None]=None
+    ) -> list[Future]:
+
+        futures:dict[tuple, Future] = {}
+        results:list[Future] = []
+
+        for job_name, params in requests:
+            key = self.key(job_name, params)
+
+            if key not in futures:
+                futures[key] = self.executor.submit(self.__launch_one, job_name, dict(params), status_callback)
+            else:
+                LOGGER.debug(f'Skipping duplicate build of {job_name} with {params}')
+
+            results.append(futures[key])
+
+        return results
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __launch_one(
+        self,
+        job_name:str,
+        params:dict,
+        status_callback:Callable[[JobInstance], None]
+    ) -> JobInstance:
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        return self.spawn(job_name, params, status_callback)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def shutdown(self, wait:bool=True):
+        self.executor.shutdown(wait=wait)
+
+    ####################################################################################################################
+    # read (job, params) pairs from a file.  JSON files hold a list of {"job": name, "params": {...}}, anything else is
+    # read as CSV with a "job" column and one column per parameter, empty cells are left out
+    ####################################################################################################################
+    @staticmethod
+    def load(path:str) -> list[tuple[str, dict]]:
+        with open(path, newline='') as f:
+            if path.lower().endswith('.json'):
+                return [(x['job'], dict(x.get('params', {}))) for x in json.load(f)]
+
+            return [
+                (row.pop('job'), {k:v for k,v in row.items() if v not in (None, '')})
+                for row in csv.DictReader(f)
+            ]
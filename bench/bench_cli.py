@@ -0,0 +1,170 @@
+########################################################################################################################
+# Cold start cost of the command line client.  Every command is run as a fresh interpreter against the stub in
+# stubjenkins.py, recording its wall time, how much of that was spent importing, and the requests it sent the stub.
+# A one shot command should only send the requests it needs, however many jobs the controller has.
+#
+#   python bench/bench_cli.py --jobs 1000 --repeat 5 --output cli.json
+########################################################################################################################
+import  os
+import  sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import  argparse
+import  datetime
+import  json
+import  platform
+import  shlex
+import  statistics
+import  subprocess
+import  time
+import  urllib.request
+from    stubjenkins             import StubJenkins
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+########################################################################################################################
+# arguments after the server and credentials, {job} is replaced with a job the stub has
+########################################################################################################################
+DEFAULT_COMMANDS:list[str] = [
+    'job --list',
+    'job --list --format json',
+    'job --list-running',
+    'job --info {job}',
+    'job --info {job} --fields name,lastBuild[number,result]',
+    'job --stop {job}#1',
+    'job --stop job1*',
+    'job --start {job}',
+    'job --start {job} --param A=1',
+    'job --start {job} --wait-for-completion',
+]
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def stub_request(url:str, path:str, method:str='GET') -> dict:
+    with urllib.request.urlopen(urllib.request.Request(f'{url}{path}', method=method), timeout=60) as resp:
+        body = resp.read()
+    return json.loads(body) if body else {}
+
+
+########################################################################################################################
+# wall time of a fresh interpreter running argv, in ms
+########################################################################################################################
+def run(argv:list[str]) -> tuple[float, subprocess.CompletedProcess]:
+    start   = time.perf_counter()
+    proc    = subprocess.run([sys.executable] + argv, cwd=ROOT, capture_output=True, text=True)
+    return (time.perf_counter() - start) * 1000, proc
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def measure(url:str, command:str, job:str, repeat:int) -> dict:
+    argv = [
+        os.path.join(ROOT, 'jenkins.py'),
+        '--server', url,
+        '--user', 'bench',
+        '--password', 'bench',
+    ] + shlex.split(command.format(job=job))
+
+    times:list[float]   = []
+    requests:dict       = {}
+    returncode:int      = 0
+    stderr:str          = ''
+
+    for _ in range(repeat):
+        stub_request(url, '/_stub/reset', method='POST')
+
+        elapsed, proc = run(argv)
+        times.append(elapsed)
+
+        # the same command sends the same requests every time, the last run's are kept
+        requests    = stub_request(url, '/_stub/stats')['hits']
+        returncode  = proc.returncode
+        stderr      = proc.stderr
+
+    return {
+        'command'       : command,
+        'returncode'    : returncode,
+        'error'         : stderr.strip().splitlines()[-1] if returncode != 0 and stderr.strip() else None,
+        'wall_ms'       : {'min': min(times), 'median': statistics.median(times), 'max': max(times)},
+        'requests'      : sum(requests.values()),
+        'requests_by_endpoint': requests,
+    }
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--jobs',           action='store', default=1000,   type=int)
+    parser.add_argument('--history',        action='store', default=5,      type=int)
+    parser.add_argument('--latency',        action='store', default=0.0,    type=float, help='ms added by the stub')
+    parser.add_argument('--churn',          action='store', default=10.0,   type=float, help='builds per second')
+    parser.add_argument('--queue-delay',    action='store', default=0.1,    type=float)
+    parser.add_argument('--build-duration', action='store', default=1.0,    type=float)
+    parser.add_argument('--repeat',         action='store', default=5,      type=int)
+    parser.add_argument('--commands',       action='store', default=DEFAULT_COMMANDS, nargs='+')
+    parser.add_argument('--output',         action='store', default='bench_cli.json')
+
+    args = parser.parse_args(args)
+
+    stub = StubJenkins(
+        latency=args.latency,
+        jobs=args.jobs,
+        history=args.history,
+        churn=args.churn,
+        queue_delay=args.queue_delay,
+        build_duration=args.build_duration
+    )
+    stub.start()
+
+    try:
+        # what every command pays before it sends anything
+        baseline = {}
+        for name, code in (('python', 'pass'), ('import jenkins', 'import jenkins')):
+            times = [run(['-c', code])[0] for _ in range(args.repeat)]
+            baseline[name] = {'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+            print (f"{name:>40}: {baseline[name]['median']:8.1f} ms")
+
+        results = []
+        for command in args.commands:
+            result = measure(stub.url, command, 'job0', args.repeat)
+            results.append(result)
+
+            print (
+                f"{command:>40}: {result['wall_ms']['median']:8.1f} ms  "
+                f"{result['requests']:5} requests"
+                f"{'  failed: ' + str(result['error']) if result['returncode'] != 0 else ''}",
+                flush=True
+            )
+
+    finally:
+        stub.stop()
+
+    with open(args.output, 'w') as f:
+        json.dump(
+            {
+                'python'    : platform.python_version(),
+                'platform'  : platform.platform(),
+                'date'      : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'config'    : {k: v for k, v in vars(args).items() if k != 'output'},
+                'baseline_ms': baseline,
+                'results'   : results,
+            },
+            f,
+            indent=2
+        )
+
+    print (f'results written to {args.output}')
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+########################################################################################################################
+# Decode cost of a tree mode poll cycle: the host response for --jobs jobs with --builds builds each, decoded by every
+# installed backend, then diffed against jobs that already hold those builds.  A steady cycle is what polling costs
+# once nothing changes, jobs recognize the builds they diffed last time.  A full cycle makes them diff every build
+# again, the cost of a cycle where every job changed.  Both are next to a copy of the payload, the least reading it
+# off the network costs
+#
+#   python bench/bench_decode.py --jobs 2000 --builds 100
+########################################################################################################################
+import  os
+import  sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import  argparse
+from    decoding                import BACKENDS, SHAPE_JOB, Decoder
+import  gc
+import  json
+from    job                     import Job
+import  time
+import  tracemalloc
+import  types
+
+
+########################################################################################################################
+# just enough of a Response for Decoder
+########################################################################################################################
+class Payload:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, content:bytes):
+        self.content:bytes  = content
+        self.url:str        = 'bench'
+
+
+########################################################################################################################
+# what /api/json?tree=jobs[name,_class,builds[...]{0,builds}] returns
+########################################################################################################################
+def host_response(jobs:int, builds:int) -> bytes:
+    return json.dumps({
+        '_class': 'hudson.model.Hudson',
+        'jobs': [
+            {
+                '_class': 'hudson.model.FreeStyleProject',
+                'name'  : f'job{i}',
+                'builds': [
+                    {
+                        '_class'    : 'hudson.model.FreeStyleBuild',
+                        'number'    : n,
+                        'queueId'   : i * builds + n,
+                        'building'  : False,
+                        'duration'  : 1000 + n,
+                        'result'    : 'SUCCESS',
+                    }
+                    for n in range(builds, 0, -1)
+                ],
+            }
+            for i in range(jobs)
+        ],
+    }).encode()
+
+
+########################################################################################################################
+# best of repeat, in ms
+########################################################################################################################
+def best(func, repeat:int) -> float:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def measure(backend:str, payload:Payload, jobs:int, builds:int, repeat:int) -> dict:
+    decoder = Decoder(backend)
+
+    # what the decoded response costs to hold while it is being diffed
+    tracemalloc.start()
+    data = decoder.decode(payload, SHAPE_JOB)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # jobs that have seen every build already, so the diff finds nothing new
+    # the jobs only need the api for its decoder here
+    api     = types.SimpleNamespace(decoder=decoder)
+    tracked = [Job(name=node['name'], api=api, max_history=builds) for node in data['jobs']]
+    for job, node in zip(tracked, data['jobs']):
+        job.from_json(node, refresh_instances=False)
+
+    def diff():
+        for job, node in zip(tracked, decoder.decode(payload, SHAPE_JOB)['jobs']):
+            job.from_json(node, refresh_instances=False)
+
+    def full_diff():
+        for job in tracked:
+            job.builds_fingerprint = None
+        diff()
+
+    read_ms     = best(lambda: bytearray(payload.content), repeat)
+    decode_ms   = best(lambda: decoder.decode(payload, SHAPE_JOB), repeat)
+    steady_ms   = best(diff, repeat)
+    cycle_ms    = best(full_diff, repeat)
+
+    return {
+        'backend'           : backend,
+        'typed'             : SHAPE_JOB in decoder.typed,
+        'jobs'              : jobs,
+        'builds'            : builds,
+        'payload_bytes'     : len(payload.content),
+        'read_ms'           : read_ms,
+        'decode_ms'         : decode_ms,
+        'steady_cycle_ms'   : steady_ms,
+        'cycle_ms'          : cycle_ms,
+        'decoded_bytes'     : size,
+    }
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--jobs',       action='store', default=2000,           type=int)
+    parser.add_argument('--builds',     action='store', default=100,            type=int)
+    parser.add_argument('--repeat',     action='store', default=5,              type=int)
+    parser.add_argument('--backends',   action='store', default=list(BACKENDS), nargs='+')
+    parser.add_argument('--output',     action='store', default=None,           help='also write the results as JSON')
+
+    args = parser.parse_args(args)
+
+    payload = Payload(host_response(args.jobs, args.builds))
+    print (f"{args.jobs} jobs x {args.builds} builds, {len(payload.content) / 2**20:.1f} MiB per cycle")
+
+    results = []
+    for backend in args.backends:
+        result = measure(backend, payload, args.jobs, args.builds, args.repeat)
+        results.append(result)
+
+        print (
+            f"  {backend:>8}{' (typed)' if result['typed'] else '        '}  "
+            f"read {result['read_ms']:6.1f} ms  "
+            f"decode {result['decode_ms']:8.1f} ms  "
+            f"steady cycle {result['steady_cycle_ms']:8.1f} ms  "
+            f"full cycle {result['cycle_ms']:8.1f} ms  "
+            f"decoded size {result['decoded_bytes'] / 2**20:7.1f} MiB"
+        )
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+########################################################################################################################
+# Bytes per tracked build: builds JobInstances the way a Job does and measures what they cost with tracemalloc.
+#
+#   python bench/bench_memory.py --builds 100000
+########################################################################################################################
+import  os
+import  sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import  argparse
+import  gc
+from    instancestore           import InstanceStore
+from    jobinstance             import JobInstance
+import  tracemalloc
+
+
+########################################################################################################################
+# completed builds, as they arrive from a job's builds list
+########################################################################################################################
+def track(builds:int, jobs:int) -> list[InstanceStore]:
+    stores = [InstanceStore(max_history=builds) for _ in range(jobs)]
+    names  = [f'job{i}' for i in range(jobs)]
+
+    for i in range(builds):
+        inst = JobInstance(api=None, job_name=names[i % jobs], build_id=i + 1, queue_id=100_000 + i)
+        inst.update_from_json({'building': False, 'duration': 1000 + i, 'result': 'SUCCESS'})
+        stores[i % jobs].add(inst)
+
+    return stores
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def measure(builds:int, jobs:int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+
+    before = tracemalloc.get_traced_memory()[0]
+    stores = track(builds=builds, jobs=jobs)
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    sample = next(iter(stores[0]))
+    return {
+        'builds'            : builds,
+        'jobs'              : jobs,
+        'total_bytes'       : after - before,
+        'bytes_per_build'   : (after - before) / builds,
+        'peak_bytes'        : peak - before,
+        'has_dict'          : hasattr(sample, '__dict__'),
+    }
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--builds', action='store', default=100_000,  type=int)
+    parser.add_argument('--jobs',   action='store', default=100,      type=int)
+
+    args = parser.parse_args(args)
+
+    result = measure(builds=args.builds, jobs=args.jobs)
+
+    print (f"{result['builds']} builds over {result['jobs']} jobs")
+    print (f"  total:      {result['total_bytes'] / 2**20:.1f} MiB")
+    print (f"  per build:  {result['bytes_per_build']:.0f} bytes")
+    print (f"  peak:       {result['peak_bytes'] / 2**20:.1f} MiB")
+    print (f"  __dict__:   {result['has_dict']}")
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    main()
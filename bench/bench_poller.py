@@ -0,0 +1,294 @@
+########################################################################################################################
+# Polling engine benchmark against the stub in stubjenkins.py.  For every job count and poll mode a fresh stub is
+# started in its own process, and Jenkins is run in another so CPU and memory are the poller's alone.  Measures
+# requests per poll cycle, how long a cycle takes, the time from a build finishing on the server to its status
+# callback, CPU and peak RSS, and writes everything to a JSON file so runs of different versions can be compared.
+#
+#   python bench/bench_poller.py --jobs 10 100 1000 --duration 10 --output poller.json
+########################################################################################################################
+import  os
+import  sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import  argparse
+from    concurrent.futures      import ProcessPoolExecutor
+import  datetime
+import  json
+import  multiprocessing
+import  platform
+import  resource
+import  statistics
+import  subprocess
+from    threading               import Lock
+import  time
+import  urllib.request
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+########################################################################################################################
+# times each pass of the status loop.  A cycle starts when the scheduler hands out due keys and ends when the loop asks
+# how long it can sleep.  Passes with nothing due aren't counted
+########################################################################################################################
+class CycleTimer:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, scheduler):
+        self.lock       = Lock()
+        self.started    = None
+        self.durations:list[float] = []
+
+        due         = scheduler.due
+        sleep_time  = scheduler.time_until_next
+
+        def timed_due():
+            keys = due()
+            self.started = time.perf_counter() if len(keys) > 0 else None
+            return keys
+
+        def timed_sleep_time():
+            if self.started is not None:
+                with self.lock:
+                    self.durations.append(time.perf_counter() - self.started)
+                self.started = None
+            return sleep_time()
+
+        scheduler.due               = timed_due
+        scheduler.time_until_next   = timed_sleep_time
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def take(self) -> list[float]:
+        with self.lock:
+            durations, self.durations = self.durations, []
+        return durations
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def summarize(values:list[float], scale:float=1000.0) -> dict:
+    if len(values) == 0:
+        return {'count': 0}
+
+    ordered = sorted(values)
+    return {
+        'count' : len(ordered),
+        'mean'  : statistics.fmean(ordered) * scale,
+        'p50'   : ordered[len(ordered) // 2] * scale,
+        'p95'   : ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * scale,
+        'max'   : ordered[-1] * scale,
+    }
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def stub_request(url:str, path:str, method:str='GET') -> dict:
+    with urllib.request.urlopen(urllib.request.Request(f'{url}{path}', method=method), timeout=60) as resp:
+        body = resp.read()
+    return json.loads(body) if body else {}
+
+
+########################################################################################################################
+# peak RSS of this process in KiB, ru_maxrss is in bytes on macOS
+########################################################################################################################
+def max_rss_kib() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+########################################################################################################################
+# runs in a child process: poll the stub at url for duration seconds after the job list is in, spawning builds along
+# the way to see how long their completion takes to reach us
+########################################################################################################################
+def run_scenario(url:str, mode:str, jobs:int, duration:float, spawn:int, jenkins_args:dict) -> dict:
+    from jenkins import Jenkins
+
+    started = time.perf_counter()
+    jenkins = Jenkins(url, 'bench', password='bench', poll_mode=mode, **jenkins_args)
+    timer   = CycleTimer(jenkins.scheduler)
+
+    try:
+        while not jenkins.initialized or len(jenkins.jobs) < jobs:
+            time.sleep(.01)
+
+        # job mode learns the names in one cycle and polls the jobs in the next, wait for a cycle after the names are in
+        timer.take()
+        while len(timer.durations) == 0:
+            time.sleep(.01)
+        init_seconds = time.perf_counter() - started
+
+        # callbacks fire on a worker, the completion time on the server is matched up afterwards
+        callbacks:dict[tuple[str, int], float] = {}
+        callbacks_lock = Lock()
+
+        def on_status(inst):
+            if inst.complete:
+                with callbacks_lock:
+                    callbacks.setdefault((inst.name, inst.build_id), time.time())
+
+        timer.take()
+        stub_request(url, '/_stub/reset', method='POST')
+
+        usage_start = resource.getrusage(resource.RUSAGE_SELF)
+        window_start = time.perf_counter()
+
+        # spread the spawns over the first half of the window so they finish inside it
+        names = sorted(jenkins.jobs)
+        for i in range(spawn):
+            jenkins.start_job_instance(names[i % len(names)], status_callback=on_status)
+            time.sleep(duration / 2 / max(spawn, 1))
+
+        time.sleep(max(0.0, duration - (time.perf_counter() - window_start)))
+
+        elapsed     = time.perf_counter() - window_start
+        usage_end   = resource.getrusage(resource.RUSAGE_SELF)
+        cycles      = timer.take()
+        stats       = stub_request(url, '/_stub/stats')
+
+    finally:
+        jenkins.stop()
+
+    requests = sum(stats['hits'].values())
+
+    with callbacks_lock:
+        latencies = [
+            callbacks[(job_name, number)] - finished
+            for job_name, number, finished in stats['completed']
+            if (job_name, number) in callbacks
+        ]
+
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+
+    return {
+        'mode'                  : mode,
+        'jobs'                  : jobs,
+        'init_seconds'          : init_seconds,
+        'window_seconds'        : elapsed,
+        'cycles'                : len(cycles),
+        'requests'              : requests,
+        'requests_per_cycle'    : requests / len(cycles) if cycles else None,
+        'requests_by_endpoint'  : stats['hits'],
+        'cycle_ms'              : summarize(cycles),
+        'spawned'               : spawn,
+        'completed_seen'        : len(latencies),
+        'completion_to_callback_ms': summarize(latencies),
+        'cpu_seconds'           : cpu,
+        'cpu_percent'           : 100.0 * cpu / elapsed,
+        'max_rss_kib'           : max_rss_kib(),
+    }
+
+
+########################################################################################################################
+# a stub in its own process, its url is the first thing it prints
+########################################################################################################################
+def start_stub(jobs:int, args) -> tuple[subprocess.Popen, str]:
+    stub = subprocess.Popen(
+        [
+            sys.executable, os.path.join(HERE, 'stubjenkins.py'),
+            '--jobs',           str(jobs),
+            '--history',        str(args.history),
+            '--latency',        str(args.latency),
+            '--churn',          str(args.churn),
+            '--queue-delay',    str(args.queue_delay),
+            '--build-duration', str(args.build_duration),
+        ],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+
+    return stub, stub.stdout.readline().strip()
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def version() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--jobs',           action='store', default=[10, 100, 1000, 5000, 20000], type=int, nargs='+')
+    parser.add_argument('--modes',          action='store', default=['tree', 'job'], nargs='+')
+    parser.add_argument('--duration',       action='store', default=10.0,   type=float, help='seconds measured per run')
+    parser.add_argument('--spawn',          action='store', default=5,      type=int,   help='builds started per run')
+    parser.add_argument('--history',        action='store', default=5,      type=int)
+    parser.add_argument('--latency',        action='store', default=0.0,    type=float, help='ms added by the stub')
+    parser.add_argument('--churn',          action='store', default=1.0,    type=float, help='builds per second')
+    parser.add_argument('--queue-delay',    action='store', default=0.5,    type=float)
+    parser.add_argument('--build-duration', action='store', default=1.0,    type=float)
+    parser.add_argument('--max-workers',    action='store', default=8,      type=int)
+    parser.add_argument('--output',         action='store', default='bench_poller.json')
+
+    args = parser.parse_args(args)
+
+    jenkins_args = {'max_workers': args.max_workers}
+    results:list[dict] = []
+
+    for jobs in args.jobs:
+        for mode in args.modes:
+            stub, url = start_stub(jobs, args)
+
+            try:
+                # a fresh process per run so peak RSS and imports don't carry over
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    result = pool.submit(
+                        run_scenario, url, mode, jobs, args.duration, args.spawn, jenkins_args
+                    ).result()
+            finally:
+                stub.terminate()
+                stub.wait()
+
+            results.append(result)
+
+            print (
+                f"{mode:>4} {jobs:>6} jobs: "
+                f"{result['requests_per_cycle'] or 0:8.1f} req/cycle  "
+                f"cycle p50 {result['cycle_ms'].get('p50', 0):8.1f} ms  "
+                f"callback p50 {result['completion_to_callback_ms'].get('p50', 0):8.1f} ms  "
+                f"cpu {result['cpu_percent']:5.1f}%  "
+                f"rss {result['max_rss_kib'] / 1024:7.1f} MiB",
+                flush=True
+            )
+
+    with open(args.output, 'w') as f:
+        json.dump(
+            {
+                'version'   : version(),
+                'python'    : platform.python_version(),
+                'platform'  : platform.platform(),
+                'date'      : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'config'    : {k: v for k, v in vars(args).items() if k != 'output'},
+                'results'   : results,
+            },
+            f,
+            indent=2
+        )
+
+    print (f'results written to {args.output}')
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    main()
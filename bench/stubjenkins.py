@@ -0,0 +1,467 @@
+########################################################################################################################
+# A stand-in Jenkins for benchmarks.  Serves the endpoints the poller uses from memory, with a configurable number of
+# jobs, a delay added to every response and builds that start on their own at a steady rate.  Queue items turn into
+# builds after queue_delay seconds and builds finish build_duration seconds after that.
+#
+#   python bench/stubjenkins.py --jobs 1000 --latency 20 --churn 5
+#
+# prints its url and serves until interrupted.  GET /_stub/stats returns the requests served and the builds finished
+# since the last POST /_stub/reset, with the wall clock time each one finished at
+########################################################################################################################
+import  argparse
+from    collections             import Counter
+from    http.server             import BaseHTTPRequestHandler, ThreadingHTTPServer
+import  json
+import  random
+import  re
+import  sys
+from    threading               import Event, Lock, Thread
+import  time
+from    urllib.parse            import parse_qs, urlparse
+
+
+########################################################################################################################
+# numbers in a path are replaced so requests can be counted per endpoint
+########################################################################################################################
+NUMBER_RE   = re.compile(r'\d+')
+BOUND_RE    = re.compile(r'builds\[[^\]]*\]\{\d*,(\d+)\}')
+CRUMB       = 'stub-crumb'
+
+
+########################################################################################################################
+# everything the stub knows, shared by the request handlers and the ticker
+########################################################################################################################
+class StubState:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        jobs:int=100,
+        history:int=5,
+        queue_delay:float=0.5,
+        build_duration:float=1.0,
+        churn:float=0.0,
+        seed:int=0
+    ):
+        self.queue_delay:float      = queue_delay
+        self.build_duration:float   = build_duration
+        self.churn:float            = churn
+
+        self.lock:Lock      = Lock()
+        self.random         = random.Random(seed)
+
+        # what POSTs have to carry, change it to make the client fetch a new one
+        self.crumb:str      = CRUMB
+
+        # job name -> builds, oldest first.  Every job starts with history completed builds
+        self.jobs:dict[str, list[dict]] = {
+            f'job{i}': [
+                {'number': n, 'queueId': n, 'building': False, 'duration': 1000, 'result': 'SUCCESS'}
+                for n in range(1, history + 1)
+            ]
+            for i in range(jobs)
+        }
+        self.job_names:list[str] = list(self.jobs)
+
+        # queue id -> {'job', 'queued' (monotonic), 'number' once it has a build, 'cancelled'}
+        self.queue:dict[int, dict] = {}
+        self.next_queue_id:int = 100_000
+
+        # builds that are running: (job, number) -> monotonic time they started
+        self.running:dict[tuple[str, int], float] = {}
+
+        # what /_stub/stats reports
+        self.hits:Counter = Counter()
+        self.completed:list[tuple[str, int, float]] = []
+
+        self.churn_owed:float = 0.0
+
+    ####################################################################################################################
+    # put a build of job_name in the queue, returns its queue id
+    ####################################################################################################################
+    def enqueue(self, job_name:str) -> int:
+        queue_id = self.next_queue_id
+        self.next_queue_id += 1
+
+        self.queue[queue_id] = {'job': job_name, 'queued': time.monotonic(), 'number': None, 'cancelled': False}
+
+        return queue_id
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def finish(self, job_name:str, number:int, result:str='SUCCESS'):
+        if self.running.pop((job_name, number), None) is None:
+            return
+
+        build = self.find_build(job_name, number)
+        build['building']   = False
+        build['duration']   = int(self.build_duration * 1000)
+        build['result']     = result
+
+        self.completed.append((job_name, number, time.time()))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def find_build(self, job_name:str, number:int) -> dict:
+        for build in reversed(self.jobs.get(job_name, [])):
+            if build['number'] == number:
+                return build
+        return None
+
+    ####################################################################################################################
+    # move the queue and running builds along, and start whatever churn is owed since the last tick
+    ####################################################################################################################
+    def tick(self, elapsed:float):
+        now = time.monotonic()
+
+        with self.lock:
+            self.churn_owed += self.churn * elapsed
+            while self.churn_owed >= 1.0:
+                self.churn_owed -= 1.0
+                self.enqueue(self.random.choice(self.job_names))
+
+            for queue_id, item in list(self.queue.items()):
+                if item['cancelled']:
+                    continue
+
+                if item['number'] is None and now - item['queued'] >= self.queue_delay:
+                    builds = self.jobs[item['job']]
+                    number = builds[-1]['number'] + 1 if builds else 1
+
+                    builds.append({'number': number, 'queueId': queue_id, 'building': True, 'duration': 0, 'result': None})
+                    item['number'] = number
+                    self.running[(item['job'], number)] = now
+
+                # a real queue forgets items a while after they start, keep them long enough to be resolved
+                elif item['number'] is not None and now - item['queued'] >= self.queue_delay + 60.0:
+                    del self.queue[queue_id]
+
+            for (job_name, number), started in list(self.running.items()):
+                if now - started >= self.build_duration:
+                    self.finish(job_name, number)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'hits'      : dict(self.hits),
+                'completed' : list(self.completed),
+                'running'   : len(self.running),
+                'queued'    : sum(1 for item in self.queue.values() if item['number'] is None),
+            }
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.completed.clear()
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    # set on the subclass made for each server
+    state:StubState = None
+    latency:float   = 0.0
+
+    ####################################################################################################################
+    # quiet, the benchmark makes a lot of requests
+    ####################################################################################################################
+    def log_message(self, *args):
+        pass
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def send(self, code:int, body=None, headers:dict={}):
+        data = body if isinstance(body, bytes) else (json.dumps(body).encode() if body is not None else b'')
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json' if not isinstance(body, bytes) else 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        self.wfile.write(data)
+
+    ####################################################################################################################
+    # counts the request and applies the latency.  Returns the path and query
+    ####################################################################################################################
+    def begin(self) -> tuple[str, dict]:
+        url = urlparse(self.path)
+
+        if not url.path.startswith('/_stub'):
+            with self.state.lock:
+                self.state.hits[f'{self.command} {NUMBER_RE.sub("N", url.path)}'] += 1
+
+            if self.latency > 0:
+                time.sleep(self.latency)
+
+        return url.path, parse_qs(url.query)
+
+    ####################################################################################################################
+    # the builds of a job as the tree asks for them, newest first.  None if the tree doesn't want them
+    ####################################################################################################################
+    @staticmethod
+    def builds(builds:list[dict], tree:str) -> list[dict]:
+        if tree and 'builds' not in tree:
+            return None
+
+        bound = BOUND_RE.search(tree)
+        count = int(bound.group(1)) if bound else len(builds)
+
+        return [dict(b) for b in builds[::-1][:count]]
+
+    ####################################################################################################################
+    # the newest build if the tree asks for lastBuild, {} if it doesn't so the caller can leave it out
+    ####################################################################################################################
+    @staticmethod
+    def last_build(builds:list[dict], tree:str) -> dict:
+        if tree and 'lastBuild' not in tree:
+            return {}
+
+        return {'lastBuild': dict(builds[-1]) if builds else None}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def do_GET(self):
+        path, query = self.begin()
+        tree        = query.get('tree', [''])[0]
+        state       = self.state
+
+        if path == '/_stub/stats':
+            return self.send(200, state.stats())
+
+        with state.lock:
+            if path == '/crumbIssuer/api/json':
+                return self.send(200, {'crumb': state.crumb, 'crumbRequestField': 'Jenkins-Crumb'})
+
+            if path == '/api/json':
+                jobs = []
+                for name, builds in state.jobs.items():
+                    job = {'name': name, '_class': 'hudson.model.FreeStyleProject'}
+
+                    job_builds = self.builds(builds, tree)
+                    if job_builds is not None:
+                        job['builds'] = job_builds
+
+                    job.update(self.last_build(builds, tree))
+                    jobs.append(job)
+
+                return self.send(200, {'jobs': jobs})
+
+            if path == '/queue/api/json':
+                return self.send(200, {'items': [
+                    {'id': queue_id, 'why': 'Waiting for next available executor', 'executable': None}
+                    for queue_id, item in state.queue.items() if item['number'] is None and not item['cancelled']
+                ]})
+
+            match = re.fullmatch(r'/queue/item/(\d+)/api/json', path)
+            if match:
+                item = state.queue.get(int(match.group(1)))
+                if item is None:
+                    return self.send(404)
+
+                if item['cancelled']:
+                    return self.send(200, {'id': int(match.group(1)), 'why': None, 'executable': None, 'cancelled': True})
+
+                if item['number'] is None:
+                    return self.send(200, {'id': int(match.group(1)), 'why': 'Waiting', 'executable': None})
+
+                return self.send(200, {'id': int(match.group(1)), 'why': None, 'executable': {'number': item['number']}})
+
+            match = re.fullmatch(r'/job/([^/]+)/api/json', path)
+            if match:
+                builds = state.jobs.get(match.group(1))
+                if builds is None:
+                    return self.send(404)
+
+                return self.send(200, {
+                    'name'      : match.group(1),
+                    '_class'    : 'hudson.model.FreeStyleProject',
+                    'builds'    : self.builds(builds, tree) or [],
+                    **self.last_build(builds, tree)
+                })
+
+            match = re.fullmatch(r'/job/([^/]+)/(\d+)/api/json', path)
+            if match:
+                build = state.find_build(match.group(1), int(match.group(2)))
+                return self.send(200, dict(build)) if build is not None else self.send(404)
+
+            match = re.fullmatch(r'/job/([^/]+)/(\d+)/logText/progressiveText', path)
+            if match:
+                build = state.find_build(match.group(1), int(match.group(2)))
+                if build is None:
+                    return self.send(404)
+
+                text    = f'Started {match.group(1)} #{match.group(2)}\n'.encode()
+                start   = int(query.get('start', ['0'])[0])
+                headers = {'X-Text-Size': str(len(text))}
+                if build['building']:
+                    headers['X-More-Data'] = 'true'
+
+                return self.send(200, text[start:], headers)
+
+        self.send(404)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def do_POST(self):
+        path, query = self.begin()
+        state       = self.state
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > 0:
+            self.rfile.read(length)
+
+        if path == '/_stub/reset':
+            state.reset()
+            return self.send(200)
+
+        if self.headers.get('Jenkins-Crumb') != state.crumb:
+            return self.send(403, b'No valid crumb was included in the request')
+
+        with state.lock:
+            match = re.fullmatch(r'/job/([^/]+)/(build|buildWithParameters)', path)
+            if match:
+                if match.group(1) not in state.jobs:
+                    return self.send(404)
+
+                queue_id = state.enqueue(match.group(1))
+                return self.send(201, headers={'Location': f'http://{self.headers["Host"]}/queue/item/{queue_id}/'})
+
+            if path == '/queue/cancelItem':
+                item = state.queue.get(int(query.get('id', ['0'])[0]))
+                if item is None or item['number'] is not None:
+                    return self.send(404)
+
+                item['cancelled'] = True
+                return self.send(200)
+
+            match = re.fullmatch(r'/job/([^/]+)/(\d+)/(stop|term|kill)', path)
+            if match:
+                state.finish(match.group(1), int(match.group(2)), result='ABORTED')
+                return self.send(200)
+
+        self.send(404)
+
+
+########################################################################################################################
+# the server and the thread that moves builds along.  tick is how often, in seconds
+########################################################################################################################
+class StubJenkins:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, host:str='127.0.0.1', port:int=0, latency:float=0.0, tick:float=0.02, **state_args):
+        self.state:StubState = StubState(**state_args)
+        self.tick:float = tick
+
+        handler = type('Handler', (StubHandler,), {'state': self.state, 'latency': latency})
+
+        self.server:ThreadingHTTPServer = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+        self.exit:Event = Event()
+        self.threads:list[Thread] = [
+            Thread(target=self.server.serve_forever, name='StubServer', daemon=True),
+            Thread(target=self.__ticker, name='StubTicker', daemon=True),
+        ]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __ticker(self):
+        last = time.monotonic()
+        while not self.exit.wait(self.tick):
+            now = time.monotonic()
+            self.state.tick(now - last)
+            last = now
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def start(self) -> 'StubJenkins':
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def stop(self):
+        self.exit.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--host',           action='store', default='127.0.0.1')
+    parser.add_argument('--port',           action='store', default=0,      type=int)
+    parser.add_argument('--jobs',           action='store', default=100,    type=int)
+    parser.add_argument('--history',        action='store', default=5,      type=int,   help='completed builds per job at start')
+    parser.add_argument('--latency',        action='store', default=0.0,    type=float, help='ms added to every response')
+    parser.add_argument('--churn',          action='store', default=0.0,    type=float, help='builds started per second')
+    parser.add_argument('--queue-delay',    action='store', default=0.5,    type=float, help='seconds a build waits in the queue')
+    parser.add_argument('--build-duration', action='store', default=1.0,    type=float, help='seconds a build runs')
+    parser.add_argument('--seed',           action='store', default=0,      type=int)
+
+    args = parser.parse_args(args)
+
+    stub = StubJenkins(
+        host=args.host,
+        port=args.port,
+        latency=args.latency / 1000,
+        jobs=args.jobs,
+        history=args.history,
+        queue_delay=args.queue_delay,
+        build_duration=args.build_duration,
+        churn=args.churn,
+        seed=args.seed
+    ).start()
+
+    # the benchmark reads the url from the first line
+    print (stub.url, flush=True)
+
+    try:
+        stub.exit.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    main()
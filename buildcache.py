@@ -0,0 +1,139 @@
+########################################################################################################################
+#
+########################################################################################################################
+import  json
+import  sqlite3
+from    threading               import Lock
+import  time
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# A completed build never changes, so what we learned about one can be kept on disk and reused after a restart.
+# Builds are keyed by (controller, job, build number).  Once more than max_entries rows are held the ones written
+# longest ago are dropped
+########################################################################################################################
+class BuildCache:
+
+    # only count rows every so many writes, counting is a table scan
+    EVICT_EVERY:int = 256
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, path:str, controller:str, max_entries:int=100_000):
+        self.controller:str     = controller
+        self.max_entries:int    = max_entries
+
+        # one connection shared between the poller, its workers and callers
+        self.lock:Lock = Lock()
+        self.connection:sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS builds ('
+                '   controller  TEXT    NOT NULL,'
+                '   job         TEXT    NOT NULL,'
+                '   number      INTEGER NOT NULL,'
+                '   queue_id    INTEGER,'
+                '   duration    INTEGER,'
+                '   result      TEXT,'
+                '   properties  TEXT    NOT NULL DEFAULT \'{}\','
+                '   stored      REAL    NOT NULL,'
+                '   PRIMARY KEY (controller, job, number)'
+                ')'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS builds_stored ON builds (stored)')
+
+        self.writes:int = 0
+        self.evict()
+
+    ####################################################################################################################
+    # the newest limit builds of job_name as (number, queue_id, duration, result, properties), newest first.  Rows
+    # without a result never came from put(), older versions could leave them behind from put_property()
+    ####################################################################################################################
+    def load(self, job_name:str, limit:int) -> list[tuple[int, int, int, str, dict]]:
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT number, queue_id, duration, result, properties FROM builds '
+                'WHERE controller = ? AND job = ? AND result IS NOT NULL ORDER BY number DESC LIMIT ?',
+                (self.controller, job_name, limit)
+            ).fetchall()
+
+        return [
+            (number, queue_id, duration, result, json.loads(properties))
+            for number, queue_id, duration, result, properties in rows
+        ]
+
+    ####################################################################################################################
+    # remember a completed build, properties already stored for it are kept
+    ####################################################################################################################
+    def put(self, job_name:str, number:int, queue_id:int, duration:int, result:str):
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO builds (controller, job, number, queue_id, duration, result, stored) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (controller, job, number) DO UPDATE SET '
+                '   queue_id = excluded.queue_id,'
+                '   duration = excluded.duration,'
+                '   result   = excluded.result,'
+                '   stored   = excluded.stored',
+                (self.controller, job_name, number, queue_id, duration, result, time.time())
+            )
+
+        self.__written()
+
+    ####################################################################################################################
+    # remember a property fetched for a completed build, see JobInstance.get_build_property.  Only builds put() has
+    # stored take properties, a row made here would have no result to hydrate the build with
+    ####################################################################################################################
+    def put_property(self, job_name:str, number:int, key:str, value):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT properties FROM builds WHERE controller = ? AND job = ? AND number = ? AND result IS NOT NULL',
+                (self.controller, job_name, number)
+            ).fetchone()
+
+            if row is None:
+                return
+
+            properties = json.loads(row[0])
+            properties[key] = value
+
+            self.connection.execute(
+                'UPDATE builds SET properties = ? WHERE controller = ? AND job = ? AND number = ?',
+                (json.dumps(properties), self.controller, job_name, number)
+            )
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __written(self):
+        self.writes += 1
+        if self.writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    ####################################################################################################################
+    # drop the oldest rows, whichever controller they belong to, until no more than max_entries are left
+    ####################################################################################################################
+    def evict(self):
+        with self.lock:
+            count = self.connection.execute('SELECT COUNT(*) FROM builds').fetchone()[0]
+
+            if count <= self.max_entries:
+                return
+
+            self.connection.execute(
+                'DELETE FROM builds WHERE rowid IN (SELECT rowid FROM builds ORDER BY stored LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,57 @@
+########################################################################################################################
+#
+########################################################################################################################
+
+
+########################################################################################################################
+# Read only snapshot of a build from a job's history.  Unlike JobInstance it isn't tracked or refreshed, so it can be
+# made by the thousand
+########################################################################################################################
+class BuildRecord:
+
+    __slots__ = ('job_name', 'number', 'queue_id', 'building', 'duration', 'result', 'timestamp')
+
+    # the fields asked for when paging through history
+    fields:tuple[str, ...] = ('number', 'queueId', 'building', 'duration', 'result', 'timestamp')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        job_name:str,
+        number:int,
+        queue_id:int=None,
+        building:bool=False,
+        duration:int=-1,
+        result:str=None,
+        timestamp:int=None
+    ):
+        self.job_name:str   = job_name
+        self.number:int     = number
+        self.queue_id:int   = queue_id
+        self.building:bool  = building
+        self.duration:int   = duration
+        self.result:str     = result
+        self.timestamp:int  = timestamp
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __repr__(self) -> str:
+        return f'BuildRecord({self.job_name!r}, #{self.number}, {self.result})'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def from_json(job_name:str, data:dict) -> 'BuildRecord':
+        return BuildRecord(
+            job_name=job_name,
+            number=data['number'],
+            queue_id=data.get('queueId'),
+            building=data.get('building', False),
+            duration=data.get('duration', -1),
+            result=data.get('result'),
+            timestamp=data.get('timestamp')
+        )
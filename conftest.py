@@ -0,0 +1,6 @@
+########################################################################################################################
+# Marks the repository root for pytest.  The modules here are imported top level (from job import Job), pytest puts
+# this directory on sys.path because the conftest lives in it, so the tests import them the same way.
+#
+#   python -m pytest tests
+########################################################################################################################
@@ -0,0 +1,80 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    exceptions              import InvalidResponse
+import  importlib.util
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# the response shapes the library asks for with its own tree filters.  A shape is only a hint, a decoder that can't
+# decode into records returns plain dicts instead
+########################################################################################################################
+SHAPE_JOB           = 'job'         # a job, or the host/a folder, with builds[...] and jobs[...] below it
+SHAPE_BUILD         = 'build'       # JobInstance.BUILD_FILTERS
+SHAPE_BUILD_LIST    = 'build_list'  # a job's builds[...], held back undecoded by the job shape, see Job.from_json()
+SHAPE_QUEUE         = 'queue'       # QueueTracker.queue_filter
+SHAPE_QUEUE_ITEM    = 'queue_item'  # JobInstance.QUEUE_FILTER
+
+
+########################################################################################################################
+# the installed backends, fastest first, each the module it comes from.  Only the one a Decoder picks is imported
+########################################################################################################################
+BACKENDS:dict[str, str] = {
+    name: name for name in ('msgspec', 'orjson') if importlib.util.find_spec(name) is not None
+}
+
+BACKENDS['json'] = 'json'
+
+
+########################################################################################################################
+# Turns response bodies into Python objects.  backend is one of BACKENDS, by default the fastest one installed.  Only
+# the msgspec backend decodes shapes into records, the others always return dicts
+########################################################################################################################
+class Decoder:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, backend:str=None):
+        if backend is None:
+            backend = next(iter(BACKENDS))
+
+        if backend not in BACKENDS:
+            raise ValueError(f'JSON backend {backend} is not available, have {", ".join(BACKENDS)}')
+
+        module = importlib.import_module(BACKENDS[backend])
+
+        self.backend:str = backend
+
+        # shape -> decoder for its record type
+        self.typed:dict[str, Callable[[bytes], object]] = {}
+
+        if backend == 'msgspec':
+            from records import SHAPES
+
+            self.loads:Callable[[bytes], object] = module.json.Decoder().decode
+            self.typed = {shape: module.json.Decoder(record).decode for shape, record in SHAPES.items()}
+        else:
+            self.loads:Callable[[bytes], object] = module.loads
+
+    ####################################################################################################################
+    # response is a requests Response or an AsyncResponse
+    ####################################################################################################################
+    def decode(self, response, shape:str=None):
+        return self.decode_bytes(response.content, shape, source=response.url)
+
+    ####################################################################################################################
+    # content is bytes or the part of a response a record held on to undecoded
+    ####################################################################################################################
+    def decode_bytes(self, content, shape:str=None, source:str=None):
+        decode = self.typed.get(shape, self.loads)
+
+        try:
+            return decode(content)
+        # every backend's decode error is a ValueError
+        except ValueError as e:
+            raise InvalidResponse(f'Could not decode {source or shape}: {e}') from e
@@ -0,0 +1,204 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    api.tree.compiledfilter import CompiledFilter
+from    api.tree.filterlist     import FilterList
+from    api.tree.filternode     import FilterNode
+import  time
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# _class values of items that hold other jobs.  Anything that comes back with a jobs list is treated as one too, this
+# is only needed for the deepest level of a query where children aren't expanded
+########################################################################################################################
+FOLDER_CLASSES:set[str] = {
+    'com.cloudbees.hudson.plugins.folder.Folder',
+    'org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject',
+    'jenkins.branch.OrganizationFolder',
+}
+
+
+########################################################################################################################
+# Finds every job under the root, through folders, multibranch projects and organization folders, and names them by
+# full path ("folder/project/branch").  One query reaches max_depth levels, the folders it can't see into are fetched
+# in parallel.  Each folder remembers the names of its children, and a folder out of reach is only fetched again once
+# that list changes or rewalk_interval has passed, since changes further down can't be seen from above.  refetch_all
+# fetches them every time, for callers that need fresh leaf_fields for every job
+########################################################################################################################
+class JobDiscovery:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        max_depth:int=3,
+        leaf_fields:Callable[[FilterNode], FilterNode]=None,
+        refetch_all:bool=False,
+        rewalk_interval:float=300.0
+    ):
+        self.max_depth:int          = max_depth
+        self.refetch_all:bool       = refetch_all
+        self.rewalk_interval:float  = rewalk_interval
+
+        # the same query works from the root or from any folder
+        self.filter:CompiledFilter = self.build_filter(max_depth=max_depth, leaf_fields=leaf_fields)
+
+        # folder path ('' for the root) -> sorted names of its children when we last saw it
+        self.signatures:dict[str, tuple[str, ...]] = {}
+
+        # folder path -> full names of the jobs, and of the folders, directly inside it
+        self.folder_jobs:dict[str, set[str]]    = {}
+        self.subfolders:dict[str, set[str]]     = {}
+
+        # folder path -> when it was last fetched on its own
+        self.fetched:dict[str, float] = {}
+
+    ####################################################################################################################
+    # jobs[name,_class,<leaf_fields>,jobs[...]] nested max_depth times.  The last level asks for the names of its
+    # children only, which is enough to tell whether a folder out of reach changed
+    ####################################################################################################################
+    @staticmethod
+    def build_filter(max_depth:int, leaf_fields:Callable[[FilterNode], FilterNode]=None) -> CompiledFilter:
+
+        def level(parent, depth:int):
+            node = parent\
+                .begin_filter('jobs')\
+                    .with_filter('name')\
+                    .with_filter('_class')
+
+            if leaf_fields is not None:
+                node = leaf_fields(node)
+
+            if depth < max_depth:
+                level(node, depth + 1)
+            else:
+                node.begin_filter('jobs').with_filter('name').end()
+
+            return node.end()
+
+        return level(FilterList(), 1).compile()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def is_folder(node:dict) -> bool:
+        return 'jobs' in node or node.get('_class') in FOLDER_CLASSES
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def job_names(self) -> set[str]:
+        return set().union(*self.folder_jobs.values())
+
+    ####################################################################################################################
+    # root is the response to self.filter at the root.  fetch returns the response to self.filter for a folder, and
+    # fan_out runs a function over a list and returns the results.  Returns the data of every job seen in this pass
+    # keyed by full name, and whether any folder's contents changed
+    ####################################################################################################################
+    def update(
+        self,
+        root:dict,
+        fetch:Callable[[str], dict],
+        fan_out:Callable[[Callable, list], list]=None
+    ) -> tuple[dict[str, dict], bool]:
+
+        if fan_out is None:
+            fan_out = lambda func, items: [func(x) for x in items]
+
+        found:dict[str, dict] = {}
+
+        changed, pending = self.walk(root, found)
+
+        # the folders out of reach, a level of them at a time
+        while len(pending) > 0:
+            folders_changed, pending = self.walk_folders(pending, fan_out(fetch, pending), found)
+            changed |= folders_changed
+
+        return found, changed
+
+    ####################################################################################################################
+    # update() in steps, for callers that fetch folders their own way (AsyncJenkins awaits them).  walk() takes the root
+    # and walk_folders() each level of folders out of reach, both add the jobs they see to found.  They return whether
+    # any folder's contents changed and the paths of the folders to fetch next
+    ####################################################################################################################
+    def walk(self, root:dict, found:dict[str, dict]) -> tuple[bool, list[str]]:
+        pending:list[str] = []
+
+        changed = self.__walk(root, path='', level=1, found=found, pending=pending)
+
+        return changed, pending
+
+    ####################################################################################################################
+    # results holds the response for each of paths, something falsy where fetching it failed
+    ####################################################################################################################
+    def walk_folders(self, paths:list[str], results:list[dict], found:dict[str, dict]) -> tuple[bool, list[str]]:
+        changed = False
+        pending:list[str] = []
+
+        for path, data in zip(paths, results):
+            # forget what we saw so the folder is tried again
+            if not data:
+                self.signatures.pop(path, None)
+                continue
+
+            self.fetched[path] = time.monotonic()
+
+            changed |= self.__walk(data, path=path, level=1, found=found, pending=pending)
+
+        return changed, pending
+
+    ####################################################################################################################
+    # data holds the children of path, level is how deep they are in the query that fetched them
+    ####################################################################################################################
+    def __walk(self, data:dict, path:str, level:int, found:dict[str, dict], pending:list[str]) -> bool:
+        nodes = data.get('jobs') or []
+
+        signature   = tuple(sorted(node['name'] for node in nodes))
+        changed     = self.signatures.get(path) != signature
+
+        self.signatures[path] = signature
+
+        # only the names came back, what we know about this folder still stands unless they changed
+        if level > self.max_depth:
+            stale = time.monotonic() - self.fetched.get(path, float('-inf')) >= self.rewalk_interval
+            if changed or stale or self.refetch_all:
+                pending.append(path)
+            return changed
+
+        jobs:set[str]       = set()
+        folders:set[str]    = set()
+
+        for node in nodes:
+            full_name = f'{path}/{node["name"]}' if path else node['name']
+
+            if self.is_folder(node):
+                folders.add(full_name)
+                changed |= self.__walk(node, path=full_name, level=level + 1, found=found, pending=pending)
+            else:
+                jobs.add(full_name)
+                found[full_name] = node
+
+        for folder in self.subfolders.get(path, set()).difference(folders):
+            self.__forget(folder)
+
+        self.folder_jobs[path]  = jobs
+        self.subfolders[path]   = folders
+
+        return changed
+
+    ####################################################################################################################
+    # a folder went away, along with everything under it
+    ####################################################################################################################
+    def __forget(self, path:str):
+        for folder in self.subfolders.pop(path, set()):
+            self.__forget(folder)
+
+        self.folder_jobs.pop(path, None)
+        self.signatures.pop(path, None)
+        self.fetched.pop(path, None)
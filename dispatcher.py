@@ -0,0 +1,236 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    collections             import OrderedDict
+from    contextlib              import contextmanager
+from    metrics                 import Metrics
+from    threading               import Condition, Lock, Thread, current_thread, local
+import  time
+from    typing                  import Callable, Hashable, Iterator
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# what submit() does when max_pending events are already waiting
+########################################################################################################################
+OVERFLOW_BLOCK          = 'block'       # wait for room, the poller slows down to the pace of the listeners
+OVERFLOW_DROP_OLDEST    = 'drop_oldest' # throw away the event that has been waiting longest
+OVERFLOW_COALESCE       = 'coalesce'    # queue it anyway, there is never more than one event per instance or job
+
+OVERFLOW_POLICIES:tuple[str, ...] = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+
+########################################################################################################################
+# Calls listeners on worker threads so a slow one can't hold up polling.  Events are keyed by what they are about, an
+# instance or a job, and an event submitted while another for the same key is still waiting replaces its arguments
+# rather than queueing behind it.  The listeners read the instance itself, so a burst of updates is delivered once
+# with the latest state, unless the event is submitted with a merge.  Events for a key are never delivered concurrently
+# or out of order.  Worker threads are started by the first event
+########################################################################################################################
+class Dispatcher:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        max_pending:int=10_000,
+        overflow:str=OVERFLOW_BLOCK,
+        workers:int=1,
+        metrics:Metrics=None
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy {overflow}, expected one of {", ".join(OVERFLOW_POLICIES)}')
+
+        self.max_pending:int    = max_pending
+        self.overflow:str       = overflow
+        self.workers:int        = workers
+        self.metrics:Metrics    = metrics
+
+        # key -> (func, args, when it was first submitted), oldest first
+        self.pending:OrderedDict[Hashable, tuple[Callable, tuple, float]] = OrderedDict()
+
+        # keys whose event a worker is running right now, held back until it is done
+        self.running:set[Hashable] = set()
+
+        # workers wait on available and a blocked submit() on room, both over lock like queue.Queue
+        self.lock:Lock              = Lock()
+        self.available:Condition    = Condition(self.lock)
+        self.room:Condition         = Condition(self.lock)
+        self.threads:list[Thread]   = []
+        self.closed:bool            = False
+
+        # per thread: how deep in deferring() it is and the events it held back
+        self.held:local             = local()
+
+        if self.metrics is not None:
+            self.metrics.dispatch_queue_depth.set_function(lambda: len(self.pending))
+
+    ####################################################################################################################
+    # have a worker call func(*args), see the class comment.  merge(pending_args, args) gives the arguments of an event
+    # coalesced into one still waiting, by default the new ones replace them
+    ####################################################################################################################
+    def submit(self, key:Hashable, func:Callable, *args, merge:Callable[[tuple, tuple], tuple]=None):
+        if getattr(self.held, 'depth', 0) > 0:
+            self.held.events.append((key, func, args, merge))
+            return
+
+        with self.lock:
+            if self.closed:
+                LOGGER.debug(f'Dispatcher is shut down, dropping event for {key}')
+                return
+
+            if len(self.threads) == 0:
+                self.__start()
+
+            if key in self.pending:
+                _, pending_args, submitted = self.pending[key]
+
+                if merge is not None:
+                    args = merge(pending_args, args)
+
+                self.pending[key] = (func, args, submitted)
+                self.__count('coalesced')
+                return
+
+            if len(self.pending) >= self.max_pending:
+                # a listener submitting from a worker would be waiting on itself
+                if self.overflow == OVERFLOW_BLOCK and current_thread() not in self.threads:
+                    self.__wait_for_room()
+
+                elif self.overflow == OVERFLOW_DROP_OLDEST:
+                    self.pending.popitem(last=False)
+                    self.__count('dropped')
+
+            # closed while we were blocked
+            if self.closed:
+                return
+
+            self.pending[key] = (func, args, time.monotonic())
+            self.available.notify()
+
+    ####################################################################################################################
+    # events this thread submits inside are held back and only submitted once it leaves the outermost deferring().
+    # Taken before a lock a listener might want, so a submit() blocked on a full queue isn't holding it:
+    #
+    #   with dispatcher.deferring(), self.lock:
+    ####################################################################################################################
+    @contextmanager
+    def deferring(self) -> Iterator[None]:
+        if getattr(self.held, 'depth', 0) == 0:
+            self.held.depth     = 0
+            self.held.events    = []
+
+        self.held.depth += 1
+        try:
+            yield
+        finally:
+            self.held.depth -= 1
+
+        if self.held.depth == 0:
+            events, self.held.events = self.held.events, []
+
+            for key, func, args, merge in events:
+                self.submit(key, func, *args, merge=merge)
+
+    ####################################################################################################################
+    # called with the lock held
+    ####################################################################################################################
+    def __wait_for_room(self):
+        start = time.monotonic()
+
+        self.room.wait_for(lambda: len(self.pending) < self.max_pending or self.closed)
+
+        if self.metrics is not None:
+            self.metrics.dispatch_blocked_seconds.inc(amount=time.monotonic() - start)
+
+    ####################################################################################################################
+    # called with the lock held
+    ####################################################################################################################
+    def __start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self.__worker, name=f'Dispatcher_{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    ####################################################################################################################
+    # the oldest event whose key isn't being delivered, or None.  Called with the lock held
+    ####################################################################################################################
+    def __take(self) -> tuple:
+        for key in self.pending:
+            if key not in self.running:
+                self.running.add(key)
+                return (key,) + self.pending.pop(key)
+
+        return None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __worker(self):
+        while True:
+            with self.lock:
+                event = self.__take()
+
+                while event is None:
+                    # pending events are delivered before shutting down
+                    if self.closed and len(self.pending) == 0:
+                        return
+
+                    self.available.wait()
+                    event = self.__take()
+
+                # there is room for a blocked submit now
+                self.room.notify()
+
+            key, func, args, submitted = event
+
+            if self.metrics is not None:
+                self.metrics.dispatch_lag_seconds.observe(time.monotonic() - submitted)
+
+            try:
+                func(*args)
+                self.__count('delivered')
+            except Exception:
+                LOGGER.exception(f'Listener failed for {key}')
+                self.__count('failed')
+
+            with self.lock:
+                self.running.discard(key)
+
+                # an event for the same key may have been waiting on this one, and once closed the others may be
+                # waiting for the last event to go before they exit
+                if self.closed:
+                    self.available.notify_all()
+                elif key in self.pending:
+                    self.available.notify()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __count(self, outcome:str):
+        if self.metrics is not None:
+            self.metrics.dispatch_events.inc(outcome)
+
+    ####################################################################################################################
+    # number of events waiting to be delivered
+    ####################################################################################################################
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    ####################################################################################################################
+    # deliver what is already queued and stop the workers, later events are dropped
+    ####################################################################################################################
+    def shutdown(self, wait:bool=True):
+        with self.lock:
+            self.closed = True
+            self.available.notify_all()
+            self.room.notify_all()
+
+        if wait:
+            # a listener can stop the client from a worker
+            for thread in self.threads:
+                if thread is not current_thread():
+                    thread.join()
@@ -36,3 +36,27 @@ class JobInstanceNotBuilding(Exception):
 class JobWaiting(Exception):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+
+
+########################################################################################################################
+# Base for anything that went wrong talking to the controller
+########################################################################################################################
+class CommunicationError(Exception):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class RequestTimeout(CommunicationError):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+########################################################################################################################
+# The circuit breaker is open and the request was shed without being sent
+########################################################################################################################
+class CircuitOpen(CommunicationError):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
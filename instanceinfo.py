@@ -0,0 +1,94 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    collections.abc         import MutableMapping
+from    typing                  import Iterator
+
+
+########################################################################################################################
+# info key -> JobInstance attribute it reads from
+########################################################################################################################
+INFO_FIELDS:dict[str, str] = {
+    'build_id'  : 'build_id',
+    'queue_id'  : 'queue_id',
+    'name'      : 'name',
+    'complete'  : 'complete',
+    'in_queue'  : 'in_queue',
+    'building'  : 'building',
+    'duration'  : 'duration_in_ms',
+}
+
+
+########################################################################################################################
+# JobInstance.info.  The standard keys are read straight from the instance so nothing has to be kept in sync, anything
+# else (properties fetched by get_build_property) lives in the instance's extra_info dict, made on first write
+########################################################################################################################
+class InstanceInfo(MutableMapping):
+
+    __slots__ = ('instance',)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, instance):
+        self.instance = instance
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __getitem__(self, key:str):
+        if key in INFO_FIELDS:
+            return getattr(self.instance, INFO_FIELDS[key])
+
+        extra = self.instance.extra_info
+        if extra is None:
+            raise KeyError(key)
+
+        return extra[key]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __setitem__(self, key:str, value):
+        if key in INFO_FIELDS:
+            setattr(self.instance, INFO_FIELDS[key], value)
+            return
+
+        if self.instance.extra_info is None:
+            self.instance.extra_info = {}
+
+        self.instance.extra_info[key] = value
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __delitem__(self, key:str):
+        if key in INFO_FIELDS:
+            raise KeyError(f"{key} can't be removed from a JobInstance's info")
+
+        extra = self.instance.extra_info
+        if extra is None:
+            raise KeyError(key)
+
+        del extra[key]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __iter__(self) -> Iterator[str]:
+        yield from INFO_FIELDS
+
+        if self.instance.extra_info is not None:
+            yield from list(self.instance.extra_info)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __len__(self) -> int:
+        return len(INFO_FIELDS) + len(self.instance.extra_info or ())
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __repr__(self) -> str:
+        return repr(dict(self))
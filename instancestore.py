@@ -0,0 +1,176 @@
+########################################################################################################################
+#
+########################################################################################################################
+import  heapq
+from    threading               import RLock
+from    typing                  import Iterator
+
+
+########################################################################################################################
+# Indexes a job's instances by build id and by queue id.  Once more than max_history builds are held, completed ones
+# are evicted oldest build first so long running watchers don't grow forever.  Instances that completed without a
+# build, cancelled in the queue, are bounded to max_history of their own and evicted oldest first
+########################################################################################################################
+class InstanceStore:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, max_history:int=100):
+
+        self.max_history:int = max_history
+
+        # never acquires any other lock while held, so it is safe to take from under a Job or JobInstance lock
+        self.lock:RLock = RLock()
+
+        # insertion ordered, keyed by the instance itself since it may not have a build id yet.  Instances hash by
+        # identity, and unlike an id() key this doesn't cost an int per tracked build
+        self.instances:dict['JobInstance', 'JobInstance'] = {}
+
+        self.by_build:dict[int, 'JobInstance'] = {}
+        self.by_queue:dict[int, 'JobInstance'] = {}
+
+        # build ids in eviction order.  Entries whose instance is gone are skipped when popped
+        self.eviction_heap:list[int] = []
+
+        # complete instances that never got a build, in the order they completed
+        self.unbuilt:dict['JobInstance', None] = {}
+
+        # queued instances whose queue item the server no longer knows, waiting for a build to claim them
+        self.orphans:dict['JobInstance', None] = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __len__(self) -> int:
+        return len(self.instances)
+
+    ####################################################################################################################
+    # iterates over a snapshot so callers don't need to hold the lock
+    ####################################################################################################################
+    def __iter__(self) -> Iterator['JobInstance']:
+        with self.lock:
+            return iter(list(self.instances.values()))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __index_build(self, inst:'JobInstance'):
+        self.by_build[inst.build_id] = inst
+        heapq.heappush(self.eviction_heap, inst.build_id)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def add(self, inst:'JobInstance'):
+        with self.lock:
+            self.instances[inst] = inst
+
+            if inst.build_id is not None:
+                self.__index_build(inst)
+
+            if inst.queue_id is not None:
+                self.by_queue[inst.queue_id] = inst
+
+            inst.store = self
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def remove(self, inst:'JobInstance'):
+        with self.lock:
+            if self.instances.pop(inst, None) is None:
+                return
+
+            if self.by_build.get(inst.build_id) is inst:
+                del self.by_build[inst.build_id]
+
+            if self.by_queue.get(inst.queue_id) is inst:
+                del self.by_queue[inst.queue_id]
+
+            self.unbuilt.pop(inst, None)
+            self.orphans.pop(inst, None)
+
+            inst.store = None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def find(self, build_id:int=None, queue_id:int=None) -> 'JobInstance':
+        with self.lock:
+            inst = None
+
+            if build_id is not None:
+                inst = self.by_build.get(build_id)
+
+            if inst is None and queue_id is not None:
+                inst = self.by_queue.get(queue_id)
+
+            return inst
+
+    ####################################################################################################################
+    # a queued instance was given its build number, set it and index it in one step so a concurrent find() can never
+    # see the instance under neither id
+    ####################################################################################################################
+    def assign_build_id(self, inst:'JobInstance', build_id:int):
+        with self.lock:
+            inst.build_id = build_id
+
+            self.orphans.pop(inst, None)
+
+            if inst in self.instances:
+                self.__index_build(inst)
+
+    ####################################################################################################################
+    # inst is still queued as far as we know, but its queue item is gone
+    ####################################################################################################################
+    def orphan(self, inst:'JobInstance'):
+        with self.lock:
+            if inst in self.instances and inst.build_id is None:
+                self.orphans[inst] = None
+
+    ####################################################################################################################
+    # inst completed without a build, the oldest of those beyond max_history are dropped straight away.  Nothing else
+    # would, they don't show up in the builds a diff evicts by
+    ####################################################################################################################
+    def completed_unbuilt(self, inst:'JobInstance'):
+        with self.lock:
+            self.orphans.pop(inst, None)
+
+            if inst not in self.instances:
+                return
+
+            self.unbuilt[inst] = None
+
+            while len(self.unbuilt) > self.max_history:
+                self.remove(next(iter(self.unbuilt)))
+
+    ####################################################################################################################
+    # drop completed instances, oldest build first, until no more than max_history builds are held.  Instances still in
+    # the queue don't count, otherwise we'd evict builds the server keeps sending back.  Returns what was evicted
+    ####################################################################################################################
+    def evict(self) -> list['JobInstance']:
+        evicted:list['JobInstance'] = []
+
+        with self.lock:
+            # incomplete builds can't be evicted, put them back once we are done
+            held:list[int] = []
+
+            while len(self.by_build) > self.max_history and len(self.eviction_heap) > 0:
+                build_id = heapq.heappop(self.eviction_heap)
+                inst = self.by_build.get(build_id)
+
+                if inst is None:
+                    continue
+
+                if not inst.complete:
+                    held.append(build_id)
+                    continue
+
+                self.remove(inst)
+                evicted.append(inst)
+
+            for build_id in held:
+                heapq.heappush(self.eviction_heap, build_id)
+
+        return evicted
@@ -2,20 +2,41 @@
 #
 ########################################################################################################################
 
-from api.tree.filterlist import FilterList
+from    api.api                 import API
 from    api.jenkinsapi          import JenkinsAPI
+from    api.tree.compiledfilter import CompiledFilter
+from    api.tree.filterlist     import FilterList
 
 import  argparse
-from    exceptions              import InvalidResponse
+from    batchlauncher           import BatchLauncher
+from    concurrent.futures      import Future, ThreadPoolExecutor
+from    decoding                import SHAPE_JOB, Decoder
+from    discovery               import JobDiscovery
+from    dispatcher              import OVERFLOW_BLOCK, Dispatcher
+from    exceptions              import CommunicationError, InvalidResponse
+import  fnmatch
+import  json
+import  os
 from    jobinstance             import JobInstance
+from    metrics                 import Metrics
 from    network.communicator    import Communicator
+from    network.responsecache   import ResponseCache
 from    job                     import Job
 
 from    requests.models         import Response
+from    queue                   import Empty, Queue
+from    queuetracker            import QueueTracker
+from    scheduler               import HOST_POLL_KEY, LOG_POLL_KEY, QUEUE_POLL_KEY, PollScheduler
 import  sys
-from    threading               import Thread
+from    threading               import Event, Lock, RLock, Thread
 import  time
-from    typing                  import Callable
+from    typing                  import TYPE_CHECKING, Callable, Iterable, Iterator
+
+# only imported by clients that use them, see __init__
+if TYPE_CHECKING:
+    from buildcache             import BuildCache
+    from metricsserver          import MetricsServer
+    from notificationreceiver   import NotificationReceiver
 
 import  logging
 logging.basicConfig()
@@ -24,11 +45,48 @@ LOGGER = logging.getLogger(__file__)
 LOGGER.setLevel(logging.INFO)
 
 
+########################################################################################################################
+# poll modes for the status thread
+########################################################################################################################
+POLL_MODE_TREE  = 'tree'    # a single host level tree query per cycle
+POLL_MODE_JOB   = 'job'     # one query per job, plus one per incomplete instance
+
+########################################################################################################################
+# what job_info() asks for when it isn't given fields
+########################################################################################################################
+INFO_FILTER:CompiledFilter = FilterList()\
+    .with_filter('name')\
+    .with_filter('url')\
+    .with_filter('color')\
+    .with_filter('buildable')\
+    .with_filter('inQueue')\
+    .begin_filter('lastBuild')\
+        .with_filter('number')\
+        .with_filter('building')\
+        .with_filter('result')\
+        .with_filter('timestamp')\
+        .with_filter('duration')\
+        .end()\
+    .begin_filter('lastSuccessfulBuild')\
+        .with_filter('number')\
+        .end()\
+    .begin_filter('lastFailedBuild')\
+        .with_filter('number')\
+        .end()\
+    .compile()
+
+########################################################################################################################
+# command line output formats
+########################################################################################################################
+OUTPUT_TABLE    = 'table'
+OUTPUT_JSON     = 'json'    # one JSON object per line
+
+
 ########################################################################################################################
 #
 ########################################################################################################################
 class JobNotFound(Exception):
-    def __init__(*args, **kwargs):
+    def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
 
@@ -40,119 +98,565 @@ class Jenkins:
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __init__(self, url_base:str, username:str, password:str=None, api_token:str=None, api_token_file:str=None):
+    def __init__(
+        self,
+        url_base:str,
+        username:str,
+        password:str=None,
+        api_token:str=None,
+        api_token_file:str=None,
+        poll_mode:str=POLL_MODE_TREE,
+        max_history:int=100,
+        active_poll_interval:float=.25,
+        max_poll_interval:float=30.0,
+        poll_backoff:float=2.0,
+        max_workers:int=8,
+        cache_responses:bool=True,
+        response_cache:ResponseCache=None,
+        connect_timeout:float=5.0,
+        read_timeout:float=30.0,
+        retries:int=3,
+        max_launches_in_flight:int=8,
+        launches_per_second:float=None,
+        notification_port:int=None,
+        notification_host:str='127.0.0.1',
+        notification_token:str=None,
+        reconcile_interval:float=60.0,
+        folder_depth:int=3,
+        build_cache_path:str=None,
+        build_cache_size:int=100_000,
+        metrics:Metrics=None,
+        metrics_port:int=None,
+        metrics_host:str='127.0.0.1',
+        decoder:Decoder=None,
+        lazy:bool=False,
+        dispatch_queue_size:int=10_000,
+        dispatch_overflow:str=OVERFLOW_BLOCK,
+        dispatch_workers:int=1
+    ):
+
+        # request, poll and tracking metrics, see metrics.py.  Pass one in to share it between clients
+        self.metrics:Metrics = metrics if metrics is not None else Metrics()
+
+        # share GET responses between the poller and callers unless told not to, a cache can be passed in to tune ttls
+        if cache_responses and response_cache is None:
+            response_cache = ResponseCache()
 
         # Create the communicator
         self.communicator = Communicator(
             username=username,
             password=password,
             api_token=api_token,
-            api_token_file=api_token_file
+            api_token_file=api_token_file,
+            cache=response_cache if cache_responses else None,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries=retries,
+            # a connection for every thread that sends requests: the poller's workers, the batch launcher's, listeners
+            # on the dispatcher's, and a little room for the status thread and whatever callers send from their own
+            pool_size=max_workers + max_launches_in_flight + dispatch_workers + 2,
+            metrics=self.metrics
         )
 
         # create the api
         self.api:JenkinsAPI = JenkinsAPI(
             url_base=url_base,
             communicator=self.communicator,
+            decoder=decoder
+        )
+
+        # completed builds survive restarts here, shared by every job
+        self.build_cache:'BuildCache' = None
+        if build_cache_path is not None:
+            from buildcache import BuildCache
+            self.build_cache = BuildCache(path=build_cache_path, controller=url_base, max_entries=build_cache_size)
+
+        # job change and instance update listeners are called from here rather than from the polling threads, see
+        # dispatcher.py for what happens when they can't keep up
+        self.dispatcher:Dispatcher = Dispatcher(
+            max_pending=dispatch_queue_size,
+            overflow=dispatch_overflow,
+            workers=dispatch_workers,
+            metrics=self.metrics
         )
 
         # list of jobs that we have
         self.jobs:dict[str, Job] = {}
 
-        # say that we have/have not initialize
-        self.initialized = False
+        # jobs are added by the status thread, by callers and by the notification receiver
+        self.jobs_lock:RLock = RLock()
+
+        # how the status thread keeps jobs up to date
+        self.poll_mode:str      = poll_mode
+        self.max_history:int    = max_history
+        self.max_workers:int    = max_workers
+
+        # walks folders for jobs.  In tree mode the same query carries every job's most recent builds, so each folder
+        # out of reach of the host query has to be fetched every cycle.  In job mode only names are needed and
+        # folders are only fetched again once their contents change
+        if self.poll_mode == POLL_MODE_TREE:
+            self.discovery:JobDiscovery = JobDiscovery(
+                max_depth=folder_depth,
+                leaf_fields=lambda node: Job.add_builds_filter(node, self.max_history),
+                refetch_all=True
+            )
+        else:
+            self.discovery:JobDiscovery = JobDiscovery(max_depth=folder_depth)
+
+        # when each job (or the whole host in tree mode) is due to be polled again
+        self.scheduler:PollScheduler = PollScheduler(
+            active_interval=active_poll_interval,
+            max_interval=max_poll_interval,
+            backoff=poll_backoff
+        )
+
+        # resolves every queued instance from a single /queue request
+        self.queue_tracker:QueueTracker = QueueTracker(self.api)
+
+        # instances whose console output is being pushed to listeners by the status thread
+        self.log_followers:list[JobInstance] = []
+        self.log_followers_lock:Lock = Lock()
+
+        # job and instance refreshes are fanned out here so a cycle costs the slowest request rather than all of them
+        self.executor:ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='StatusWorker',
+            initializer=self.communicator.set_background
+        )
+
+        # bulk build requests, see start_batch()
+        self.batch_launcher:BatchLauncher = BatchLauncher(
+            spawn=lambda job_name, params, status_callback: self.get_job(job_name).spawn_instance(params, status_callback),
+            max_in_flight=max_launches_in_flight,
+            requests_per_second=launches_per_second
+        )
+
+        # with a notification receiver events are pushed to us, polling only sweeps up anything that was missed.  Keep
+        # reconcile_interval well below the five minutes Jenkins remembers a queue item for once it has left the queue.
+        # An instance whose STARTED event was dropped is then usually resolved by its queue item; past that the item is
+        # gone and it waits for the builds diff to claim it by queue id, see JobInstance.from_queue_response()
+        self.reconcile_interval:float = reconcile_interval
+        self.notification_receiver:'NotificationReceiver' = None
+
+        if notification_port is not None:
+            from notificationreceiver import NotificationReceiver
+            self.notification_receiver = NotificationReceiver(
+                on_event=self.__on_notification,
+                host=notification_host,
+                port=notification_port,
+                token=notification_token
+            )
+
+            self.scheduler.set_min_interval(HOST_POLL_KEY, self.reconcile_interval)
+            self.scheduler.set_min_interval(QUEUE_POLL_KEY, self.reconcile_interval)
+
+            self.notification_receiver.start()
+
+        # read when the metrics are collected, nothing is counted while polling
+        self.metrics.tracked_jobs.set_function(lambda: len(self.jobs))
+        self.metrics.tracked_instances.set_function(
+            lambda: sum(len(job.store) for job in list(self.jobs.values()))
+        )
+
+        # optional /metrics endpoint for a Prometheus scraper
+        self.metrics_server:'MetricsServer' = None
+
+        if metrics_port is not None:
+            from metricsserver import MetricsServer
+            self.metrics_server = MetricsServer(registry=self.metrics, host=metrics_host, port=metrics_port)
+            self.metrics_server.start()
+
+        # set once the status thread has been through its first cycle
+        self.initialized_event:Event = Event()
 
         self.job_change_listeners:list[Callable[[Job, bool]]] = []
 
-        # our status thread
-        self.status_thread:Thread       = Thread(target=self.__status_thread_entry, name='StatusThread')
+        # (callback, fields) given to every job, see register_change_listener()
+        self.build_change_listeners:list[tuple[Callable[[JobInstance, dict], None], tuple]] = []
+
+        # our status thread.  A lazy client only starts it once something subscribes: a build is started with a
+        # status callback, a log is followed, job changes are listened for or start_polling() is called.  Until then only the requests a
+        # caller makes are sent, which is all a one shot command needs
+        self.status_thread:Thread       = None
+        self.status_thread_lock:Lock    = Lock()
         self.status_thread_exit:bool    = False
-        self.status_thread.start()
+        self.status_thread_wakeup:Event = Event()
+
+        # pushed events are reconciled by polling, so a receiver needs the thread from the start
+        if not lazy or self.notification_receiver is not None:
+            self.start_polling()
+
+    ####################################################################################################################
+    # start the status thread if it isn't running yet
+    ####################################################################################################################
+    def start_polling(self):
+        with self.status_thread_lock:
+            if self.status_thread is not None or self.status_thread_exit:
+                return
+
+            self.status_thread = Thread(target=self.__status_thread_entry, name='StatusThread')
+            self.status_thread.start()
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def __status_thread_entry(self):
 
-        # set the crumbs
-        self.communicator.set_crumbs(*self.api.crumb_api.crumb())
+        # everything the poller sends may be shed by the circuit breaker
+        self.communicator.set_background(True)
+
+        # the host is polled first so the job list exists before any job is
+        self.scheduler.reset(HOST_POLL_KEY)
+
+        # in tree mode the queue is checked along with the host
+        if self.poll_mode == POLL_MODE_JOB:
+            self.scheduler.reset(QUEUE_POLL_KEY)
 
         while not self.status_thread_exit:
 
+            due     = self.scheduler.due()
+            start   = time.monotonic()
+
+            if self.poll_mode == POLL_MODE_TREE:
+                self.__poll_tree(due)
+            else:
+                self.__poll_jobs(due)
+
+            self.__poll_logs(due)
+
+            # a wake up with nothing due isn't a cycle
+            if len(due) > 0:
+                self.metrics.poll_cycle_seconds.observe(time.monotonic() - start, self.poll_mode)
+
+            self.initialized_event.set()
+
+            # sleep until the next deadline, a spawned instance wakes us up early
+            self.status_thread_wakeup.clear()
+            self.status_thread_wakeup.wait(self.scheduler.time_until_next())
+
+    ####################################################################################################################
+    # whether the status thread has been through its first cycle
+    ####################################################################################################################
+    @property
+    def initialized(self) -> bool:
+        return self.initialized_event.is_set()
+
+    ####################################################################################################################
+    # block until the first poll cycle is done or timeout seconds pass, starting the status thread if it isn't yet
+    ####################################################################################################################
+    def wait_initialized(self, timeout:float=None) -> bool:
+        self.start_polling()
+        return self.initialized_event.wait(timeout)
+
+    ####################################################################################################################
+    # fallback path, one request for the job list then one per job that is due.  Jobs are refreshed concurrently on
+    # the worker pool, then every instance they asked to refresh is fanned out the same way
+    ####################################################################################################################
+    def __poll_jobs(self, due_keys:list):
+
+        due:list[Job] = []
+
+        for key in due_keys:
+
             # get jobs from the server and create as necessary
-            try:
-                self.__jobs_from_response(
-                    response=self.api.host_api.info(filter=FilterList().begin_filter('jobs').with_filter('name'))
+            if key == HOST_POLL_KEY:
+                changed = False
+                try:
+                    changed = self.__discover(
+                        self.__validate(self.api.host_api.info(filter=self.discovery.filter))
+                    )[1]
+                except (InvalidResponse, CommunicationError):
+                    pass
+
+                self.scheduler.reschedule(HOST_POLL_KEY, active=False, changed=changed)
+
+            # everything still waiting in the queue in one request
+            elif key == QUEUE_POLL_KEY:
+                self.scheduler.reschedule(
+                    QUEUE_POLL_KEY,
+                    active=False,
+                    changed=self.queue_tracker.update(fan_out=self.__fan_out)
                 )
-            except InvalidResponse:
-                pass
 
-            for job in self.jobs.values():
-                job.update()
+            elif key in self.jobs:
+                due.append(self.jobs[key])
+
+        # refresh the due jobs, collecting the instances each one needs refreshed
+        deferred:dict[str, list[JobInstance]] = {job.name:[] for job in due}
+        changed:dict[str, bool] = dict(zip(
+            deferred.keys(),
+            self.__fan_out(lambda job: job.update(deferred=deferred[job.name]), due)
+        ))
+
+        # refresh the instances
+        instances = [(name, inst) for name, insts in deferred.items() for inst in insts]
+        for (name, _), inst_changed in zip(instances, self.__fan_out(lambda x: x[1].update(), instances)):
+            changed[name] |= inst_changed
+
+        for job in due:
+            self.scheduler.reschedule(job.name, active=job.has_active_builds(), changed=changed[job.name])
+
+    ####################################################################################################################
+    # one request for every job and its builds, diffed against what we already have in memory
+    ####################################################################################################################
+    def __poll_tree(self, due_keys:list):
+
+        if HOST_POLL_KEY not in due_keys:
+            return
+
+        changed = False
+        try:
+            found, changed = self.__discover(self.__validate(self.api.host_api.info(filter=self.discovery.filter)))
+
+            for job_name, job_data in found.items():
+                job = self.jobs.get(job_name)
+                if job is None:
+                    continue
+
+                changed |= job.from_json(job_data, refresh_instances=False)
+
+        except (InvalidResponse, CommunicationError):
+            pass
+
+        # instances still sitting in the queue don't show up in the builds list yet, ask the queue about them
+        changed |= self.queue_tracker.update(fan_out=self.__fan_out)
 
-            if not self.initialized:
-                self.initialized = True
+        self.scheduler.reschedule(
+            HOST_POLL_KEY,
+            active=any(job.has_active_builds() for job in list(self.jobs.values())),
+            changed=changed
+        )
+
+    ####################################################################################################################
+    # pull new console output for every followed instance, dropping the ones whose log has ended
+    ####################################################################################################################
+    def __poll_logs(self, due_keys:list):
+
+        if LOG_POLL_KEY not in due_keys:
+            return
+
+        with self.log_followers_lock:
+            followers = list(self.log_followers)
+
+        changed = any(self.__fan_out(lambda inst: inst.update_log(), followers))
+
+        with self.log_followers_lock:
+            self.log_followers = [inst for inst in self.log_followers if inst.following_log]
 
-            time.sleep(.25)
+            if len(self.log_followers) == 0:
+                self.scheduler.remove(LOG_POLL_KEY)
+            else:
+                self.scheduler.reschedule(LOG_POLL_KEY, active=False, changed=changed)
+
+    ####################################################################################################################
+    # run func over items on the worker pool and return the results in order.  Invalid responses count as no change
+    ####################################################################################################################
+    def __fan_out(self, func:Callable, items:list) -> list[bool]:
+
+        def run(item) -> bool:
+            try:
+                return func(item)
+            except (InvalidResponse, CommunicationError):
+                return False
+
+        # not worth the hand off
+        if len(items) <= 1:
+            return [run(item) for item in items]
+
+        return list(self.executor.map(run, items))
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __jobs_from_response(self, response:Response):
-        if response.status_code != 200:
+    def __validate(self, response:Response, shape:str=SHAPE_JOB) -> dict:
+        if response is None or response.status_code != 200:
             raise InvalidResponse("Invalid Response")
 
-        data = response.json()
+        # the discovery filter unless told otherwise, a query with fields the records don't have passes None
+        return self.api.decoder.decode(response, shape)
+
+    ####################################################################################################################
+    # walk the folders from the host level response.  Returns the data of every job seen keyed by full name, and
+    # whether any job was added or removed
+    ####################################################################################################################
+    def __discover(self, data:dict) -> tuple[dict[str, dict], bool]:
+        found, folders_changed = self.discovery.update(
+            data,
+            fetch=lambda path: self.__validate(self.api.job_api.info(job_name=path, filter=self.discovery.filter)),
+            fan_out=self.__fan_out
+        )
+
+        # nothing moved, no need to diff every job we know about
+        if not folders_changed:
+            return found, False
 
-        # get all of the job names that were given to us
-        job_names = [x['name'] for x in data['jobs']]
+        return found, self.__jobs_from_names(self.discovery.job_names())
 
-        # figure out what to add and remove from jobs dict
-        jobs_to_add     = list(set(job_names).difference(set(self.jobs.keys())))
-        jobs_to_remove  = list(set(self.jobs.keys()).difference(set(job_names)))
+    ####################################################################################################################
+    # returns True if any job was added or removed
+    ####################################################################################################################
+    def __jobs_from_names(self, job_names:set[str]) -> bool:
 
-        for job in jobs_to_remove:
-            for c in self.job_change_listeners:
-                c(job, False)
-            del self.jobs[job]
+        # job change listeners may call get_job(), they are only handed to the dispatcher once jobs_lock is released
+        with self.dispatcher.deferring(), self.jobs_lock:
+            # figure out what to add and remove from jobs dict
+            jobs_to_add     = list(set(job_names).difference(set(self.jobs.keys())))
+            jobs_to_remove  = list(set(self.jobs.keys()).difference(set(job_names)))
 
-        for job in jobs_to_add:
-            # add the job to the queue
-            self.jobs[job] = Job(
-                name=job,
-                api=self.api
-            )
-            for c in self.job_change_listeners:
-                c(self.jobs[job], True)
+            for job in jobs_to_remove:
+                self.__notify_job_change(job, False)
+                del self.jobs[job]
+                self.scheduler.remove(job)
+
+            for job in jobs_to_add:
+                self.__add_job(job)
+
+        return len(jobs_to_add) > 0 or len(jobs_to_remove) > 0
 
     ####################################################################################################################
-    #
+    # a job we learned about from the server, as opposed to one a caller asked for
     ####################################################################################################################
-    def get_job(self, job_name:str) -> Job:
+    def __add_job(self, job_name:str) -> Job:
+        with self.dispatcher.deferring(), self.jobs_lock:
+            self.jobs[job_name] = self.__create_job(job_name)
+            self.__notify_job_change(self.jobs[job_name], True)
 
-        # we already have this job, just return it
-        if job_name in self.jobs:
             return self.jobs[job_name]
 
-        # create an instance
+    ####################################################################################################################
+    # job is the Job that was added, or the name of the one that was removed.  A job that comes and goes before its
+    # listeners get to it is only reported the way it ended up
+    ####################################################################################################################
+    def __notify_job_change(self, job:Job|str, added:bool):
+        if len(self.job_change_listeners) == 0:
+            return
+
+        self.dispatcher.submit(
+            ('job', job.name if added else job),
+            self.__call_job_change_listeners,
+            job,
+            added
+        )
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __call_job_change_listeners(self, job:Job|str, added:bool):
+        for c in list(self.job_change_listeners):
+            c(job, added)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __create_job(self, job_name:str) -> Job:
         job:Job = Job(
             name=job_name,
-            api=self.api
+            api=self.api,
+            max_history=self.max_history,
+            build_cache=self.build_cache,
+            dispatcher=self.dispatcher
         )
 
-        # add to the jobs dict
-        self.jobs[job_name] = job
+        # a new build means fast polling for whatever key covers this job
+        job.register_spawn(self.__on_spawn)
+
+        for callback, fields in self.build_change_listeners:
+            job.register_change_listener(callback, fields)
+
+        if self.poll_mode == POLL_MODE_JOB:
+            self.scheduler.reset(job_name)
+
+            if self.notification_receiver is not None:
+                self.scheduler.set_min_interval(job_name, self.reconcile_interval)
 
         return job
 
+    ####################################################################################################################
+    # payload is a Notification plugin event, {"name": job name, "build": {"number", "queue_id", "phase", ...}}
+    ####################################################################################################################
+    def __on_notification(self, payload:dict):
+        build = payload.get('build')
+
+        # jobs are keyed by full name, only the url has the folders a job is in
+        if isinstance(payload.get('url'), str):
+            job_name = API.job_name(payload['url'])
+        else:
+            job_name = payload.get('name')
+
+        if not isinstance(job_name, str) or not isinstance(build, dict):
+            raise InvalidResponse("Notification is missing the job name or build")
+
+        with self.dispatcher.deferring(), self.jobs_lock:
+            job = self.jobs.get(job_name)
+            if job is None:
+                job = self.__add_job(job_name)
+
+        try:
+            job.from_notification(build)
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidResponse(f"Malformed notification for {job_name}: {e}") from e
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __on_spawn(self, job:Job, job_instance:JobInstance):
+        self.queue_tracker.track(job_instance)
+
+        if self.poll_mode == POLL_MODE_TREE:
+            self.scheduler.reset(HOST_POLL_KEY)
+        else:
+            self.scheduler.reset(job.name)
+            self.scheduler.reset(QUEUE_POLL_KEY)
+
+        self.status_thread_wakeup.set()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get_job(self, job_name:str) -> Job:
+
+        with self.jobs_lock:
+            # we already have this job, just return it
+            if job_name in self.jobs:
+                return self.jobs[job_name]
+
+            # create an instance
+            job:Job = self.__create_job(job_name)
+
+            # add to the jobs dict
+            self.jobs[job_name] = job
+
+            return job
+
     ####################################################################################################################
     #
     ####################################################################################################################
     def stop(self):
-        if self.status_thread:
+        with self.status_thread_lock:
+            if self.status_thread_exit:
+                return
+
             self.status_thread_exit = True
+
+        if self.status_thread is not None:
+            self.status_thread_wakeup.set()
             self.status_thread.join()
 
+        self.executor.shutdown()
+        self.batch_launcher.shutdown()
+
+        # whatever the poller saw before stopping still reaches the listeners
+        self.dispatcher.shutdown()
+
+        if self.notification_receiver is not None:
+            self.notification_receiver.stop()
+
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+        if self.build_cache is not None:
+            self.build_cache.close()
+
     ####################################################################################################################
     #
     ####################################################################################################################
@@ -174,12 +678,216 @@ class Jenkins:
                 key,value = param.split('=')
                 params[key] = value
 
+        # a lazy client only polls once something is listening
+        if status_callback is not None:
+            self.start_polling()
+
         # get the job
         job:Job = self.get_job(job_name)
 
         # spawn an instance of the job
         return job.spawn_instance(params, status_callback)
 
+    ####################################################################################################################
+    # start many builds concurrently, each request is a (job name, params) pair.  Returns a future per request that
+    # resolves to the JobInstance, or None if the server refused the build.  Identical requests are started once
+    ####################################################################################################################
+    def start_batch(
+        self,
+        requests:list[tuple[str, dict]],
+        status_callback:Callable[[JobInstance], None]=None
+    ) -> list[Future]:
+
+        # create any job we don't know about yet here rather than racing to do it from the launcher threads
+        for job_name in {job_name for job_name, _ in requests}:
+            self.get_job(job_name)
+
+        if status_callback is not None:
+            self.start_polling()
+
+        return self.batch_launcher.launch(requests, status_callback=status_callback)
+
+    ####################################################################################################################
+    # yields each of instances as it completes, already complete ones first.  Nothing is sent for the waiting, every
+    # instance hands itself over from the poll that saw it complete and this thread sleeps until one does.  Raises
+    # TimeoutError if timeout seconds pass with some still running
+    ####################################################################################################################
+    def as_completed(self, instances:Iterable[JobInstance], timeout:float=None) -> Iterator[JobInstance]:
+        self.start_polling()
+
+        pending:list[JobInstance] = list(dict.fromkeys(instances))
+        finished:Queue = Queue()
+
+        for inst in pending:
+            inst.add_done_callback(finished.put)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        for remaining in range(len(pending), 0, -1):
+            try:
+                yield finished.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except Empty:
+                raise TimeoutError(f'{remaining} of {len(pending)} instances still running') from None
+
+    ####################################################################################################################
+    # block until every one of instances completes or timeout seconds pass.  Returns whether they all completed
+    ####################################################################################################################
+    def wait_all(self, instances:Iterable[JobInstance], timeout:float=None) -> bool:
+        try:
+            for _ in self.as_completed(instances, timeout=timeout):
+                pass
+        except TimeoutError:
+            return False
+
+        return True
+
+    ####################################################################################################################
+    # have the status thread push job_instance's console output to log_callback as it is written
+    ####################################################################################################################
+    def follow_log(self, job_instance:JobInstance, log_callback:Callable[[JobInstance, str], None]):
+        job_instance.register_log_listener(log_callback)
+
+        with self.log_followers_lock:
+            if job_instance not in self.log_followers:
+                self.log_followers.append(job_instance)
+
+            self.scheduler.reset(LOG_POLL_KEY)
+
+        self.start_polling()
+        self.status_thread_wakeup.set()
+
+    ####################################################################################################################
+    # every job on the controller and its data for leaf_fields, keyed by full name.  One host level query, plus one
+    # for each folder too deep for it to reach.  Nothing here touches the jobs being tracked
+    ####################################################################################################################
+    def __query_jobs(self, leaf_fields:Callable=None) -> dict[str, dict]:
+        discovery = JobDiscovery(max_depth=self.discovery.max_depth, leaf_fields=leaf_fields)
+
+        found, _ = discovery.update(
+            self.__validate(self.api.host_api.info(filter=discovery.filter), shape=None),
+            fetch=lambda path: self.__validate(
+                self.api.job_api.info(job_name=path, filter=discovery.filter),
+                shape=None
+            ),
+            fan_out=self.__fan_out
+        )
+
+        return found
+
+    ####################################################################################################################
+    # every job with the number of its last build and whether it is still running
+    ####################################################################################################################
+    def __query_last_builds(self) -> dict[str, dict]:
+        return self.__query_jobs(
+            leaf_fields=lambda node: node\
+                .begin_filter('lastBuild')\
+                    .with_filter('number')\
+                    .with_filter('building')\
+                    .end()
+        )
+
+    ####################################################################################################################
+    # full names of every job on the controller, asked of the controller rather than taken from what is tracked
+    ####################################################################################################################
+    def get_jobs(self) -> Iterator[str]:
+        return iter(self.__query_jobs())
+
+    ####################################################################################################################
+    # (job name, build number) for every job whose last build is running, from the same single query as get_jobs()
+    ####################################################################################################################
+    def get_running_jobs(self) -> Iterator[tuple[str, int]]:
+        return (
+            (job_name, node['lastBuild']['number'])
+            for job_name, node in self.__query_last_builds().items()
+            if node.get('lastBuild') is not None and node['lastBuild'].get('building')
+        )
+
+    ####################################################################################################################
+    # exactly the fields asked for, a tree string ("name,lastBuild[number,result]") or a filter.  INFO_FILTER if none
+    ####################################################################################################################
+    def job_info(self, job_name:str, fields:str|FilterList|CompiledFilter=None) -> dict:
+        if fields is None:
+            fields = INFO_FILTER
+        elif isinstance(fields, str):
+            fields = CompiledFilter(fields)
+
+        response = self.api.job_api.info(job_name=job_name, filter=fields)
+
+        if response is not None and response.status_code == 404:
+            raise JobNotFound(job_name)
+
+        return self.__validate(response, shape=None)
+
+    ####################################################################################################################
+    # (job name, build number) for each pattern.  "job#12" is that build.  The job may be a glob over full names
+    # ("folder/*"), and without a number, or with "#*", it means the running last build of every job that matches.
+    # Patterns that need a lookup share one query
+    ####################################################################################################################
+    def resolve_builds(self, patterns:list[str]) -> list[tuple[str, int]]:
+        builds:list[tuple[str, int]]    = []
+        lookups:list[tuple[str, str]]   = []
+
+        for pattern in patterns:
+            job_pattern, _, build = pattern.partition('#')
+
+            if build not in ('', '*') and not build.isdigit():
+                raise ValueError(f'{pattern}: build must be a number or *')
+
+            if build.isdigit() and not any(c in job_pattern for c in '*?['):
+                builds.append((job_pattern, int(build)))
+            else:
+                lookups.append((job_pattern, build))
+
+        if len(lookups) > 0:
+            jobs = self.__query_last_builds()
+
+            for job_pattern, build in lookups:
+                for job_name, node in jobs.items():
+                    if not fnmatch.fnmatchcase(job_name, job_pattern):
+                        continue
+
+                    last_build = node.get('lastBuild')
+
+                    if build.isdigit():
+                        builds.append((job_name, int(build)))
+                    elif last_build is not None and last_build.get('building'):
+                        builds.append((job_name, last_build['number']))
+
+        # the same build from two patterns is only stopped once
+        return list(dict.fromkeys(builds))
+
+    ####################################################################################################################
+    # stop every build the patterns resolve to, see resolve_builds(), all at once.  The patterns are resolved up front,
+    # then (job name, build number, error) is yielded for each build in order, error is None when it was stopped
+    ####################################################################################################################
+    def stop_job(self, patterns:list[str]) -> Iterator[tuple[str, int, str]]:
+        return self.__stop_builds(self.resolve_builds(patterns))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __stop_builds(self, builds:list[tuple[str, int]]) -> Iterator[tuple[str, int, str]]:
+
+        def stop(build:tuple[str, int]) -> tuple[str, int, str]:
+            job_name, build_id = build
+
+            try:
+                response = self.api.build_api.stop(job_name, build_id)
+            except CommunicationError as e:
+                return job_name, build_id, str(e)
+
+            if response is None or response.status_code >= 400:
+                return job_name, build_id, f'HTTP {response.status_code if response is not None else None}'
+
+            return job_name, build_id, None
+
+        if len(builds) <= 1:
+            yield from map(stop, builds)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='StopWorker') as pool:
+            yield from pool.map(stop, builds)
+
     ####################################################################################################################
     #
     ####################################################################################################################
@@ -191,6 +899,26 @@ class Jenkins:
     ####################################################################################################################
     def register_job_change(self, callback:Callable[[Job, bool], None]):
         self.job_change_listeners.append(callback)
+        self.start_polling()
+
+    ####################################################################################################################
+    # callback(instance, changes) whenever a running build of any job changes one of fields, by default any of
+    # building, duration and result.  changes maps each field to its (old, new) values
+    ####################################################################################################################
+    def register_change_listener(
+        self,
+        callback:Callable[[JobInstance, dict[str, tuple]], None],
+        fields:Iterable[str]=None
+    ):
+        fields = JobInstance.check_change_fields(fields)
+
+        with self.jobs_lock:
+            self.build_change_listeners.append((callback, fields))
+
+            for job in self.jobs.values():
+                job.register_change_listener(callback, fields)
+
+        self.start_polling()
 
     ####################################################################################################################
     #
@@ -200,6 +928,24 @@ class Jenkins:
         i = 0
 
 
+########################################################################################################################
+# rows are written as they come so a long listing can be piped without waiting for all of it.  That means a table
+# can't size its columns to fit, columns maps each one to a width picked up front and longer values push the row out
+########################################################################################################################
+def print_rows(rows:Iterable[dict], columns:dict[str, int], format:str=OUTPUT_TABLE):
+    if format == OUTPUT_JSON:
+        for row in rows:
+            print (json.dumps(row))
+        return
+
+    print ('  '.join(name.ljust(width) for name, width in columns.items()).rstrip())
+
+    for row in rows:
+        print ('  '.join(
+            ('' if row.get(name) is None else str(row[name])).ljust(width) for name, width in columns.items()
+        ).rstrip())
+
+
 ########################################################################################################################
 #
 ########################################################################################################################
@@ -222,11 +968,18 @@ def main(args=sys.argv[1:]):
     job_parser.add_argument('--list',                   action='store_true',    default=False)
     job_parser.add_argument('--list-running',           action='store_true',    default=False)
     job_parser.add_argument('--info',                   action='store',         default=None)
+    job_parser.add_argument('--fields',                 action='store',         default=None,   help='tree for --info')
     job_parser.add_argument('--start',                  action='store',         default=None)
-    job_parser.add_argument('--stop',                   action='store',         default=None)
+    job_parser.add_argument('--stop',                   action='store',         default=None,   nargs='+',
+                            help='JOB#BUILD, or a job glob whose running builds are stopped')
+    job_parser.add_argument('--start-batch',            action='store',         default=None)
+    job_parser.add_argument('--max-in-flight',          action='store',         default=8,      type=int)
+    job_parser.add_argument('--launch-rate',            action='store',         default=None,   type=float)
     job_parser.add_argument('--param',                  action='append',        default=[])
     job_parser.add_argument('--wait-for-start',         action='store_true',    default=False)
     job_parser.add_argument('--wait-for-completion',    action='store_true',    default=False)
+    job_parser.add_argument('--format',                 action='store',         default=OUTPUT_TABLE,
+                            choices=[OUTPUT_TABLE, OUTPUT_JSON])
 
     user_parser.add_argument('--get-api-token', action='store_true', default=False)
 
@@ -237,50 +990,110 @@ def main(args=sys.argv[1:]):
         username=args.user,
         password=args.password,
         api_token=args.api_token,
-        api_token_file=args.api_token_file
+        api_token_file=args.api_token_file,
+        max_launches_in_flight=getattr(args, 'max_in_flight', 8),
+        launches_per_second=getattr(args, 'launch_rate', None),
+        # only what the command asks for is requested, polling starts if it starts a build
+        lazy=True
     )
 
-    while not jenkins.initialized:
-        pass
+    exit_code = 0
 
-    wait_for_thread_signal = False
+    try:
+        if args.command == 'job':
+            if args.list:
+                print_rows(({'name': name} for name in jenkins.get_jobs()), {'name': 60}, args.format)
 
-    if args.command == 'job':
-        if args.list:
-            jobs = jenkins.get_jobs()
-            print (', '.join(jobs))
+            elif args.list_running:
+                print_rows(
+                    ({'name': name, 'build': build_id} for name, build_id in jenkins.get_running_jobs()),
+                    {'name': 60, 'build': 8},
+                    args.format
+                )
 
-        elif args.list_running:
-            running_jobs = jenkins.get_running_jobs()
-            print (', '.join(running_jobs))
+            elif args.info:
+                info = jenkins.job_info(args.info, fields=args.fields)
 
-        elif args.info:
-            jenkins.job_info(args.job_info)
+                if args.format == OUTPUT_JSON:
+                    print (json.dumps(info))
+                else:
+                    print_rows(
+                        ({'field': k, 'value': v if isinstance(v, str) else json.dumps(v)} for k, v in info.items()),
+                        {'field': 24, 'value': 0}
+                    )
 
-        elif args.start is not None:
-            job = jenkins.start_job_instance(
-                args.start,
-                job_params_kvp=args.param,
-                status_callback=lambda f: print ("hello")
-            )
+            elif args.start is not None:
+                wait    = args.wait_for_start or args.wait_for_completion
+                started = Event()
 
-            job.register_status_update(lambda j: print (f"{j.name} was updated: {j.info}"))
+                def on_update(inst:JobInstance):
+                    print (f"{inst.name} was updated: {inst.info}")
+                    if inst.build_id is not None:
+                        started.set()
 
-            while not job.complete:
-                time.sleep(1)
+                # without a wait nothing is polled, the build request is all that is sent
+                job = jenkins.start_job_instance(
+                    args.start,
+                    job_params_kvp=args.param,
+                    status_callback=on_update if wait else None
+                )
 
-        elif args.stop is not None:
-            jenkins.stop_job(args.stop)
+                if job is None:
+                    print (f"{args.start}: not started")
 
-        while wait_for_thread_signal:
-            pass
-    elif args.user:
-        if args.get_api_token:
-            print (jenkins.get_user_token(args.user))
-    jenkins.stop()
+                elif args.wait_for_completion:
+                    job.wait()
+
+                elif args.wait_for_start:
+                    started.wait()
+
+                else:
+                    print (f"{args.start}: queued as {job.queue_id}")
+
+            elif args.start_batch is not None:
+                requests = BatchLauncher.load(args.start_batch)
+
+                for (job_name, params), future in zip(requests, jenkins.start_batch(requests)):
+                    try:
+                        inst = future.result()
+                    except CommunicationError as e:
+                        print (f"{job_name} {params}: {e}")
+                        continue
+
+                    if inst is None:
+                        print (f"{job_name} {params}: not started")
+                    else:
+                        print (f"{job_name} {params}: queued as {inst.queue_id}")
+
+            elif args.stop is not None:
+                print_rows(
+                    (
+                        {'name': name, 'build': build_id, 'result': error or 'stopped'}
+                        for name, build_id, error in jenkins.stop_job(args.stop)
+                    ),
+                    {'name': 60, 'build': 8, 'result': 0},
+                    args.format
+                )
+
+        elif args.user:
+            if args.get_api_token:
+                print (jenkins.get_user_token(args.user))
+
+    # the reader went away (| head), there is nobody left to tell
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    except (JobNotFound, ValueError, InvalidResponse, CommunicationError) as e:
+        print (f"{type(e).__name__}: {e}", file=sys.stderr)
+        exit_code = 1
+
+    finally:
+        jenkins.stop()
+
+    return exit_code
 
 ########################################################################################################################
 #
 ########################################################################################################################
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -2,12 +2,25 @@
 #
 ########################################################################################################################
 from    api.jenkinsapi          import JenkinsAPI
+from    api.tree.compiledfilter import CompiledFilter
 from    api.tree.filterlist     import FilterList
+from    buildrecord             import BuildRecord
+from    concurrent.futures      import Future, ThreadPoolExecutor
+from    contextlib              import AbstractContextManager, nullcontext
+from    decoding                import SHAPE_BUILD_LIST, SHAPE_JOB
+from    dispatcher              import Dispatcher
 from    exceptions              import InvalidResponse
-from    jobinstance             import JobInstance
-from    typing                  import Callable
+import  functools
+from    instancestore           import InstanceStore
+from    jobinstance             import RESULT_UNKNOWN, JobInstance
+from    threading               import RLock
+from    typing                  import TYPE_CHECKING, Callable, Iterable, Iterator
 from    requests.models         import Response
 
+# sqlite3 is only imported by clients that keep a build cache
+if TYPE_CHECKING:
+    from buildcache import BuildCache
+
 import  logging
 LOGGER = logging.getLogger(__file__)
 
@@ -17,83 +30,407 @@ LOGGER = logging.getLogger(__file__)
 ########################################################################################################################
 class Job:
 
+    # how many of the newest builds an update asks for once we already know the job's history, widened as needed
+    MIN_UPDATE_WINDOW:int = 8
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def add_builds_filter(parent, max_history:int):
+        # This is the minimal set of data for a job to instantiate builds.  parent can be either a FilterList or a
+        # FilterNode so the same shape can be nested inside a host level jobs[...] query
+        return parent\
+            .begin_filter('builds')\
+                .with_lower_bound(0)\
+                .with_upper_bound(max_history)\
+                .with_filter('number')\
+                .with_filter('queueId')\
+                .with_filter('building')\
+                .with_filter('duration')\
+                .with_filter('result')\
+                .end()
+
+    ####################################################################################################################
+    # the compiled filter for the newest window builds.  Compiled filters are only held weakly once interned, this
+    # keeps the few windows an update asks for alive so they are built and encoded once and shared by every job
+    ####################################################################################################################
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def window_filter(window:int) -> CompiledFilter:
+        return Job.add_builds_filter(FilterList(), window).compile()
+
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __init__(self, name:str, api:JenkinsAPI, max_history=100):
+    def __init__(
+        self,
+        name:str,
+        api:JenkinsAPI,
+        max_history=100,
+        build_cache:'BuildCache'=None,
+        dispatcher:Dispatcher=None
+    ):
 
         self.name           = name
         self.api            = api
         self.max_history    = max_history
 
-        self.instances:list[JobInstance] = []
+        # completed builds are written here and read back on the next start, None keeps everything in memory
+        self.build_cache:'BuildCache' = build_cache
+
+        # our instances' update listeners are called through this, None calls them on whichever thread saw the update
+        self.dispatcher:Dispatcher = dispatcher
+
+        # instances indexed by build and queue id, bounded to max_history builds
+        self.store:InstanceStore = InstanceStore(max_history=self.max_history)
+
+        # serializes diffs against the store, jobs can be updated from a worker pool while users spawn new instances
+        self.lock:RLock = RLock()
+
+        # identifies the builds last diffed, a cycle that reads the same skips the diff.  See from_json()
+        self.builds_fingerprint:int = None
 
         self.build_status_listeners:dict[tuple(str, int), Callable[[int, str], None]] = {}
         self.queue_status_listeners:dict[tuple(str, int), Callable[[int, str], None]] = {}
+        self.spawn_listeners:list[Callable[[Job, JobInstance], None]] = []
 
-        # This is the minimal set of data for a job to instantiate builds
-        self.builds_filter = FilterList()\
-            .begin_filter('builds')\
-                .with_lower_bound(0)\
-                .with_upper_bound(self.max_history)\
-                .with_filter('number')\
-                .with_filter('queueId')\
-                .with_filter('building')\
-                .with_filter('duration')\
-                .with_filter('result')
+        # (callback, fields) handed to every instance we track that is still running, see register_change_listener()
+        self.change_listeners:list[tuple[Callable[[JobInstance, dict], None], tuple]] = []
 
         # specify depth of 1 so we can can information about builds on a single get
         self.depth = 0
 
-        #self.update(check_active_builds=False)
+        if self.build_cache is not None:
+            self.hydrate()
+
+    ####################################################################################################################
+    # recreate the completed builds we saw before a restart, the server is only asked about newer ones
+    ####################################################################################################################
+    def hydrate(self):
+        with self.lock:
+            for number, queue_id, duration, result, properties in self.build_cache.load(self.name, self.max_history):
+                inst = JobInstance(api=self.api, job_name=self.name, build_id=number, queue_id=queue_id)
+                inst.update_from_json({'building': False, 'duration': duration, 'result': result})
+                inst.info.update(properties)
+
+                self.__track(inst, persist=False)
+
+    ####################################################################################################################
+    # start holding inst, completed builds are written to the build cache as they finish
+    ####################################################################################################################
+    def __track(self, inst:JobInstance, persist:bool=True):
+        inst.dispatcher = self.dispatcher
+
+        self.store.add(inst)
+
+        if not inst.complete:
+            for callback, fields in self.change_listeners:
+                inst.register_change_listener(callback, fields)
+
+        if self.build_cache is None:
+            return
+
+        inst.build_cache = self.build_cache
+
+        # written from the thread that saw the build finish, a done callback isn't held up or dropped with the
+        # listener events
+        if persist:
+            inst.add_done_callback(self.__persist)
+
+    ####################################################################################################################
+    # listeners may want our lock, the events of a diff are only handed to the dispatcher once it has been released
+    ####################################################################################################################
+    def __deferring(self) -> AbstractContextManager:
+        return self.dispatcher.deferring() if self.dispatcher is not None else nullcontext()
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def from_response(self, response:Response):
+    def __persist(self, inst:JobInstance):
+        # without a result there is nothing to hydrate the build with, it is asked about again after a restart
+        if inst.complete and inst.build_id is not None and inst.result is not None:
+            self.build_cache.put(
+                job_name=self.name,
+                number=inst.build_id,
+                queue_id=inst.queue_id,
+                duration=inst.duration_in_ms,
+                result=inst.result
+            )
 
-        if response.status_code != 200:
-            raise InvalidResponse(f"Job {self.name} given an invalid response to parse")
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def from_response(self, response:Response) -> bool:
+        return self.from_json(self.__validate(response))
+
+    ####################################################################################################################
+    # refresh_instances=True keeps the original behaviour of re-querying every incomplete instance.  When the builds
+    # were fetched as part of a larger tree query they already carry the fields we need, so just diff against them.
+    # If deferred is given, instances that need refreshing are appended to it instead of being refreshed here so the
+    # caller can fan them out.  Returns True if any instance was added or changed state.
+    #
+    # The msgspec backend hands us the builds still as json bytes.  Most jobs' builds read exactly as they did last
+    # cycle, those are recognized by a hash of the bytes and neither decoded nor diffed.  Unless we hold orphans,
+    # queued instances whose queue item the server has forgotten: only a diff can tell which build they became
+    ####################################################################################################################
+    def from_json(self, data:dict, refresh_instances:bool=True, deferred:list[JobInstance]=None) -> bool:
+        builds      = data.get('builds')
+        fingerprint = None
 
-        data = response.json()
+        if builds is not None and not isinstance(builds, list):
+            fingerprint = hash(bytes(builds))
 
-        # builds we received from network
-        for build in data['builds']:
+            if fingerprint == self.builds_fingerprint and len(self.store.orphans) == 0:
+                return False
 
-            # extract the two id's we need to search
-            build_id = build['number']
-            queue_id = build['queueId']
+            builds = self.api.decoder.decode_bytes(builds, SHAPE_BUILD_LIST, source=self.name)
+
+        return self.__diff(builds or [], fingerprint, refresh_instances, deferred)
+
+    ####################################################################################################################
+    # fingerprint identifies builds, None if they can't be told apart from the next ones without diffing
+    ####################################################################################################################
+    def __diff(
+        self,
+        builds:list[dict],
+        fingerprint:int,
+        refresh_instances:bool=True,
+        deferred:list[JobInstance]=None
+    ) -> bool:
 
-            # try to get the instances of the build
-            inst = self.find_instance(build_id=build_id, queue_id=queue_id)
+        changed = False
+        stale:list[JobInstance] = []
 
-            # we haven't created this object yet
-            if not inst:
-                # create the job instance
+        with self.__deferring(), self.lock:
+            # builds we received from network
+            for build in builds:
+
+                # extract the two id's we need to search
+                build_id = build['number']
+                queue_id = build['queueId']
+
+                # try to get the instances of the build
+                inst = self.find_instance(build_id=build_id, queue_id=queue_id)
+
+                # we haven't created this object yet
+                if not inst:
+                    # create the job instance
+                    inst = JobInstance(
+                        job_name=self.name,
+                        build_id=build_id,
+                        queue_id=queue_id,
+                        api=self.api
+                    )
+                    inst.update_from_json(build)
+                    self.__track(inst)
+                    changed = True
+                elif not inst.complete:
+                    # a queued instance showing up as a build already tells us everything, no need to ask again
+                    if refresh_instances and inst.build_id is not None:
+                        stale.append(inst)
+                    else:
+                        changed |= inst.from_build_json(build)
+
+            # an orphan no build claimed may have been cancelled or run too long ago for the builds we asked for, all
+            # we know is that it is done
+            for inst in list(self.store.orphans):
+                changed |= inst.complete_unbuilt(RESULT_UNKNOWN)
+
+            self.store.evict()
+
+            # stale instances are only refreshed below, the builds may read the same next cycle while they still
+            # need a look
+            self.builds_fingerprint = fingerprint if len(stale) == 0 else None
+
+        if deferred is not None:
+            deferred.extend(stale)
+        else:
+            # update the instances
+            for inst in stale:
+                changed |= inst.update()
+
+        return changed
+
+    ####################################################################################################################
+    # build is the "build" object of a Notification plugin event.  Returns True if an instance was added or changed
+    ####################################################################################################################
+    def from_notification(self, build:dict) -> bool:
+
+        # the number sent with a queued event isn't the build's yet
+        build_id = build.get('number') if build.get('phase') != 'QUEUED' else None
+        queue_id = build.get('queue_id')
+
+        if build_id is None and queue_id is None:
+            return False
+
+        with self.__deferring(), self.lock:
+            inst    = self.find_instance(build_id=build_id, queue_id=queue_id)
+            created = inst is None
+
+            if created:
                 inst = JobInstance(
                     job_name=self.name,
                     build_id=build_id,
                     queue_id=queue_id,
                     api=self.api
                 )
-                inst.update_from_json(build)
-                self.instances.append(inst)
-            else:
-                if not inst.complete:
-                    # update the instance
-                    inst.update()
+                self.__track(inst)
+
+            changed = inst.from_notification(build)
+
+            self.store.evict()
+
+            # the instance is ahead of the builds we last saw, they have to be diffed again once they catch up
+            self.builds_fingerprint = None
+
+        return created or changed
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def update(self, deferred:list[JobInstance]=None) -> bool:
+        floor   = self.__oldest_needed()
+
+        # an orphan's build could be anywhere in the history we keep
+        if len(self.store.orphans) > 0:
+            floor = None
+
+        window  = self.max_history if floor is None else min(self.MIN_UPDATE_WINDOW, self.max_history)
+
+        # builds come newest first, widen the window until it reaches back to floor or runs out of history
+        while True:
+            response = self.api.job_api.info(
+                job_name=self.name,
+                filter=Job.window_filter(window),
+                depth=1
+            )
+
+            # the whole response is this job's builds, whichever backend decodes it.  One that reads exactly like the
+            # last one we diffed was complete back to floor then, and floor only moves back when the fingerprint is
+            # cleared, so it needs neither decoding nor widening
+            fingerprint = hash(response.content) if response.status_code == 200 else None
+
+            if fingerprint is not None and fingerprint == self.builds_fingerprint and len(self.store.orphans) == 0:
+                return False
+
+            builds = self.__validate(response, shape=SHAPE_JOB).get('builds')
+
+            if builds is not None and not isinstance(builds, list):
+                builds = self.api.decoder.decode_bytes(builds, SHAPE_BUILD_LIST, source=self.name)
+
+            builds = builds or []
+
+            if floor is None or window >= self.max_history or len(builds) < window or builds[-1]['number'] <= floor:
+                break
+
+            window = min(window * 4, self.max_history)
+
+        return self.__diff(builds, fingerprint, deferred=deferred)
+
+    ####################################################################################################################
+    # the oldest build number an update has to see: the first one newer than everything we hold, or the oldest one
+    # still running.  None if we hold no builds and need the full history
+    ####################################################################################################################
+    def __oldest_needed(self) -> int:
+        numbers = [inst.build_id for inst in self.store if inst.build_id is not None]
+
+        if len(numbers) == 0:
+            return None
+
+        running = [inst.build_id for inst in self.store if inst.build_id is not None and not inst.complete]
+
+        return min(running) if len(running) > 0 else max(numbers) + 1
+
+    ####################################################################################################################
+    # allBuilds from index start (inclusive) to end (exclusive), newest first
+    ####################################################################################################################
+    @staticmethod
+    def history_filter(start:int, end:int) -> CompiledFilter:
+        node = FilterList()\
+            .begin_filter('allBuilds')\
+                .with_lower_bound(start)\
+                .with_upper_bound(end)
+
+        for field in BuildRecord.fields:
+            node.with_filter(field)
+
+        return node.end().compile()
+
+    ####################################################################################################################
+    # walk the whole build history newest first, chunk_size builds per request.  With prefetch the next page is
+    # requested while the current one is being consumed.  Only a page or two is held at a time however long the
+    # history is
+    ####################################################################################################################
+    def iter_builds(self, chunk_size:int=100, prefetch:bool=True) -> Iterator[BuildRecord]:
+
+        def fetch(start:int) -> list[dict]:
+            return self.__validate(
+                self.api.job_api.info(job_name=self.name, filter=Job.history_filter(start, start + chunk_size))
+            ).get('allBuilds', [])
+
+        executor:ThreadPoolExecutor = None
+        if prefetch:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='HistoryPrefetch')
+
+        try:
+            start = 0
+
+            # builds started while we page shift everything down, don't hand out the same one twice
+            last_number:int = None
+
+            next_page:Future = executor.submit(fetch, start) if executor else None
+
+            while True:
+                page = next_page.result() if executor else fetch(start)
+
+                start   += chunk_size
+                more    = len(page) >= chunk_size
+
+                if more and executor:
+                    next_page = executor.submit(fetch, start)
+
+                for build in page:
+                    if last_number is not None and build['number'] >= last_number:
+                        continue
+
+                    last_number = build['number']
+                    yield BuildRecord.from_json(self.name, build)
+
+                if not more:
+                    return
+
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def update(self):
-        self.from_response(self.api.job_api.info(job_name=self.name, filter=self.builds_filter, depth=1))
+    def __validate(self, response:Response, shape:str=None) -> dict:
+        if response.status_code != 200:
+            raise InvalidResponse(f"Job {self.name} given an invalid response to parse")
+
+        return self.api.decoder.decode(response, shape)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def instances(self) -> list[JobInstance]:
+        return list(self.store)
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def has_active_builds(self) -> bool:
-        return any(x for x in self.instances if not x.complete)
+        return any(x for x in self.store if not x.complete)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def incomplete_instances(self) -> list[JobInstance]:
+        return [x for x in self.store if not x.complete]
 
     ####################################################################################################################
     #
@@ -101,11 +438,20 @@ class Job:
     def spawn_instance(self, params:dict={}, status_callback:Callable[[JobInstance], None]=None) -> JobInstance:
 
         # request to start the job
-        resp:Response = self.api.job_api.build(self.name, params=params)
+        return self.from_spawn_response(self.api.job_api.build(self.name, params=params), status_callback)
+
+    ####################################################################################################################
+    # turn the response to a build request into a tracked instance
+    ####################################################################################################################
+    def from_spawn_response(
+        self,
+        resp:Response,
+        status_callback:Callable[[JobInstance], None]=None
+    ) -> JobInstance:
 
         # we failed
-        if resp.status_code != 201:
-            LOGGER.warning('Could not start job: ' + self.name + '. Reason: ' + resp.content)
+        if resp is None or resp.status_code != 201:
+            LOGGER.warning(f'Could not start job: {self.name}. Reason: {resp.text if resp is not None else None}')
             return None
 
         # get the queue id
@@ -118,8 +464,16 @@ class Job:
             queue_id=queue_id
         )
 
-        # store it
-        self.instances.append(job_instance)
+        if status_callback:
+            job_instance.register_status_update(status_callback)
+
+        # store it, the build it becomes has to be matched against the next builds we see even if they read the same
+        with self.lock:
+            self.__track(job_instance)
+            self.builds_fingerprint = None
+
+        for c in self.spawn_listeners:
+            c(self, job_instance)
 
         return job_instance
 
@@ -127,9 +481,27 @@ class Job:
     #
     ####################################################################################################################
     def find_instance(self, build_id:int=None, queue_id:int=None) -> JobInstance:
-        return next(
-            (x for x in self.instances if (
-                (build_id is not None and x.build_id == build_id) or (queue_id is not None and x.queue_id == queue_id))
-            ),
-            None
-        )
+        return self.store.find(build_id=build_id, queue_id=queue_id)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def register_spawn(self, callback:Callable[['Job', JobInstance], None]):
+        self.spawn_listeners.append(callback)
+
+    ####################################################################################################################
+    # callback(instance, changes) for every field change of our running builds and the ones that start later, see
+    # JobInstance.register_change_listener()
+    ####################################################################################################################
+    def register_change_listener(
+        self,
+        callback:Callable[[JobInstance, dict[str, tuple]], None],
+        fields:Iterable[str]=None
+    ):
+        fields = JobInstance.check_change_fields(fields)
+
+        with self.lock:
+            self.change_listeners.append((callback, fields))
+
+            for inst in self.incomplete_instances():
+                inst.register_change_listener(callback, fields)
@@ -2,20 +2,111 @@
 #
 ########################################################################################################################
 from api.jenkinsapi import JenkinsAPI
+from    api.tree.compiledfilter import CompiledFilter
 from    api.tree.filterlist     import FilterList
-from    typing                  import Callable
+from    decoding                import SHAPE_BUILD, SHAPE_QUEUE_ITEM
+from    logtail                 import LogTail
+from    concurrent.futures      import Future
+from    threading               import Condition, RLock
+from    typing                  import Callable, Iterable, Iterator
 from    exceptions              import JobWaiting, InvalidResponse, JobInstanceConstructException, JobInstanceNotBuilding
+from    exceptions              import CommunicationError
+from    instanceinfo            import InstanceInfo
 from    requests.models         import Response
 from    network.communicator    import Communicator
 import   logging
 
 LOGGER = logging.getLogger(__file__)
 
+########################################################################################################################
+# Instances never hold one another's locks, so rather than a lock each they share a fixed pool of them
+########################################################################################################################
+LOCK_STRIPES:list[RLock] = [RLock() for _ in range(64)]
+
+########################################################################################################################
+# one per lock stripe, notified whenever an instance using that stripe completes.  Waiters on the other instances of a
+# stripe wake up too, check their own instance and go back to sleep
+########################################################################################################################
+COMPLETE_CONDITIONS:list[Condition] = [Condition(lock) for lock in LOCK_STRIPES]
+
+########################################################################################################################
+# the fields change listeners hear about, named as in the build json and info, each with the attribute holding it
+########################################################################################################################
+CHANGE_FIELDS:dict[str, str] = {
+    'building'  : 'building',
+    'duration'  : 'duration_in_ms',
+    'result'    : 'result',
+}
+
+########################################################################################################################
+# results of instances that complete without ever becoming a build: the queue item was cancelled, or Jenkins forgot
+# the item and no build claims it either.  See Job.from_json()
+########################################################################################################################
+RESULT_CANCELLED    = 'CANCELLED'
+RESULT_UNKNOWN      = 'UNKNOWN'
+
+########################################################################################################################
+# Dispatcher merge for change events still waiting to be delivered: each field keeps the value it had before the first
+# and the one after the last, a field that went back to where it started drops out
+########################################################################################################################
+def merge_changes(pending:tuple, latest:tuple) -> tuple:
+    merged = dict(pending[0])
+
+    for field, (old, new) in latest[0].items():
+        merged[field] = (merged[field][0] if field in merged else old, new)
+
+    return ({field: change for field, change in merged.items() if change[0] != change[1]},)
+
 ########################################################################################################################
 # User can override this class to add custom filters
 ########################################################################################################################
 class JobInstance:
 
+    # there can be a lot of these, keep them small.  Subclasses that don't declare __slots__ get a __dict__ back
+    __slots__ = (
+        'api',
+        'build_id',
+        'queue_id',
+        'name',
+        'duration_in_ms',
+        'complete',
+        'in_queue',
+        'building',
+        'result',
+        'store',
+        'build_cache',
+        'dispatcher',
+        'extra_info',
+        'log_tail',
+        '__update_listeners',
+        '__change_listeners',
+        '__log_listeners',
+        '__done_callbacks',
+        '__queue_filter',
+        '__build_filters',
+    )
+
+    # minimal amount of data needed to follow the build movement from the queue to actually building
+    QUEUE_FILTER:CompiledFilter = FilterList()\
+        .with_filter('id')\
+        .with_filter('why')\
+        .with_filter('cancelled')\
+        .begin_filter('executable')\
+            .with_filter('number')\
+            .with_filter('url')\
+            .end()\
+        .compile()
+
+    # minimal amount of necessary data to display information about a build.  Subclasses can override this with a
+    # bigger filter as they see fit, or set build_filters on a single instance
+    BUILD_FILTERS:CompiledFilter = FilterList()\
+        .with_filter('building')\
+        .with_filter('duration')\
+        .with_filter('number')\
+        .with_filter('queueId')\
+        .with_filter('result')\
+        .compile()
+
     ####################################################################################################################
     #
     ####################################################################################################################
@@ -32,41 +123,105 @@ class JobInstance:
         self.complete       = False
         self.in_queue       = False
         self.building       = False
+        self.result:str     = None
 
-        self.info:dict = {}
-        self.__update_info()
-
-        self.update_listeners:list[Callable[[JobInstance], None]] = []
-
-        # minimal amount of data needed to follow the build movement from the queue to actually building
-        self.queue_filter = FilterList()\
-            .with_filter('id')\
-            .with_filter('why')\
-            .begin_filter('executable')\
-                .with_filter('number')\
-                .with_filter('url')\
-                .end()
-
-        # minimal amount of necessary data to display information about a build.  Users can add to this list as they
-        # see fit
-        self.build_filters = FilterList()\
-            .with_filter('building')\
-            .with_filter('duration')\
-            .with_filter('number')\
-            .with_filter('queueId')\
-            .with_filter('result')
+        # set by the InstanceStore that holds us so a build id can be indexed the moment we learn it
+        self.store          = None
+
+        # set by the Job that holds us when it keeps completed builds on disk
+        self.build_cache    = None
+
+        # set by the Job that holds us to call update listeners off the polling threads, None calls them inline
+        self.dispatcher     = None
+
+        # properties fetched by get_build_property, made on first use.  See info
+        self.extra_info:dict = None
+
+        # listener lists are made when the first one registers, most instances never get any
+        self.__update_listeners:list[Callable[[JobInstance], None]] = None
+
+        # (callback, fields) pairs, see register_change_listener()
+        self.__change_listeners:list[tuple[Callable[[JobInstance, dict], None], tuple]] = None
+
+        # console output followers, driven by whoever calls update_log()
+        self.__log_listeners:list[Callable[[JobInstance, str], None]] = None
+        self.log_tail:LogTail = None
+
+        # run once when we complete, see add_done_callback()
+        self.__done_callbacks:list[Callable[[JobInstance], None]] = None
+
+        # set through queue_filter and build_filters to override the class' filters for this instance only
+        self.__queue_filter:CompiledFilter  = None
+        self.__build_filters:CompiledFilter = None
+
+    ####################################################################################################################
+    # the filters our queue item and build are fetched with: the class' QUEUE_FILTER and BUILD_FILTERS unless set on
+    # this instance, None goes back to those.  Responses to any other filter are decoded into dicts rather than records
+    ####################################################################################################################
+    @property
+    def queue_filter(self) -> CompiledFilter:
+        return self.__queue_filter if self.__queue_filter is not None else self.QUEUE_FILTER
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @queue_filter.setter
+    def queue_filter(self, queue_filter:FilterList|CompiledFilter):
+        self.__queue_filter = queue_filter.compile() if queue_filter is not None else None
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __update_info(self):
-        self.info['build_id'] = self.build_id
-        self.info['queue_id'] = self.queue_id
-        self.info['name']     = self.name
-        self.info['complete'] = self.complete
-        self.info['in_queue'] = self.in_queue
-        self.info['building'] = self.building
-        self.info['duration'] = self.duration_in_ms
+    @property
+    def build_filters(self) -> CompiledFilter:
+        return self.__build_filters if self.__build_filters is not None else self.BUILD_FILTERS
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @build_filters.setter
+    def build_filters(self, build_filters:FilterList|CompiledFilter):
+        self.__build_filters = build_filters.compile() if build_filters is not None else None
+
+    ####################################################################################################################
+    # instances can be refreshed from a worker pool, state changes happen under this lock and listeners are notified
+    # once it has been released
+    ####################################################################################################################
+    @property
+    def lock(self) -> RLock:
+        return LOCK_STRIPES[(id(self) >> 4) % len(LOCK_STRIPES)]
+
+    ####################################################################################################################
+    # the condition over lock that is notified when we complete
+    ####################################################################################################################
+    @property
+    def completed_condition(self) -> Condition:
+        return COMPLETE_CONDITIONS[(id(self) >> 4) % len(COMPLETE_CONDITIONS)]
+
+    ####################################################################################################################
+    # the build's state as a dict, plus anything fetched by get_build_property.  Reads through to the instance
+    ####################################################################################################################
+    @property
+    def info(self) -> InstanceInfo:
+        return InstanceInfo(self)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def update_listeners(self) -> list[Callable[['JobInstance'], None]]:
+        if self.__update_listeners is None:
+            self.__update_listeners = []
+        return self.__update_listeners
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def log_listeners(self) -> list[Callable[['JobInstance', str], None]]:
+        if self.__log_listeners is None:
+            self.__log_listeners = []
+        return self.__log_listeners
 
     ####################################################################################################################
     #
@@ -82,17 +237,61 @@ class JobInstance:
 
         # the key isn't in the info dict, try to retrieve from the server
         custom_filter = FilterList()\
-            .with_filter(key)
+            .with_filter(key)\
+            .compile()
 
-        resp = self.api.build_api.info(build_id=self.build_id, filter=custom_filter)
+        resp = self.api.build_api.info(job_name=self.name, build_id=self.build_id, filter=custom_filter)
 
         if resp.status_code != 200:
             LOGGER.warning(f"Key:{key} not in current build info and not retrievable from server.")
             return None
 
-        self.info[key] = resp.json()[key]
+        with self.lock:
+            info = self.info
+            info[key] = self.api.decoder.decode(resp)[key]
+
+            # a finished build won't change, no need to ask again after a restart
+            if self.complete and self.build_cache is not None:
+                self.build_cache.put_property(self.name, self.build_id, key, info[key])
+
+            return info.get(key, None)
+
+    ####################################################################################################################
+    # yields new console output as the build writes it, until it is done writing
+    ####################################################################################################################
+    def stream_log(self, poll_interval:float=1.0, offset:int=0) -> Iterator[str]:
+
+        # the log belongs to a build, there is nothing to read while we are queued
+        if self.build_id is None:
+            raise JobWaiting("Job has not started building yet, no console output")
+
+        return LogTail(api=self.api, job_name=self.name, build_id=self.build_id, offset=offset).follow(poll_interval)
+
+    ####################################################################################################################
+    # True while there are log listeners that haven't seen the end of the log
+    ####################################################################################################################
+    @property
+    def following_log(self) -> bool:
+        return bool(self.__log_listeners) and (self.log_tail is None or self.log_tail.more)
+
+    ####################################################################################################################
+    # read any new console output and hand it to the log listeners.  Returns True if there was any
+    ####################################################################################################################
+    def update_log(self) -> bool:
+        if not self.following_log or self.build_id is None:
+            return False
+
+        if self.log_tail is None:
+            self.log_tail = LogTail(api=self.api, job_name=self.name, build_id=self.build_id)
+
+        def notify(text:str):
+            for c in self.log_listeners:
+                c(self, text)
 
-        return self.info.get(key, None)
+        try:
+            return self.log_tail.poll(notify)
+        except (InvalidResponse, CommunicationError):
+            return False
 
     ####################################################################################################################
     #
@@ -119,88 +318,360 @@ class JobInstance:
     #
     ####################################################################################################################
     def update_from_json(self, json:dict):
-        self.complete   = not json['building']
-        self.duration   = json['duration']
-        self.result     = json['result']
+        with self.lock:
+            was_complete        = self.complete
+
+            self.building       = json['building']
+            self.complete       = not self.building
+            self.duration_in_ms = json['duration']
+            self.result         = json['result']
+
+            done = self.__completed() if self.complete and not was_complete else ()
+
+        for c in done:
+            c(self)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __assign_build_id(self, build_id:int):
+        if self.store is not None:
+            self.store.assign_build_id(self, build_id)
+        else:
+            self.build_id = build_id
 
-        self.__update_info()
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __notify(self):
+        if not self.__update_listeners:
+            return
+
+        # updates waiting to be delivered are coalesced, the listeners see whatever state we are in by then
+        if self.dispatcher is not None:
+            self.dispatcher.submit(self, self.__call_update_listeners)
+        else:
+            self.__call_update_listeners()
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def update(self):
+    def __call_update_listeners(self):
+        for c in list(self.__update_listeners):
+            c(self)
+
+    ####################################################################################################################
+    # changes maps each field that changed to its (old, new) values
+    ####################################################################################################################
+    def __notify_changes(self, changes:dict[str, tuple]):
+        # changes waiting to be delivered are merged, the listeners see each field go from where it was to where it is
+        if self.dispatcher is not None:
+            self.dispatcher.submit((self, 'changes'), self.__call_change_listeners, changes, merge=merge_changes)
+        else:
+            self.__call_change_listeners(changes)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __call_change_listeners(self, changes:dict[str, tuple]):
+        for callback, fields in list(self.__change_listeners):
+            wanted = changes if fields is None else {f: changes[f] for f in fields if f in changes}
+
+            if wanted:
+                callback(self, wanted)
+
+    ####################################################################################################################
+    # called with the lock held as complete is set.  Wakes whoever is in wait() and hands back the done callbacks, to
+    # be run once the lock has been released
+    ####################################################################################################################
+    def __completed(self) -> list[Callable[['JobInstance'], None]]:
+        self.completed_condition.notify_all()
+
+        done, self.__done_callbacks = self.__done_callbacks, None
+        return done or ()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def update(self) -> bool:
         # we are not complete
         if self.complete:
-            return
+            return False
 
         # if we do not have a build id, then we are in the queue, get info
         if not self.build_id:
             try:
-                self.from_queue_response(
+                return self.from_queue_response(
                     self.api.queue_api.item_info(queue_id=self.queue_id, filter=self.queue_filter)
                 )
-            except InvalidResponse:
+            except (InvalidResponse, CommunicationError):
                 pass
         # we have a build id, just query the build status
         else:
             try:
-                self.from_build_response(
+                return self.from_build_response(
                     self.api.build_api.info(job_name=self.name, build_id=self.build_id, filter=self.build_filters)
                 )
-            except InvalidResponse:
+            except (InvalidResponse, CommunicationError):
                 pass
 
+        return False
+
     ####################################################################################################################
     #
     ####################################################################################################################
-    def from_build_response(self, response:Response):
+    def from_build_response(self, response:Response) -> bool:
         if response.status_code != 200:
             raise InvalidResponse("Invalid response")
 
-        data = response.json()
+        # a subclass that asks for more than our filter does gets every key back
+        shape = SHAPE_BUILD if self.build_filters is JobInstance.BUILD_FILTERS else None
 
-        if not self.complete:
-            self.building       = data['building']
-            self.complete       = not self.building
-            self.duration_in_ms = data['duration']
-            self.result         = data['result']
-
-            self.__update_info()
+        return self.from_build_json(self.api.decoder.decode(response, shape))
 
+    ####################################################################################################################
+    # returns True if anything about the build changed
+    ####################################################################################################################
+    def from_build_json(self, data:dict) -> bool:
+        with self.lock:
             if self.complete:
-                for c in self.update_listeners:
-                    c(self)
+                return False
+
+            previous    = (self.building, self.duration_in_ms, self.result)
+            current     = (data['building'], data['duration'], data['result'])
+            started     = self.build_id is None
+
+            # a running build mostly reads the same from one poll to the next, leave it be
+            if not started and current[0] and current == previous:
+                return False
+
+            # we were still waiting in the queue, the build record carries the build number we were given
+            if started:
+                self.__assign_build_id(int(data['number']))
+                self.in_queue = False
+
+            self.building, self.duration_in_ms, self.result = current
+            self.complete = not self.building
+
+            changes = None
+            if self.__change_listeners:
+                changes = {
+                    field: (old, new) for field, old, new in zip(CHANGE_FIELDS, previous, current) if old != new
+                }
+
+            done = self.__completed() if self.complete else ()
+
+        if started or self.complete:
+            self.__notify()
+
+        if changes:
+            self.__notify_changes(changes)
+
+        for c in done:
+            c(self)
+
+        return True
 
     ####################################################################################################################
-    #
+    # build is the "build" object of a Notification plugin event.  Returns True if anything about the build changed
+    ####################################################################################################################
+    def from_notification(self, build:dict) -> bool:
+        phase = build.get('phase')
+
+        # an empty queue item reads as still waiting
+        if phase == 'QUEUED':
+            return self.from_queue_json({})
+
+        if phase == 'STARTED':
+            return self.from_build_json({
+                'number'    : build['number'],
+                'building'  : True,
+                'duration'  : 0,
+                'result'    : None
+            })
+
+        if phase in ('COMPLETED', 'FINALIZED'):
+            return self.from_build_json({
+                'number'    : build['number'],
+                'building'  : False,
+                'duration'  : build.get('duration', self.duration_in_ms),
+                'result'    : build.get('status')
+            })
+
+        return False
+
     ####################################################################################################################
-    def from_queue_response(self, response:Response):
+    # returns True if we entered or left the queue
+    ####################################################################################################################
+    def from_queue_response(self, response:Response) -> bool:
+        # Jenkins forgets an item a few minutes after it leaves the queue, most likely we missed it starting.  The next
+        # diff of our job's builds finds the build by our queue id, see Job.from_json()
+        if response.status_code == 404:
+            if self.store is not None:
+                self.store.orphan(self)
+            return False
+
         if response.status_code != 200:
             raise InvalidResponse("Invalid response")
 
-        data = response.json()
+        shape = SHAPE_QUEUE_ITEM if self.queue_filter is JobInstance.QUEUE_FILTER else None
 
-        # this thing is no longer in the queue
-        if self.in_queue:
-            if 'why' in data and data['why'] is None and 'executable' in data:
-                self.build_id = int(data['executable']['number'])
-                self.in_queue = False
+        return self.from_queue_json(self.api.decoder.decode(response, shape))
+
+    ####################################################################################################################
+    # data is a single queue item, either from /queue/item/{id} or one of the items in /queue.  Returns True if we
+    # entered or left the queue.  A cancelled item leaves it without a build, we complete with RESULT_CANCELLED
+    ####################################################################################################################
+    def from_queue_json(self, data:dict) -> bool:
+
+        changed = False
+        changes = None
+        done    = ()
+
+        with self.lock:
+            # the item has been handed an executor, it is a build now
+            left_queue = data.get('why') is None and data.get('executable') is not None
 
-                self.__update_info()
+            if self.build_id is None and not self.complete:
+                if data.get('cancelled'):
+                    changes, done = self.__complete_unbuilt(RESULT_CANCELLED)
+                    changed = True
 
-                for c in self.update_listeners:
-                    c(self)
+                # this thing is no longer in the queue
+                elif left_queue:
+                    self.__assign_build_id(int(data['executable']['number']))
+                    self.in_queue = False
 
-        elif not self.in_queue:
-            self.in_queue = True
+                    changed = True
 
-            self.__update_info()
+                elif not self.in_queue:
+                    self.in_queue = True
 
-            for c in self.update_listeners:
-                c(self)
+                    changed = True
+
+        if changed:
+            self.__notify()
+
+        if changes:
+            self.__notify_changes(changes)
+
+        for c in done:
+            c(self)
+
+        return changed
+
+    ####################################################################################################################
+    # complete without ever having become a build, result says why.  Returns False if we already had a build or were
+    # complete
+    ####################################################################################################################
+    def complete_unbuilt(self, result:str) -> bool:
+        with self.lock:
+            if self.build_id is not None or self.complete:
+                return False
+
+            changes, done = self.__complete_unbuilt(result)
+
+        self.__notify()
+
+        if changes:
+            self.__notify_changes(changes)
+
+        for c in done:
+            c(self)
+
+        return True
+
+    ####################################################################################################################
+    # called with the lock held.  Returns the change events and done callbacks to hand out once it is released
+    ####################################################################################################################
+    def __complete_unbuilt(self, result:str) -> tuple[dict, list]:
+        self.in_queue   = False
+        self.building   = False
+        self.complete   = True
+        self.result     = result
+
+        # the store bounds how many of these it holds, they have no build number to be evicted by
+        if self.store is not None:
+            self.store.completed_unbuilt(self)
+
+        changes = {'result': (None, result)} if self.__change_listeners else None
+
+        return changes, self.__completed()
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def register_status_update(self, status_callback:Callable):
         self.update_listeners.append(status_callback)
+
+    ####################################################################################################################
+    # callback(self, changes) whenever fields of ours change, changes maps each to its (old, new) values.  fields
+    # limits it to some of CHANGE_FIELDS, by default it hears about all of them.  Delivered like the update listeners,
+    # through the dispatcher if we have one
+    ####################################################################################################################
+    def register_change_listener(
+        self,
+        callback:Callable[['JobInstance', dict[str, tuple]], None],
+        fields:Iterable[str]=None
+    ):
+        fields = JobInstance.check_change_fields(fields)
+
+        with self.lock:
+            if self.__change_listeners is None:
+                self.__change_listeners = []
+            self.__change_listeners.append((callback, fields))
+
+    ####################################################################################################################
+    # fields as a tuple, None for all of them
+    ####################################################################################################################
+    @staticmethod
+    def check_change_fields(fields:Iterable[str]) -> tuple[str, ...]:
+        if fields is None:
+            return None
+
+        fields  = tuple(fields)
+        unknown = [f for f in fields if f not in CHANGE_FIELDS]
+
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown fields {", ".join(unknown)}, expected some of {", ".join(CHANGE_FIELDS)}')
+
+        return fields
+
+    ####################################################################################################################
+    # callback(self) once we complete, straight away if we already have.  Runs on whichever thread saw us complete
+    ####################################################################################################################
+    def add_done_callback(self, callback:Callable[['JobInstance'], None]):
+        with self.lock:
+            if not self.complete:
+                if self.__done_callbacks is None:
+                    self.__done_callbacks = []
+                self.__done_callbacks.append(callback)
+                return
+
+        callback(self)
+
+    ####################################################################################################################
+    # block until we complete, or timeout seconds pass.  Returns whether we completed.  Costs nothing while waiting,
+    # but something has to be refreshing us: a Jenkins that is polling, see Jenkins.start_polling()
+    ####################################################################################################################
+    def wait(self, timeout:float=None) -> bool:
+        with self.completed_condition:
+            return self.completed_condition.wait_for(lambda: self.complete, timeout)
+
+    ####################################################################################################################
+    # a concurrent.futures.Future that resolves to this instance once it completes, for use with
+    # concurrent.futures.wait() and as_completed() or to mix with other futures
+    ####################################################################################################################
+    def future(self) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        self.add_done_callback(future.set_result)
+
+        return future
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def register_log_listener(self, log_callback:Callable[['JobInstance', str], None]):
+        self.log_listeners.append(log_callback)
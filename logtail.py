@@ -0,0 +1,97 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    api.jenkinsapi          import JenkinsAPI
+import  codecs
+from    exceptions              import CommunicationError, InvalidResponse
+import  requests
+import  time
+from    typing                  import Callable, Iterator
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# Follows a build's console output through logText/progressiveText.  Only bytes past the last offset are requested and
+# the body is decoded chunk by chunk as it arrives, so memory use doesn't depend on the size of the log
+########################################################################################################################
+class LogTail:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, api:JenkinsAPI, job_name:str, build_id:int, offset:int=0, chunk_size:int=64 * 1024):
+        self.api        = api
+        self.job_name   = job_name
+        self.build_id   = build_id
+
+        # byte offset of the next read
+        self.offset:int     = offset
+        self.chunk_size:int = chunk_size
+
+        # cleared once the server says the build won't write anything else
+        self.more:bool = True
+
+        # a multi byte character can be split across chunks, or across requests
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    ####################################################################################################################
+    # one request, yields whatever was written since the last one
+    ####################################################################################################################
+    def read(self) -> Iterator[str]:
+        if not self.more:
+            return
+
+        resp = self.api.build_api.progressive_text(job_name=self.job_name, build_id=self.build_id, start=self.offset)
+
+        try:
+            if resp.status_code != 200:
+                raise InvalidResponse(f'{self.job_name} #{self.build_id}: console log not available')
+
+            # count as we go so a consumer that stops early resumes at the right place
+            for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                self.offset += len(chunk)
+
+                text = self.decoder.decode(chunk)
+                if text:
+                    yield text
+
+            # the server knows best where the next read starts
+            self.offset = int(resp.headers.get('X-Text-Size', self.offset))
+            self.more   = resp.headers.get('X-More-Data', '').lower() == 'true'
+
+            if not self.more:
+                text = self.decoder.decode(b'', final=True)
+                if text:
+                    yield text
+
+        except requests.RequestException as e:
+            raise CommunicationError(f'{self.job_name} #{self.build_id}: {e}') from e
+
+        finally:
+            resp.close()
+
+    ####################################################################################################################
+    # pass anything new to callback, returns True if there was any
+    ####################################################################################################################
+    def poll(self, callback:Callable[[str], None]) -> bool:
+        received = False
+
+        for text in self.read():
+            received = True
+            callback(text)
+
+        return received
+
+    ####################################################################################################################
+    # yields new output every poll_interval until the build is done writing
+    ####################################################################################################################
+    def follow(self, poll_interval:float=1.0) -> Iterator[str]:
+        while True:
+            yield from self.read()
+
+            if not self.more:
+                return
+
+            time.sleep(poll_interval)
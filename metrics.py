@@ -0,0 +1,415 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    bisect                  import bisect_left
+from    contextvars             import ContextVar
+import  functools
+import  inspect
+import  math
+from    threading               import Lock
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# the endpoint template a request is being sent for, set by the endpoint decorator and read by the communicators
+########################################################################################################################
+CURRENT_ENDPOINT:ContextVar[str] = ContextVar('CURRENT_ENDPOINT', default='other')
+
+########################################################################################################################
+# request latency buckets in seconds
+########################################################################################################################
+DEFAULT_BUCKETS:tuple[float, ...] = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+########################################################################################################################
+# labels every request sent from inside func with func's qualified name ("JobAPI.info"), or name if given.  The async
+# endpoint classes inherit the synchronous methods, which hand back a coroutine that hasn't run yet, so a coroutine
+# result is wrapped to carry the label to wherever it is awaited
+########################################################################################################################
+def endpoint(func:Callable=None, *, name:str=None) -> Callable:
+    if func is None:
+        return functools.partial(endpoint, name=name)
+
+    label = name if name is not None else func.__qualname__
+
+    async def labeled(coroutine):
+        token = CURRENT_ENDPOINT.set(label)
+        try:
+            return await coroutine
+        finally:
+            CURRENT_ENDPOINT.reset(token)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return await labeled(func(*args, **kwargs))
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = CURRENT_ENDPOINT.set(label)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            CURRENT_ENDPOINT.reset(token)
+
+        if inspect.iscoroutine(result):
+            return labeled(result)
+
+        return result
+
+    return wrapper
+
+
+########################################################################################################################
+# shared by every metric type, values are kept per tuple of label values in the order of labelnames
+########################################################################################################################
+class Metric:
+
+    type:str = None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, name:str, help:str, labelnames:tuple[str, ...]=()):
+        self.name:str                   = name
+        self.help:str                   = help
+        self.labelnames:tuple[str, ...] = tuple(labelnames)
+
+        self.lock:Lock = Lock()
+        self.values:dict[tuple, object] = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def labels(self, label_values:tuple) -> dict[str, str]:
+        return dict(zip(self.labelnames, label_values))
+
+    ####################################################################################################################
+    # [(labels, value)] for every label set seen so far
+    ####################################################################################################################
+    def samples(self) -> list[tuple[dict[str, str], object]]:
+        with self.lock:
+            return [(self.labels(k), v) for k,v in self.values.items()]
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class Counter(Metric):
+
+    type:str = 'counter'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def inc(self, *label_values:str, amount:float=1.0):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get(self, *label_values:str) -> float:
+        with self.lock:
+            return self.values.get(label_values, 0.0)
+
+
+########################################################################################################################
+# either set directly, or read from a function whenever the metrics are collected
+########################################################################################################################
+class Gauge(Metric):
+
+    type:str = 'gauge'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, name:str, help:str, labelnames:tuple[str, ...]=()):
+        super().__init__(name=name, help=help, labelnames=labelnames)
+        self.function:Callable[[], float] = None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def set(self, value:float, *label_values:str):
+        with self.lock:
+            self.values[label_values] = value
+
+    ####################################################################################################################
+    # only for gauges without labels.  Costs nothing until someone looks
+    ####################################################################################################################
+    def set_function(self, function:Callable[[], float]):
+        self.function = function
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get(self, *label_values:str) -> float:
+        if self.function is not None:
+            return self.function()
+
+        with self.lock:
+            return self.values.get(label_values, 0.0)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def samples(self) -> list[tuple[dict[str, str], object]]:
+        if self.function is not None:
+            return [({}, self.function())]
+
+        return super().samples()
+
+
+########################################################################################################################
+# values are {'buckets': {upper bound: cumulative count}, 'sum': total, 'count': observations}
+########################################################################################################################
+class Histogram(Metric):
+
+    type:str = 'histogram'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, name:str, help:str, labelnames:tuple[str, ...]=(), buckets:tuple[float, ...]=DEFAULT_BUCKETS):
+        super().__init__(name=name, help=help, labelnames=labelnames)
+        self.buckets:tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+
+    ####################################################################################################################
+    # per bucket counts are kept uncumulated, observing is one increment
+    ####################################################################################################################
+    def observe(self, value:float, *label_values:str):
+        index = bisect_left(self.buckets, value)
+
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __summary(self, state:list) -> dict:
+        counts, total, count = state
+
+        cumulative:dict[float, int] = {}
+        running = 0
+        for bound, n in zip(self.buckets, counts):
+            running += n
+            cumulative[bound] = running
+
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def get(self, *label_values:str) -> dict:
+        with self.lock:
+            state = self.values.get(label_values)
+            return self.__summary(state) if state is not None else None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def samples(self) -> list[tuple[dict[str, str], object]]:
+        with self.lock:
+            return [(self.labels(k), self.__summary(v)) for k,v in self.values.items()]
+
+
+########################################################################################################################
+# A set of metrics, readable from Python with collect() or as Prometheus text with export()
+########################################################################################################################
+class MetricsRegistry:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self):
+        self.metrics:dict[str, Metric] = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def register(self, metric:Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f'{metric.name} is already registered')
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def counter(self, name:str, help:str, labelnames:tuple[str, ...]=()) -> Counter:
+        return self.register(Counter(name=name, help=help, labelnames=labelnames))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def gauge(self, name:str, help:str, labelnames:tuple[str, ...]=()) -> Gauge:
+        return self.register(Gauge(name=name, help=help, labelnames=labelnames))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def histogram(
+        self,
+        name:str,
+        help:str,
+        labelnames:tuple[str, ...]=(),
+        buckets:tuple[float, ...]=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name=name, help=help, labelnames=labelnames, buckets=buckets))
+
+    ####################################################################################################################
+    # metric name -> [{'labels': {...}, 'value': ...}]
+    ####################################################################################################################
+    def collect(self) -> dict[str, list[dict]]:
+        return {
+            name: [{'labels': labels, 'value': value} for labels, value in metric.samples()]
+            for name, metric in self.metrics.items()
+        }
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def __format_labels(labels:dict[str, str]) -> str:
+        if len(labels) == 0:
+            return ''
+
+        escaped = (
+            str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+            for v in labels.values()
+        )
+        return '{' + ','.join(f'{k}="{v}"' for k,v in zip(labels.keys(), escaped)) + '}'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def __format_value(value:float) -> str:
+        if value == math.inf:
+            return '+Inf'
+        return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+    ####################################################################################################################
+    # Prometheus text exposition format, version 0.0.4
+    ####################################################################################################################
+    def export(self) -> str:
+        lines:list[str] = []
+
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+
+            for labels, value in metric.samples():
+                if metric.type != 'histogram':
+                    lines.append(f'{name}{self.__format_labels(labels)} {self.__format_value(value)}')
+                    continue
+
+                for bound, count in value['buckets'].items():
+                    bucket_labels = dict(labels, le=self.__format_value(bound))
+                    lines.append(f'{name}_bucket{self.__format_labels(bucket_labels)} {count}')
+
+                lines.append(f'{name}_sum{self.__format_labels(labels)} {self.__format_value(value["sum"])}')
+                lines.append(f'{name}_count{self.__format_labels(labels)} {value["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+########################################################################################################################
+# What the client records about itself.  Requests are labeled by the endpoint template they were sent for, see
+# endpoint(), so /job/a/1/api/json and /job/b/2/api/json both count towards BuildAPI.info
+########################################################################################################################
+class Metrics(MetricsRegistry):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self):
+        super().__init__()
+
+        self.requests:Counter = self.counter(
+            'jenkins_client_requests_total',
+            'HTTP requests sent to the controller, retries included',
+            ('endpoint', 'method', 'code')
+        )
+        self.request_seconds:Histogram = self.histogram(
+            'jenkins_client_request_duration_seconds',
+            'Time until the controller responded',
+            ('endpoint', 'method')
+        )
+        self.response_bytes:Counter = self.counter(
+            'jenkins_client_response_bytes_total',
+            'Response body bytes received from the controller',
+            ('endpoint',)
+        )
+        self.errors:Counter = self.counter(
+            'jenkins_client_request_errors_total',
+            'Requests that timed out, failed to connect or got a 5xx',
+            ('endpoint', 'method', 'reason')
+        )
+        self.poll_cycle_seconds:Histogram = self.histogram(
+            'jenkins_client_poll_cycle_seconds',
+            'Time taken by a pass of the status poller',
+            ('mode',)
+        )
+        self.tracked_jobs:Gauge = self.gauge(
+            'jenkins_client_tracked_jobs',
+            'Jobs the client is following'
+        )
+        self.tracked_instances:Gauge = self.gauge(
+            'jenkins_client_tracked_instances',
+            'Builds and queue items the client is holding'
+        )
+        self.dispatch_events:Counter = self.counter(
+            'jenkins_client_dispatch_events_total',
+            'Listener events by what became of them: delivered, failed, coalesced into a waiting one or dropped',
+            ('outcome',)
+        )
+        self.dispatch_lag_seconds:Histogram = self.histogram(
+            'jenkins_client_dispatch_lag_seconds',
+            'Time from a state change to its listeners being called'
+        )
+        self.dispatch_queue_depth:Gauge = self.gauge(
+            'jenkins_client_dispatch_queue_depth',
+            'Listener events waiting to be delivered'
+        )
+        self.dispatch_blocked_seconds:Counter = self.counter(
+            'jenkins_client_dispatch_blocked_seconds_total',
+            'Time the poller spent waiting for room in a full listener queue'
+        )
+
+    ####################################################################################################################
+    # size is the body length, None when it isn't known without reading a streamed body
+    ####################################################################################################################
+    def observe_response(self, method:str, status_code:int, seconds:float, size:int=None):
+        name = CURRENT_ENDPOINT.get()
+
+        self.requests.inc(name, method, str(status_code))
+        self.request_seconds.observe(seconds, name, method)
+
+        if size is not None:
+            self.response_bytes.inc(name, amount=size)
+
+        if status_code >= 500:
+            self.errors.inc(name, method, 'server_error')
+
+    ####################################################################################################################
+    # reason is 'timeout' or 'connection'
+    ####################################################################################################################
+    def observe_failure(self, method:str, reason:str):
+        name = CURRENT_ENDPOINT.get()
+
+        self.requests.inc(name, method, reason)
+        self.errors.inc(name, method, reason)
@@ -0,0 +1,88 @@
+########################################################################################################################
+# kept apart from metrics.py so clients that never serve their metrics don't import http.server
+########################################################################################################################
+from    http.server             import BaseHTTPRequestHandler, ThreadingHTTPServer
+from    metrics                 import MetricsRegistry
+from    threading               import Thread
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = self.server.registry.export().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def log_message(self, format, *args):
+        LOGGER.debug(format % args)
+
+
+########################################################################################################################
+# Serves registry.export() on /metrics for a Prometheus scraper.  port=0 picks a free port
+########################################################################################################################
+class MetricsServer:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, registry:MetricsRegistry, host:str='127.0.0.1', port:int=0):
+        self.server:ThreadingHTTPServer = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads  = True
+        self.server.registry        = registry
+
+        self.thread:Thread = None
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def url(self) -> str:
+        host = self.server.server_address[0]
+        return f'http://{host}:{self.port}/metrics'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+
+        self.server.server_close()
@@ -0,0 +1,422 @@
+########################################################################################################################
+#
+########################################################################################################################
+import  asyncio
+import  base64
+from    exceptions              import CommunicationError, RequestTimeout
+from    http.cookies            import CookieError, SimpleCookie
+import  json
+from    metrics                 import Metrics
+from    network.communicator    import Communicator
+from    requests.structures     import CaseInsensitiveDict
+import  ssl
+import  time
+from    typing                  import Awaitable, Callable
+from    urllib.parse            import urljoin, urlsplit
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# how many redirects a request follows before the last one is handed back as the response, the same as requests.  Only
+# 307 and 308 keep the method, the others turn a POST into a GET the way requests and browsers do
+########################################################################################################################
+MAX_REDIRECTS:int = 30
+
+REDIRECT_STATUSES:set[int]          = {301, 302, 303, 307, 308}
+METHOD_KEEPING_STATUSES:set[int]    = {307, 308}
+
+
+########################################################################################################################
+# The parts of requests.models.Response that the rest of the library reads, so parsing code works with either
+########################################################################################################################
+class AsyncResponse:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, url:str, status_code:int, reason:str, headers:CaseInsensitiveDict, content:bytes):
+        self.url:str                        = url
+        self.status_code:int                = status_code
+        self.reason:str                     = reason
+        self.headers:CaseInsensitiveDict    = headers
+        self.content:bytes                  = content
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def json(self):
+        return json.loads(self.content)
+
+
+########################################################################################################################
+# Keep-alive HTTP/1.1 connections per (scheme, host, port).  pool_size bounds the number of requests in flight, idle
+# connections are handed back out before new ones are opened
+########################################################################################################################
+class AsyncConnectionPool:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, pool_size:int=10):
+        self.pool_size:int = pool_size
+
+        # created on first use so the pool can be constructed outside of a running loop
+        self.semaphore:asyncio.Semaphore = None
+
+        self.idle:dict[tuple, list[tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def slot(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+        return self.semaphore
+
+    ####################################################################################################################
+    # returns (reader, writer, reused)
+    ####################################################################################################################
+    async def acquire(self, key:tuple) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        idle = self.idle.get(key, [])
+
+        while len(idle) > 0:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host=host,
+            port=port,
+            ssl=ssl.create_default_context() if scheme == 'https' else None
+        )
+        return reader, writer, False
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def release(self, key:tuple, reader:asyncio.StreamReader, writer:asyncio.StreamWriter, reusable:bool):
+        if reusable and not writer.is_closing():
+            self.idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle = {}
+
+
+########################################################################################################################
+# asyncio counterpart of Communicator
+########################################################################################################################
+class AsyncCommunicator:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        username:str,
+        password:str=None,
+        api_token:str=None,
+        api_token_file:str=None,
+        pool_size:int=10,
+        connect_timeout:float=5.0,
+        read_timeout:float=30.0,
+        metrics:Metrics=None
+    ):
+
+        password = Communicator.resolve_password(password=password, api_token=api_token, api_token_file=api_token_file)
+
+        # auth used
+        self.authorization:str = 'Basic ' + base64.b64encode(f'{username}:{password}'.encode('latin1')).decode('ascii')
+
+        self.pool:AsyncConnectionPool = AsyncConnectionPool(pool_size=pool_size)
+
+        self.connect_timeout:float  = connect_timeout
+        self.read_timeout:float     = read_timeout
+
+        # data from crumbapi, fetched by crumb_provider when the first POST needs it.  See Communicator
+        self.crumb:str                  = None
+        self.crumb_request_field:str    = None
+        self.crumb_provider:Callable[[], Awaitable[tuple[str, str]]] = None
+        self.crumb_generation:int       = 0
+
+        # created on first use so the communicator can be constructed outside of a running loop
+        self.crumb_lock:asyncio.Lock    = None
+
+        # every request sent is recorded here, see Communicator
+        self.metrics:Metrics = metrics
+
+        # host -> cookie name -> value.  Jenkins ties a crumb to the session cookie it was issued with, so like the
+        # requests.Session Communicator holds, every cookie a host sets is sent back to it
+        self.cookies:dict[str, dict[str, str]] = {}
+
+    ####################################################################################################################
+    # follows redirects like requests does.  Credentials and the crumb only go to url's own host, cookies to whichever
+    # host set them
+    ####################################################################################################################
+    async def __response(self, url:str, method:str) -> AsyncResponse:
+        host = urlsplit(url).hostname
+
+        for _ in range(MAX_REDIRECTS):
+            response = await self.__send(url, method, authorize=urlsplit(url).hostname == host)
+
+            if response.status_code not in REDIRECT_STATUSES or 'Location' not in response.headers:
+                return response
+
+            LOGGER.debug(f'{url}: redirected to {response.headers["Location"]}')
+
+            url = urljoin(url, response.headers['Location'])
+
+            if response.status_code not in METHOD_KEEPING_STATUSES:
+                method = 'GET'
+
+        raise CommunicationError(f'{url}: more than {MAX_REDIRECTS} redirects')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def __send(self, url:str, method:str, authorize:bool=True) -> AsyncResponse:
+        start = time.monotonic()
+        try:
+            parts   = urlsplit(url)
+            port    = parts.port or (443 if parts.scheme == 'https' else 80)
+            key     = (parts.scheme, parts.hostname, port)
+            target  = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+            headers = {
+                'Host'              : parts.netloc,
+                'Accept-Encoding'   : 'identity',
+                'Connection'        : 'keep-alive',
+                'Content-Length'    : '0',
+            }
+
+            if authorize:
+                headers['Authorization'] = self.authorization
+
+                # apply the crumb to the header if we have any
+                if None not in [self.crumb, self.crumb_request_field]:
+                    headers[self.crumb_request_field] = self.crumb
+
+            cookies = self.cookies.get(parts.hostname)
+            if cookies:
+                headers['Cookie'] = '; '.join(f'{k}={v}' for k,v in cookies.items())
+
+            request = f'{method} {target} HTTP/1.1\r\n'
+            request += ''.join(f'{k}: {v}\r\n' for k,v in headers.items())
+            request += '\r\n'
+
+            async with self.pool.slot():
+                # a pooled connection may have been closed by the server while idle, in that case try once more on a
+                # fresh one
+                while True:
+                    reader, writer, reused = await asyncio.wait_for(self.pool.acquire(key), self.connect_timeout)
+                    try:
+                        writer.write(request.encode('latin1'))
+                        await writer.drain()
+                        response, reusable, set_cookies = await asyncio.wait_for(
+                            self.__read_response(reader, method=method, url=url),
+                            self.read_timeout
+                        )
+                    except Exception as e:
+                        writer.close()
+                        if reused and isinstance(e, (ConnectionError, asyncio.IncompleteReadError)):
+                            continue
+                        raise
+
+                    self.pool.release(key, reader, writer, reusable)
+
+                    self.__store_cookies(parts.hostname, set_cookies)
+
+                    if self.metrics is not None:
+                        self.metrics.observe_response(
+                            method,
+                            response.status_code,
+                            time.monotonic() - start,
+                            len(response.content)
+                        )
+
+                    return response
+
+        except asyncio.TimeoutError as e:
+            LOGGER.warning(f'{url}: timed out')
+            if self.metrics is not None:
+                self.metrics.observe_failure(method, 'timeout')
+            raise RequestTimeout(f'{url}: timed out') from e
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            LOGGER.warning(f'{url}: {e}')
+            if self.metrics is not None:
+                self.metrics.observe_failure(method, 'connection')
+            raise CommunicationError(f'{url}: {e}') from e
+
+    ####################################################################################################################
+    # host sent set_cookies, the values of its Set-Cookie headers.  A cookie set to expire right away is dropped
+    ####################################################################################################################
+    def __store_cookies(self, host:str, set_cookies:list[str]):
+        for set_cookie in set_cookies:
+            cookie = SimpleCookie()
+            try:
+                cookie.load(set_cookie)
+            except CookieError:
+                LOGGER.debug(f'{host}: ignoring cookie {set_cookie}')
+                continue
+
+            jar = self.cookies.setdefault(host, {})
+
+            for name, morsel in cookie.items():
+                if morsel['max-age'] in ('0', '-1') or morsel.value == '':
+                    jar.pop(name, None)
+                else:
+                    jar[name] = morsel.value
+
+    ####################################################################################################################
+    # returns the response, whether the connection can be kept alive and the values of its Set-Cookie headers
+    ####################################################################################################################
+    @staticmethod
+    async def __read_response(
+        reader:asyncio.StreamReader,
+        method:str,
+        url:str
+    ) -> tuple[AsyncResponse, bool, list[str]]:
+
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin1').split('\r\n')
+
+        version, status, *reason = head[0].split(' ', 2)
+
+        # repeated headers are joined the way requests does, except Set-Cookie whose values may hold commas themselves
+        headers = CaseInsensitiveDict()
+        set_cookies:list[str] = []
+
+        for line in head[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                name, value = name.strip(), value.strip()
+
+                if name.lower() == 'set-cookie':
+                    set_cookies.append(value)
+
+                headers[name] = f'{headers[name]}, {value}' if name in headers else value
+
+        status      = int(status)
+        reusable    = version == 'HTTP/1.1' and headers.get('Connection', '').lower() != 'close'
+
+        # these never carry a body
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            content = b''
+
+        elif headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # trailers, up to the terminating blank line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b''.join(chunks)
+
+        elif 'Content-Length' in headers:
+            content = await reader.readexactly(int(headers['Content-Length']))
+
+        # no framing, the body runs until the server closes the connection
+        else:
+            content     = await reader.read()
+            reusable    = False
+
+        return AsyncResponse(
+            url=url,
+            status_code=status,
+            reason=reason[0] if reason else '',
+            headers=headers,
+            content=content
+        ), reusable, set_cookies
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def set_crumbs(self, crumb:str, crumb_request_field:str):
+        self.crumb=crumb
+        self.crumb_request_field = crumb_request_field
+        self.crumb_generation += 1
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def set_crumb_provider(self, crumb_provider:Callable[[], Awaitable[tuple[str, str]]]):
+        self.crumb_provider = crumb_provider
+
+    ####################################################################################################################
+    # fetch the crumb if we never have, or if the one from stale_generation was rejected and nobody has replaced it yet
+    ####################################################################################################################
+    async def __ensure_crumb(self, stale_generation:int=None):
+        if self.crumb_provider is None:
+            return
+
+        if self.crumb_lock is None:
+            self.crumb_lock = asyncio.Lock()
+
+        async with self.crumb_lock:
+            if stale_generation is None and self.crumb_generation > 0:
+                return
+
+            if stale_generation is not None and stale_generation != self.crumb_generation:
+                return
+
+            self.crumb, self.crumb_request_field = await self.crumb_provider()
+            self.crumb_generation += 1
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def valid(self) -> bool:
+        return None not in [self.crumb, self.crumb_request_field]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def get(self, url) -> AsyncResponse:
+        LOGGER.debug('Getting: ' + url)
+        return await self.__response(url, 'GET')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def post(self, url) -> AsyncResponse:
+        LOGGER.debug('Posting: ' + url)
+        await self.__ensure_crumb()
+
+        generation  = self.crumb_generation
+        resp        = await self.__response(url, 'POST')
+
+        # the crumb expired or the session was reset, get a new one and replay once
+        if Communicator.crumb_rejected(resp):
+            LOGGER.debug('Crumb rejected, refreshing: ' + url)
+            await self.__ensure_crumb(stale_generation=generation)
+            resp = await self.__response(url, 'POST')
+
+        return resp
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def close(self):
+        await self.pool.close()
@@ -0,0 +1,82 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    threading               import Lock
+import  time
+
+
+########################################################################################################################
+# circuit states
+########################################################################################################################
+CLOSED      = 'closed'      # requests flow
+OPEN        = 'open'        # controller is down or slow, shed what we can
+HALF_OPEN   = 'half_open'   # reset_timeout passed, one probe is let through to see if things recovered
+
+
+########################################################################################################################
+# Per controller breaker.  failure_threshold consecutive failures open it, a call slower than slow_call_seconds counts
+# as a failure
+########################################################################################################################
+class CircuitBreaker:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, failure_threshold:int=5, reset_timeout:float=10.0, slow_call_seconds:float=None):
+        self.failure_threshold:int      = failure_threshold
+        self.reset_timeout:float        = reset_timeout
+        self.slow_call_seconds:float    = slow_call_seconds
+
+        self.lock:Lock = Lock()
+
+        self.state:str          = CLOSED
+        self.failures:int       = 0
+        self.opened_at:float    = 0.0
+        self.probing:bool       = False
+
+    ####################################################################################################################
+    # may a request be sent right now
+    ####################################################################################################################
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+
+            # half open, only one probe at a time
+            if self.probing:
+                return False
+
+            self.probing = True
+            return True
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def record(self, success:bool, elapsed:float=0.0):
+        if success and self.slow_call_seconds is not None and elapsed > self.slow_call_seconds:
+            success = False
+
+        with self.lock:
+            self.probing = False
+
+            if success:
+                self.state      = CLOSED
+                self.failures   = 0
+                return
+
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state      = OPEN
+                self.opened_at  = time.monotonic()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
@@ -1,13 +1,29 @@
 ########################################################################################################################
 #
 ########################################################################################################################
+from    exceptions              import CircuitOpen, CommunicationError, RequestTimeout
+import  functools
 import  json
+from    metrics                 import Metrics
+from    network.circuitbreaker  import CircuitBreaker
+from    network.responsecache   import ResponseCache
+import  random
 import  requests
-from    requests.models import HTTPBasicAuth, Response
+from    requests.adapters       import HTTPAdapter
+from    requests.models         import HTTPBasicAuth, Response
+import  threading
+import  time
+from    typing                  import Callable
 
 import  logging
 LOGGER = logging.getLogger(__file__)
 
+########################################################################################################################
+# gateway errors and throttling are worth another try for an idempotent request
+########################################################################################################################
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
 ########################################################################################################################
 #
 ########################################################################################################################
@@ -16,62 +32,196 @@ class Communicator:
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __init__(self, username:str, password:str=None, api_token:str=None, api_token_file:str=None):
+    @staticmethod
+    def resolve_password(password:str=None, api_token:str=None, api_token_file:str=None) -> str:
 
         # user gave password directly, just use it
         if password:
-            pass
+            return password
         # use the api token just like a password
         elif api_token:
-            password=api_token
+            return api_token
         # read the first line in the file and use like an api token
         elif api_token_file:
             with open(api_token_file, 'r') as f:
-                password=f.readline().strip()
+                return f.readline().strip()
         # nothing was given to us, raise
         else:
             raise Exception("Not authentication provided")
 
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        username:str,
+        password:str=None,
+        api_token:str=None,
+        api_token_file:str=None,
+        cache:ResponseCache=None,
+        connect_timeout:float=5.0,
+        read_timeout:float=30.0,
+        retries:int=3,
+        retry_backoff:float=.25,
+        max_retry_backoff:float=5.0,
+        pool_size:int=10,
+        circuit_breaker:CircuitBreaker=None,
+        metrics:Metrics=None
+    ):
+
         # auth used
-        self.auth = HTTPBasicAuth(username=username, password=password)
+        self.auth = HTTPBasicAuth(
+            username=username,
+            password=self.resolve_password(password=password, api_token=api_token, api_token_file=api_token_file)
+        )
 
-        # hold the session so our crumbs don't reset
+        # hold the session so our crumbs don't reset.  The pool has to be as big as the number of threads sending
+        # requests or connections get thrown away and reopened
         self.session:requests.Session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-        # data from crumbapi
+        self.timeout:tuple[float, float]    = (connect_timeout, read_timeout)
+        self.retries:int                    = retries
+        self.retry_backoff:float            = retry_backoff
+        self.max_retry_backoff:float        = max_retry_backoff
+
+        # background requests are shed while the controller is down, foreground requests are always sent
+        self.circuit_breaker:CircuitBreaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.local:threading.local          = threading.local()
+
+        # data from crumbapi.  The crumb is only fetched when the first POST needs it, through crumb_provider, and
+        # every refresh bumps crumb_generation so threads that saw the same rejected crumb only refresh it once
         self.crumb:str                  = None
         self.crumb_request_field:str    = None
+        self.crumb_provider:Callable[[], tuple[str, str]] = None
+        self.crumb_generation:int       = 0
+        self.crumb_lock:threading.Lock  = threading.Lock()
+
+        # shared GET responses, None sends every request
+        self.cache:ResponseCache = cache
+
+        # every request that reaches the controller is recorded here, cache hits aren't
+        self.metrics:Metrics = metrics
 
     ####################################################################################################################
     #
     ####################################################################################################################
-    def __response(self, url, func) -> Response:
-        try:
-            # specify we want json, I think this is superceded by supplying /api/json to all url requests, but put
-            # here just in case
-            headers = {}
+    def __response(self, url, func, idempotent:bool, method:str, streamed:bool=False) -> Response:
+        # specify we want json, I think this is superceded by supplying /api/json to all url requests, but put
+        # here just in case
+        headers = {}
+
+        # apply the crumb to the header if we have any
+        if None not in [self.crumb, self.crumb_request_field]:
+            headers[self.crumb_request_field] = self.crumb
+
+        attempts = self.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
 
-            # apply the crumb to the header if we have any
-            if None not in [self.crumb, self.crumb_request_field]:
-                headers[self.crumb_request_field] = self.crumb
+            if attempt > 0:
+                # full jitter so a fleet of pollers doesn't retry in lock step
+                time.sleep(random.uniform(0, min(self.max_retry_backoff, self.retry_backoff * (2 ** attempt))))
 
-            # get the respnose
-            return func(
-                url=url,
-                auth=self.auth,
-                headers=headers
-            )
+            if not self.circuit_breaker.allow() and self.background:
+                raise CircuitOpen(f'Controller unavailable, not sending {url}')
 
-        except Exception as e:
-            LOGGER.warning(e)
-            return None
+            start = time.monotonic()
+            try:
+                # get the respnose
+                resp = func(
+                    url=url,
+                    auth=self.auth,
+                    headers=headers,
+                    timeout=self.timeout
+                )
+            except requests.Timeout as e:
+                self.circuit_breaker.record(False)
+                self.__observe_failure(method, 'timeout')
+                error = RequestTimeout(f'{url}: {e}')
+            except requests.RequestException as e:
+                self.circuit_breaker.record(False)
+                self.__observe_failure(method, 'connection')
+                error = CommunicationError(f'{url}: {e}')
+            else:
+                elapsed = time.monotonic() - start
+                failed  = resp.status_code >= 500
+                self.circuit_breaker.record(not failed, elapsed)
+
+                if self.metrics is not None:
+                    self.__observe_response(method, resp, elapsed, streamed)
+
+                if resp.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    return resp
+
+                # a streamed response holds on to its connection until closed
+                resp.close()
+                continue
+
+            LOGGER.warning(error)
+            if attempt == attempts - 1:
+                raise error
+
+    ####################################################################################################################
+    # a streamed body hasn't been read yet, only its Content-Length can be counted
+    ####################################################################################################################
+    def __observe_response(self, method:str, resp:Response, elapsed:float, streamed:bool):
+        size = resp.headers.get('Content-Length')
+
+        if size is not None:
+            size = int(size)
+        elif not streamed:
+            size = len(resp.content)
+
+        self.metrics.observe_response(method, resp.status_code, elapsed, size)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __observe_failure(self, method:str, reason:str):
+        if self.metrics is not None:
+            self.metrics.observe_failure(method, reason)
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def set_crumbs(self, crumb:str, crumb_request_field:str):
-        self.crumb=crumb
-        self.crumb_request_field = crumb_request_field
+        with self.crumb_lock:
+            self.crumb=crumb
+            self.crumb_request_field = crumb_request_field
+            self.crumb_generation += 1
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def set_crumb_provider(self, crumb_provider:Callable[[], tuple[str, str]]):
+        self.crumb_provider = crumb_provider
+
+    ####################################################################################################################
+    # fetch the crumb if we never have, or if the one from stale_generation was rejected and nobody has replaced it yet
+    ####################################################################################################################
+    def __ensure_crumb(self, stale_generation:int=None):
+        if self.crumb_provider is None:
+            return
+
+        with self.crumb_lock:
+            if stale_generation is None and self.crumb_generation > 0:
+                return
+
+            if stale_generation is not None and stale_generation != self.crumb_generation:
+                return
+
+            self.crumb, self.crumb_request_field = self.crumb_provider()
+            self.crumb_generation += 1
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def crumb_rejected(resp:Response) -> bool:
+        return resp is not None and resp.status_code == 403 and b'crumb' in resp.content.lower()
 
     ####################################################################################################################
     #
@@ -80,16 +230,67 @@ class Communicator:
     def valid(self) -> bool:
         return None not in [self.crumb, self.crumb_request_field]
 
+    ####################################################################################################################
+    # marks requests sent from the calling thread as background polling, which the circuit breaker may shed
+    ####################################################################################################################
+    def set_background(self, background:bool=True):
+        self.local.background = background
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def background(self) -> bool:
+        return getattr(self.local, 'background', False)
+
     ####################################################################################################################
     #
     ####################################################################################################################
     def get(self, url) -> Response:
+        if self.cache is not None:
+            return self.cache.get(url, lambda: self.__get(url))
+
+        return self.__get(url)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __get(self, url) -> Response:
         LOGGER.debug('Getting: ' + url)
-        return self.__response(url, self.session.get)
+        return self.__response(url, self.session.get, idempotent=True, method='GET')
+
+    ####################################################################################################################
+    # GET whose body is read as it is consumed instead of up front, never cached.  The caller must close the response
+    ####################################################################################################################
+    def stream(self, url) -> Response:
+        LOGGER.debug('Streaming: ' + url)
+        return self.__response(
+            url,
+            functools.partial(self.session.get, stream=True),
+            idempotent=True,
+            method='GET',
+            streamed=True
+        )
 
     ####################################################################################################################
     #
     ####################################################################################################################
     def post(self, url) -> Response:
         LOGGER.debug('Posting: ' + url)
-        return self.__response(url, self.session.post)
+        try:
+            self.__ensure_crumb()
+
+            generation  = self.crumb_generation
+            resp        = self.__response(url, self.session.post, idempotent=False, method='POST')
+
+            # the crumb expired or the session was reset, get a new one and replay once
+            if self.crumb_rejected(resp):
+                LOGGER.debug('Crumb rejected, refreshing: ' + url)
+                self.__ensure_crumb(stale_generation=generation)
+                resp = self.__response(url, self.session.post, idempotent=False, method='POST')
+
+            return resp
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(url)
+
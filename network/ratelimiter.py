@@ -0,0 +1,42 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    threading               import Lock
+import  time
+
+
+########################################################################################################################
+# Token bucket, allows rate requests per second on average with bursts of up to burst requests
+########################################################################################################################
+class RateLimiter:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, rate:float, burst:int=1):
+        self.rate:float     = rate
+        self.capacity:float = max(1, burst)
+
+        self.lock:Lock = Lock()
+
+        self.tokens:float   = self.capacity
+        self.updated:float  = time.monotonic()
+
+    ####################################################################################################################
+    # block until a request may be sent
+    ####################################################################################################################
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                self.tokens     = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated    = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
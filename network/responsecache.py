@@ -0,0 +1,182 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    collections             import OrderedDict
+import  re
+from    requests.models         import Response
+from    threading               import Event, Lock
+import  time
+from    typing                  import Callable
+from    urllib.parse            import urlsplit
+
+
+########################################################################################################################
+# (path regex, ttl in seconds), first match wins.  A ttl of 0 still coalesces concurrent requests but never keeps the
+# result around.  The default ttl is below the poller's active interval so it never reads back its own last result
+########################################################################################################################
+DEFAULT_TTL:float = .2
+DEFAULT_TTLS:list[tuple[str, float]] = [
+    (r'/logText/',      0.0),
+    (r'/queue/',        0.0),
+    (r'/crumbIssuer/',  0.0),
+    (r'/user/',         60.0),
+    (r'/asynchPeople/', 60.0),
+    (r'/computer/',     5.0),
+]
+
+
+########################################################################################################################
+# A request that is on the wire, anyone asking for the same url waits on it instead of sending their own
+########################################################################################################################
+class InFlight:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, generation:int):
+        self.generation:int         = generation
+        self.done:Event             = Event()
+        self.response:Response      = None
+        self.error:BaseException    = None
+
+
+########################################################################################################################
+# Size bounded LRU of GET responses with per endpoint ttls.  Identical GETs issued at the same time share one request,
+# and a POST drops everything that could have been changed by it
+########################################################################################################################
+class ResponseCache:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(
+        self,
+        max_entries:int=1024,
+        default_ttl:float=DEFAULT_TTL,
+        ttls:list[tuple[str, float]]=DEFAULT_TTLS
+    ):
+        self.max_entries:int    = max_entries
+        self.default_ttl:float  = default_ttl
+        self.ttls:list[tuple[re.Pattern, float]] = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+
+        self.lock:Lock = Lock()
+
+        # url -> (expiry, response), least recently used first
+        self.entries:OrderedDict[str, tuple[float, Response]] = OrderedDict()
+
+        self.in_flight:dict[str, InFlight] = {}
+
+        # bumped by every invalidation, a request that started before one must not store its result
+        self.generation:int = 0
+
+        self.hits:int       = 0
+        self.misses:int     = 0
+        self.coalesced:int  = 0
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def ttl(self, url:str) -> float:
+        path = urlsplit(url).path
+        return next((ttl for pattern, ttl in self.ttls if pattern.search(path)), self.default_ttl)
+
+    ####################################################################################################################
+    # return the cached response for url, the response of an identical request already in flight, or the result of
+    # fetch()
+    ####################################################################################################################
+    def get(self, url:str, fetch:Callable[[], Response]) -> Response:
+
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(url)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[url]
+
+            flight = self.in_flight.get(url)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = InFlight(self.generation)
+                self.in_flight[url] = flight
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.in_flight.get(url) is flight:
+                    del self.in_flight[url]
+
+                ttl = self.ttl(url)
+                if (
+                    ttl > 0
+                    and flight.generation == self.generation
+                    and flight.response is not None
+                    and flight.response.status_code == 200
+                ):
+                    self.entries[url] = (time.monotonic() + ttl, flight.response)
+                    self.entries.move_to_end(url)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+
+            flight.done.set()
+
+        return flight.response
+
+    ####################################################################################################################
+    # a POST to url happened.  Anything under the same job can be stale now, as can anything that isn't job specific
+    # (the job list, the queue).  Other jobs are left alone
+    ####################################################################################################################
+    def invalidate(self, url:str):
+        parts   = urlsplit(url)
+        job     = re.search(r'((?:/job/[^/]+)+)', parts.path)
+
+        with self.lock:
+            self.generation += 1
+
+            if job is None:
+                stale = list(self.entries.keys())
+            else:
+                prefix  = f'{parts.scheme}://{parts.netloc}{parts.path[:job.end()]}/'
+                stale   = [k for k in self.entries.keys() if k.startswith(prefix) or '/job/' not in urlsplit(k).path]
+
+            for k in stale:
+                del self.entries[k]
+
+            # requests already on the wire may have been answered before the POST, nobody new should join them
+            self.in_flight = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.in_flight = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                'hits'      : self.hits,
+                'misses'    : self.misses,
+                'coalesced' : self.coalesced,
+                'entries'   : len(self.entries),
+            }
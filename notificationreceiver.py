@@ -0,0 +1,151 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    exceptions              import InvalidResponse
+import  hmac
+from    http.server             import BaseHTTPRequestHandler, ThreadingHTTPServer
+import  ipaddress
+import  json
+from    threading               import Thread
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# One POST per event, the body is the Notification plugin's JSON payload
+########################################################################################################################
+class NotificationHandler(BaseHTTPRequestHandler):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def do_POST(self):
+        try:
+            length  = int(self.headers.get('Content-Length') or 0)
+            body    = self.rfile.read(length)
+
+            if not self.server.receiver.authorized(self.path):
+                LOGGER.warning(f'Rejected notification from {self.client_address[0]}, wrong token')
+                self.__reply(403)
+                return
+
+            payload = json.loads(body)
+
+            if not isinstance(payload, dict):
+                raise InvalidResponse("Notification payload is not an object")
+
+            self.server.receiver.on_event(payload)
+
+        except (ValueError, InvalidResponse) as e:
+            LOGGER.warning(f'Bad notification from {self.client_address[0]}: {e}')
+            self.__reply(400)
+            return
+
+        except Exception:
+            LOGGER.exception('Failed to handle notification')
+            self.__reply(500)
+            return
+
+        self.__reply(200)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __reply(self, code:int):
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def log_message(self, format, *args):
+        LOGGER.debug(format % args)
+
+
+########################################################################################################################
+# Embedded HTTP server for the Jenkins Notification plugin.  Point the plugin's HTTP/JSON endpoint at url and every job
+# event is handed to on_event as it happens.  port=0 picks a free port.
+#
+# Anyone who can reach the receiver can add jobs and complete builds with whatever result they like, so it only
+# listens on the loopback interface by default.  With a token only POSTs to /{token} are accepted, the plugin's url
+# carries it.  Listening anywhere else without one is allowed but warned about
+########################################################################################################################
+class NotificationReceiver:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, on_event:Callable[[dict], None], host:str='127.0.0.1', port:int=0, token:str=None):
+        self.on_event = on_event
+
+        # the path a notification has to be posted to, None accepts any
+        self.path:str = f'/{token}' if token else None
+
+        self.server:ThreadingHTTPServer = ThreadingHTTPServer((host, port), NotificationHandler)
+        self.server.daemon_threads  = True
+        self.server.receiver        = self
+
+        self.thread:Thread = None
+
+        if self.path is None and not NotificationReceiver.is_loopback(host):
+            LOGGER.warning(f'Notification receiver listening on {host} without a token, anyone who can reach it can '
+                           f'feed it events')
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def is_loopback(host:str) -> bool:
+        if host == 'localhost':
+            return True
+
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    ####################################################################################################################
+    # whether a notification posted to path is let through
+    ####################################################################################################################
+    def authorized(self, path:str) -> bool:
+        if self.path is None:
+            return True
+
+        # the plugin's url may end in a slash
+        return hmac.compare_digest(path.rstrip('/').encode(), self.path.encode())
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @property
+    def url(self) -> str:
+        host = self.server.server_address[0]
+        return f'http://{host}:{self.port}{self.path or "/"}'
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name='NotificationReceiver', daemon=True)
+        self.thread.start()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+
+        self.server.server_close()
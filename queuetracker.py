@@ -0,0 +1,116 @@
+########################################################################################################################
+#
+########################################################################################################################
+from    api.jenkinsapi          import JenkinsAPI
+from    api.tree.compiledfilter import CompiledFilter
+from    api.tree.filterlist     import FilterList
+from    decoding                import SHAPE_QUEUE
+from    exceptions              import CommunicationError, InvalidResponse
+from    jobinstance             import JobInstance
+from    requests.models         import Response
+from    threading               import Lock
+from    typing                  import Callable
+
+import  logging
+LOGGER = logging.getLogger(__file__)
+
+
+########################################################################################################################
+# Follows every queued JobInstance with a single /queue request per cycle instead of one queue item request each
+########################################################################################################################
+class QueueTracker:
+
+    # just enough to tell which items are still waiting and which have been given a build
+    queue_filter:CompiledFilter = FilterList()\
+        .begin_filter('items')\
+            .with_filter('id')\
+            .with_filter('why')\
+            .with_filter('cancelled')\
+            .begin_filter('executable')\
+                .with_filter('number')\
+                .end()\
+            .end()\
+        .compile()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, api:JenkinsAPI):
+        self.api = api
+
+        self.lock:Lock = Lock()
+
+        # queue id -> instance waiting on it
+        self.instances:dict[int, JobInstance] = {}
+
+    ####################################################################################################################
+    # instances still waiting on their queue item, the ones that have since started or been cancelled don't count
+    ####################################################################################################################
+    def __len__(self) -> int:
+        return len(self.__prune())
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def track(self, inst:JobInstance):
+        if inst.build_id is not None or inst.complete:
+            return
+
+        with self.lock:
+            self.instances[inst.queue_id] = inst
+
+    ####################################################################################################################
+    # forget anything that has been given a build, whoever resolved it
+    ####################################################################################################################
+    def __prune(self) -> list[JobInstance]:
+        with self.lock:
+            for queue_id in [k for k,v in self.instances.items() if v.build_id is not None or v.complete]:
+                del self.instances[queue_id]
+
+            return list(self.instances.values())
+
+    ####################################################################################################################
+    # diff the /queue listing against the tracked instances.  Returns whether anything changed, and the instances
+    # whose items are no longer listed.  Those have either started or been cancelled, and only their own queue item
+    # can tell us which.  Cancelled ones complete and are pruned like started ones
+    ####################################################################################################################
+    def from_response(self, response:Response) -> tuple[bool, list[JobInstance]]:
+        if response is None or response.status_code != 200:
+            raise InvalidResponse("Invalid response")
+
+        shape = SHAPE_QUEUE if self.queue_filter is QueueTracker.queue_filter else None
+
+        items = {item['id']:item for item in self.api.decoder.decode(response, shape)['items']}
+
+        changed = False
+        vanished:list[JobInstance] = []
+
+        for inst in self.__prune():
+            item = items.get(inst.queue_id)
+            if item is None:
+                vanished.append(inst)
+            else:
+                changed |= inst.from_queue_json(item)
+
+        return changed, vanished
+
+    ####################################################################################################################
+    # fan_out runs a function over a list and returns the results, the default runs them one after another
+    ####################################################################################################################
+    def update(self, fan_out:Callable[[Callable, list], list]=None) -> bool:
+        if len(self.__prune()) == 0:
+            return False
+
+        try:
+            changed, vanished = self.from_response(self.api.queue_api.info(filter=self.queue_filter))
+        except (InvalidResponse, CommunicationError):
+            return False
+
+        if len(vanished) > 0:
+            if fan_out is None:
+                fan_out = lambda func, items: [func(x) for x in items]
+            changed |= any(fan_out(lambda inst: inst.update(), vanished))
+
+        self.__prune()
+
+        return changed
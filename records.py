@@ -0,0 +1,96 @@
+########################################################################################################################
+# The msgspec backend decodes the known shapes straight into these instead of dicts.  Fields are named after their json
+# keys and the records read like the dicts they replace, so the code diffing them doesn't care which it was given.
+# Anything outside the known fields is dropped, which is why they are only asked for when the request used the
+# library's own filter.  Filters extended by a subclass decode to dicts and keep every key.  A job's builds are held on
+# to as the raw json they came in, Job.from_json() only decodes them when they read differently from the last cycle.
+# Only imported by a Decoder using msgspec
+########################################################################################################################
+from    decoding                import SHAPE_BUILD, SHAPE_BUILD_LIST, SHAPE_JOB, SHAPE_QUEUE, SHAPE_QUEUE_ITEM
+import  msgspec
+from    typing                  import Optional
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class Record(msgspec.Struct):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __getitem__(self, key:str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    ####################################################################################################################
+    # a field that was missing from the response reads as absent, like a key that isn't in a dict
+    ####################################################################################################################
+    def get(self, key:str, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __contains__(self, key:str) -> bool:
+        return getattr(self, key, None) is not None
+
+
+########################################################################################################################
+# the records that can't hold other records skip gc tracking, there are a lot of them
+########################################################################################################################
+class BuildData(Record, gc=False):
+    number:int
+    queueId:Optional[int]   = None
+    building:bool           = False
+    duration:int            = -1
+    result:Optional[str]    = None
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class JobData(Record):
+    name:Optional[str]                      = None
+    _class:Optional[str]                    = None
+    builds:msgspec.Raw                      = None
+    jobs:Optional[list['JobData']]          = None
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class ExecutableData(Record, gc=False):
+    number:int
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class QueueItemData(Record, gc=False):
+    id:Optional[int]                        = None
+    why:Optional[str]                       = None
+    cancelled:Optional[bool]                = None
+    executable:Optional[ExecutableData]     = None
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class QueueData(Record):
+    items:list[QueueItemData] = []
+
+
+########################################################################################################################
+#
+########################################################################################################################
+SHAPES:dict[str, type] = {
+    SHAPE_JOB           : JobData,
+    SHAPE_BUILD         : BuildData,
+    SHAPE_BUILD_LIST    : list[BuildData],
+    SHAPE_QUEUE         : QueueData,
+    SHAPE_QUEUE_ITEM    : QueueItemData,
+}
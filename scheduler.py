@@ -0,0 +1,134 @@
+########################################################################################################################
+#
+########################################################################################################################
+import  heapq
+from    threading               import Lock
+import  time
+from    typing                  import Hashable
+
+
+########################################################################################################################
+# keys for the host level, queue and console log queries, jobs are keyed by name so these must never be strings
+########################################################################################################################
+HOST_POLL_KEY   = None
+QUEUE_POLL_KEY  = ('queue',)
+LOG_POLL_KEY    = ('log',)
+
+
+########################################################################################################################
+# Keeps a priority queue of poll deadlines.  Keys that are active or just changed are polled on active_interval, keys
+# that came back unchanged back off exponentially until max_interval
+########################################################################################################################
+class PollScheduler:
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __init__(self, active_interval:float=.25, max_interval:float=30.0, backoff:float=2.0):
+
+        self.active_interval:float  = active_interval
+        self.max_interval:float     = max_interval
+        self.backoff:float          = backoff
+
+        self.lock:Lock = Lock()
+
+        # (deadline, sequence, key).  Entries are never removed from the middle of the heap, instead the live deadline
+        # is kept in self.deadlines and stale heap entries are skipped when popped
+        self.heap:list[tuple[float, int, Hashable]] = []
+        self.sequence:int = 0
+
+        self.deadlines:dict[Hashable, float] = {}
+        self.intervals:dict[Hashable, float] = {}
+
+        # keys that must never be polled more often than this, even while active
+        self.min_intervals:dict[Hashable, float] = {}
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __push(self, key:Hashable, deadline:float):
+        self.deadlines[key] = deadline
+        self.sequence += 1
+        heapq.heappush(self.heap, (deadline, self.sequence, key))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def __contains__(self, key:Hashable) -> bool:
+        return key in self.intervals
+
+    ####################################################################################################################
+    # poll key right away and go back to the active interval
+    ####################################################################################################################
+    def reset(self, key:Hashable):
+        with self.lock:
+            self.intervals[key] = self.active_interval
+            self.__push(key, time.monotonic())
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def remove(self, key:Hashable):
+        with self.lock:
+            self.intervals.pop(key, None)
+            self.deadlines.pop(key, None)
+            self.min_intervals.pop(key, None)
+
+    ####################################################################################################################
+    # a reset still polls key right away, but after that it waits at least interval between polls
+    ####################################################################################################################
+    def set_min_interval(self, key:Hashable, interval:float):
+        with self.lock:
+            self.min_intervals[key] = interval
+
+    ####################################################################################################################
+    # called after key was polled to work out when it should be polled again
+    ####################################################################################################################
+    def reschedule(self, key:Hashable, active:bool, changed:bool):
+        with self.lock:
+            if key not in self.intervals:
+                return
+
+            if active or changed:
+                interval = self.active_interval
+            else:
+                interval = min(self.intervals[key] * self.backoff, self.max_interval)
+
+            interval = max(interval, self.min_intervals.get(key, 0.0))
+
+            self.intervals[key] = interval
+            self.__push(key, time.monotonic() + interval)
+
+    ####################################################################################################################
+    # pop every key whose deadline has passed.  Keys stay known to the scheduler, the caller must reschedule them
+    ####################################################################################################################
+    def due(self) -> list[Hashable]:
+        now = time.monotonic()
+        keys = []
+
+        with self.lock:
+            while len(self.heap) > 0 and self.heap[0][0] <= now:
+                deadline, _, key = heapq.heappop(self.heap)
+
+                # stale entry, the key was removed or pushed again with a different deadline
+                if self.deadlines.get(key) != deadline:
+                    continue
+
+                del self.deadlines[key]
+                keys.append(key)
+
+        return keys
+
+    ####################################################################################################################
+    # seconds until the next key is due, or None if nothing is scheduled
+    ####################################################################################################################
+    def time_until_next(self) -> float:
+        with self.lock:
+            # drop stale entries so we don't wake up for nothing
+            while len(self.heap) > 0 and self.deadlines.get(self.heap[0][2]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+
+            if len(self.heap) == 0:
+                return None
+
+            return max(0.0, self.heap[0][0] - time.monotonic())
@@ -0,0 +1,199 @@
+########################################################################################################################
+# AsyncJenkins following builds on the stub in bench/stubjenkins.py from spawn to completion, and finding jobs inside
+# folders on a server that only answers with fixed pages
+#
+#   python -m pytest tests
+########################################################################################################################
+import  asyncio
+from    asyncjenkins            import AsyncJenkins
+from    bench.stubjenkins       import CRUMB, StubJenkins
+from    http.server             import BaseHTTPRequestHandler, ThreadingHTTPServer
+import  json
+from    jobinstance             import RESULT_CANCELLED, JobInstance
+from    threading               import Thread
+import  unittest
+import  urllib.request
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def completed(number:int) -> dict:
+    return {'number': number, 'queueId': number, 'building': False, 'duration': 10, 'result': 'SUCCESS'}
+
+
+########################################################################################################################
+# path -> body of a host with a job at the top, a folder and a multibranch project inside it.  With folder_depth=1 the
+# host query only sees the names in the folder, the folder and then the project are fetched on their own
+########################################################################################################################
+FOLDER_PAGES:dict[str, dict] = {
+    '/api/json': {'jobs': [
+        {'name': 'top', '_class': 'hudson.model.FreeStyleProject', 'builds': [completed(1)]},
+        {'name': 'team', '_class': 'com.cloudbees.hudson.plugins.folder.Folder', 'jobs': [{'name': 'app'}]},
+    ]},
+    '/job/team/api/json': {'jobs': [
+        {
+            'name'      : 'app',
+            '_class'    : 'org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject',
+            'jobs'      : [{'name': 'main'}, {'name': 'feature'}],
+        },
+    ]},
+    '/job/team/job/app/api/json': {'jobs': [
+        {'name': 'main',    '_class': 'WorkflowJob', 'builds': [completed(2), completed(1)]},
+        {'name': 'feature', '_class': 'WorkflowJob', 'builds': []},
+    ]},
+}
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class FolderPages(BaseHTTPRequestHandler):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def do_GET(self):
+        body = FOLDER_PAGES.get(self.path.split('?')[0])
+        content = json.dumps(body).encode() if body is not None else b''
+
+        self.send_response(200 if body is not None else 404)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def log_message(self, *args):
+        pass
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestAsyncJenkins(unittest.IsolatedAsyncioTestCase):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def setUp(self):
+        self.stub = StubJenkins(jobs=3, queue_delay=0.2, build_duration=0.3).start()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def tearDown(self):
+        self.stub.stop()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def client(self) -> AsyncJenkins:
+        return AsyncJenkins(self.stub.url, 'user', password='password', active_poll_interval=0.05)
+
+    ####################################################################################################################
+    # resolves once inst completes, the poller runs on this loop so the done callbacks do too
+    ####################################################################################################################
+    @staticmethod
+    async def completion(inst:JobInstance, timeout:float=10.0):
+        done = asyncio.Event()
+        inst.add_done_callback(lambda _: done.set())
+
+        await asyncio.wait_for(done.wait(), timeout)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def test_discovers_jobs(self):
+        async with self.client() as jenkins:
+            await asyncio.wait_for(jenkins.wait_initialized(), 10.0)
+
+            self.assertEqual(sorted(jenkins.job_list()), ['job0', 'job1', 'job2'])
+            self.assertEqual(len(jenkins.get_job('job0').instances), 5)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def test_spawn_to_completion(self):
+        async with self.client() as jenkins:
+            await asyncio.wait_for(jenkins.wait_initialized(), 10.0)
+
+            updates = []
+            inst    = await jenkins.start_job_instance(
+                'job1',
+                status_callback=lambda i: updates.append((i.build_id, i.building, i.complete))
+            )
+
+            self.assertIsNotNone(inst)
+            self.assertIsNone(inst.build_id)
+
+            await self.completion(inst)
+
+            self.assertEqual(inst.build_id, 6)
+            self.assertEqual(inst.result, 'SUCCESS')
+            self.assertIs(jenkins.get_job('job1').find_instance(build_id=6), inst)
+            self.assertEqual(updates[-1], (6, False, True))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def test_cancelled_queue_item_completes(self):
+        self.stub.state.queue_delay = 60.0
+
+        async with self.client() as jenkins:
+            await asyncio.wait_for(jenkins.wait_initialized(), 10.0)
+
+            inst = await jenkins.start_job_instance('job2')
+
+            request = urllib.request.Request(
+                f'{self.stub.url}/queue/cancelItem?id={inst.queue_id}',
+                method='POST',
+                headers={'Jenkins-Crumb': CRUMB}
+            )
+            await asyncio.to_thread(urllib.request.urlopen, request)
+
+            await self.completion(inst)
+
+            self.assertEqual(inst.result, RESULT_CANCELLED)
+            self.assertIsNone(inst.build_id)
+            self.assertEqual(len(jenkins.queue_tracker), 0)
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestAsyncJenkinsFolders(unittest.IsolatedAsyncioTestCase):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FolderPages)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    async def test_discovers_jobs_in_folders(self):
+        url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+        async with AsyncJenkins(url, 'user', password='password', folder_depth=1) as jenkins:
+            await asyncio.wait_for(jenkins.wait_initialized(), 10.0)
+
+            self.assertEqual(sorted(jenkins.job_list()), ['team/app/feature', 'team/app/main', 'top'])
+            self.assertEqual(sorted(i.build_id for i in jenkins.get_job('team/app/main').instances), [1, 2])
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    unittest.main()
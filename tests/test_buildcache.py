@@ -0,0 +1,94 @@
+########################################################################################################################
+# BuildCache on a throwaway database, and a Job hydrating its completed builds from it
+#
+#   python -m pytest tests
+########################################################################################################################
+from    api.jenkinsapi          import JenkinsAPI
+from    buildcache              import BuildCache
+from    job                     import Job
+from    network.communicator    import Communicator
+import  os
+import  tempfile
+import  time
+import  unittest
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestBuildCache(unittest.TestCase):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path   = os.path.join(directory.name, 'builds.sqlite')
+        self.cache  = BuildCache(path=self.path, controller='http://jenkins')
+        self.addCleanup(self.cache.close)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_properties_are_kept_with_the_build(self):
+        self.cache.put('job0', number=3, queue_id=30, duration=100, result='SUCCESS')
+        self.cache.put_property('job0', 3, 'url', 'http://jenkins/job/job0/3/')
+        self.cache.put_property('job0', 3, 'timestamp', 123)
+
+        # written again, say by a second client, the properties stay
+        self.cache.put('job0', number=3, queue_id=30, duration=100, result='SUCCESS')
+
+        self.assertEqual(
+            self.cache.load('job0', limit=10),
+            [(3, 30, 100, 'SUCCESS', {'url': 'http://jenkins/job/job0/3/', 'timestamp': 123})]
+        )
+
+    ####################################################################################################################
+    # a property of a build that was never stored doesn't make a row of its own
+    ####################################################################################################################
+    def test_property_needs_a_stored_build(self):
+        self.cache.put_property('job0', 4, 'url', 'http://jenkins/job/job0/4/')
+
+        self.assertEqual(self.cache.load('job0', limit=10), [])
+        self.assertEqual(self.cache.connection.execute('SELECT COUNT(*) FROM builds').fetchone()[0], 0)
+
+    ####################################################################################################################
+    # rows like the ones put_property used to make are left out
+    ####################################################################################################################
+    def test_rows_without_a_result_are_not_loaded(self):
+        self.cache.put('job0', number=1, queue_id=10, duration=100, result='SUCCESS')
+        self.cache.connection.execute(
+            'INSERT INTO builds (controller, job, number, properties, stored) VALUES (?, ?, ?, ?, ?)',
+            ('http://jenkins', 'job0', 2, '{"url": "x"}', time.time())
+        )
+
+        self.assertEqual([row[0] for row in self.cache.load('job0', limit=10)], [1])
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_job_hydrates_completed_builds(self):
+        self.cache.put('job0', number=1, queue_id=10, duration=100, result='FAILURE')
+        self.cache.put('job0', number=2, queue_id=20, duration=200, result='SUCCESS')
+        self.cache.put_property('job0', 2, 'url', 'http://jenkins/job/job0/2/')
+        self.cache.put_property('job0', 5, 'url', 'http://jenkins/job/job0/5/')
+
+        api = JenkinsAPI(url_base='http://127.0.0.1:9', communicator=Communicator(username='user', password='pw'))
+        job = Job(name='job0', api=api, build_cache=self.cache)
+
+        self.assertEqual(sorted(i.build_id for i in job.instances), [1, 2])
+
+        inst = job.find_instance(build_id=2)
+        self.assertTrue(inst.complete)
+        self.assertEqual(inst.result, 'SUCCESS')
+        self.assertEqual(inst.duration_in_ms, 200)
+        self.assertEqual(inst.get_build_property('url'), 'http://jenkins/job/job0/2/')
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    unittest.main()
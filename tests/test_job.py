@@ -0,0 +1,141 @@
+########################################################################################################################
+# Job diffing builds against the instances it tracks, without a server: instances that leave the queue unseen and
+# instances that complete without ever becoming a build
+#
+#   python -m pytest tests
+########################################################################################################################
+from    api.jenkinsapi          import JenkinsAPI
+from    job                     import Job
+from    jobinstance             import RESULT_CANCELLED, RESULT_UNKNOWN, JobInstance
+from    network.communicator    import Communicator
+from    requests.models         import Response
+import  unittest
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def response(status_code:int, location:str=None) -> Response:
+    resp = Response()
+    resp.status_code = status_code
+    resp._content = b''
+
+    if location is not None:
+        resp.headers['Location'] = location
+
+    return resp
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def build(number:int, queue_id:int, result:str=None) -> dict:
+    return {'number': number, 'queueId': queue_id, 'building': result is None, 'duration': 0, 'result': result}
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestJob(unittest.TestCase):
+
+    ####################################################################################################################
+    # nothing here talks to the url
+    ####################################################################################################################
+    def setUp(self):
+        self.api = JenkinsAPI(url_base='http://127.0.0.1:9', communicator=Communicator(username='user', password='pw'))
+        self.job = Job(name='job0', api=self.api, max_history=3)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def spawn(self, queue_id:int) -> JobInstance:
+        return self.job.from_spawn_response(response(201, location=f'http://127.0.0.1:9/queue/item/{queue_id}/'))
+
+    ####################################################################################################################
+    # Jenkins forgot the queue item, most likely after it started.  That says nothing about whether it was cancelled
+    ####################################################################################################################
+    def test_forgotten_queue_item_is_claimed_by_its_build(self):
+        inst = self.spawn(100)
+
+        self.assertFalse(inst.from_queue_response(response(404)))
+        self.assertFalse(inst.complete)
+        self.assertIn(inst, self.job.store.orphans)
+
+        self.assertTrue(self.job.from_json({'builds': [build(7, 100), build(6, 99, 'SUCCESS')]}))
+
+        self.assertEqual(inst.build_id, 7)
+        self.assertTrue(inst.building)
+        self.assertIsNone(inst.result)
+        self.assertEqual(len(self.job.store.orphans), 0)
+
+    ####################################################################################################################
+    # an orphan no build claims completes, but it isn't known to have been cancelled
+    ####################################################################################################################
+    def test_unclaimed_orphan_completes_unknown(self):
+        inst = self.spawn(100)
+        inst.from_queue_response(response(404))
+
+        self.job.from_json({'builds': [build(6, 99, 'SUCCESS')]})
+
+        self.assertTrue(inst.complete)
+        self.assertIsNone(inst.build_id)
+        self.assertEqual(inst.result, RESULT_UNKNOWN)
+        self.assertEqual(len(self.job.store.orphans), 0)
+
+    ####################################################################################################################
+    # the builds reading the same as last time doesn't skip resolving an orphan
+    ####################################################################################################################
+    def test_orphan_resolved_when_builds_are_unchanged(self):
+        self.job.from_json({'builds': [build(6, 99, 'SUCCESS')]})
+
+        inst = self.spawn(100)
+        self.job.from_json({'builds': [build(6, 99, 'SUCCESS')]})
+
+        inst.from_queue_response(response(404))
+        self.job.from_json({'builds': [build(6, 99, 'SUCCESS')]})
+
+        self.assertEqual(inst.result, RESULT_UNKNOWN)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_cancelled_queue_item_completes(self):
+        inst = self.spawn(100)
+
+        self.assertTrue(inst.from_queue_json({'id': 100, 'why': None, 'cancelled': True}))
+
+        self.assertTrue(inst.complete)
+        self.assertEqual(inst.result, RESULT_CANCELLED)
+
+    ####################################################################################################################
+    # complete instances without a build number are bounded on their own, evict() only goes by build number
+    ####################################################################################################################
+    def test_unbuilt_instances_are_bounded(self):
+        spawned = [self.spawn(100 + i) for i in range(5)]
+
+        for inst in spawned:
+            inst.from_queue_json({'id': inst.queue_id, 'why': None, 'cancelled': True})
+
+        self.assertEqual(len(self.job.store), 3)
+        self.assertEqual([i for i in self.job.store], spawned[2:])
+        self.assertIsNone(self.job.find_instance(queue_id=100))
+        self.assertIs(self.job.find_instance(queue_id=104), spawned[4])
+
+    ####################################################################################################################
+    # and don't push builds out of the history either
+    ####################################################################################################################
+    def test_unbuilt_instances_leave_builds_alone(self):
+        self.job.from_json({'builds': [build(n, n, 'SUCCESS') for n in (3, 2, 1)]})
+
+        for queue_id in (100, 101):
+            self.spawn(queue_id).from_queue_json({'id': queue_id, 'why': None, 'cancelled': True})
+
+        self.assertEqual(sorted(i.build_id for i in self.job.store if i.build_id is not None), [1, 2, 3])
+        self.assertEqual(len(self.job.store), 5)
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    unittest.main()
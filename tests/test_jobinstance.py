@@ -0,0 +1,127 @@
+########################################################################################################################
+# JobInstance filters: the shared class filters, overriding them on one instance and in a subclass, and decoding the
+# builds fetched with either
+#
+#   python -m pytest tests
+########################################################################################################################
+from    api.jenkinsapi          import JenkinsAPI
+from    api.tree.filterlist     import FilterList
+from    decoding                import Decoder
+import  json
+from    jobinstance             import JobInstance
+from    network.communicator    import Communicator
+from    requests.models         import Response
+import  unittest
+
+
+########################################################################################################################
+#
+########################################################################################################################
+def build_response(**build) -> Response:
+    resp = Response()
+    resp.status_code = 200
+    resp._content = json.dumps(build).encode()
+
+    return resp
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class DetailedInstance(JobInstance):
+    build_filters = FilterList()\
+        .with_filter('building')\
+        .with_filter('duration')\
+        .with_filter('number')\
+        .with_filter('result')\
+        .with_filter('timestamp')\
+        .compile()
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestJobInstanceFilters(unittest.TestCase):
+
+    ####################################################################################################################
+    # every backend, the msgspec one decodes the default filters' responses into records.  Nothing talks to the url
+    ####################################################################################################################
+    def apis(self) -> list[JenkinsAPI]:
+        return [
+            JenkinsAPI(
+                url_base='http://127.0.0.1:9',
+                communicator=Communicator(username='user', password='pw'),
+                decoder=Decoder(backend)
+            )
+            for backend in ('msgspec', 'json')
+        ]
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_defaults_are_shared(self):
+        api     = self.apis()[0]
+        first   = JobInstance(api=api, job_name='job0', build_id=1)
+        second  = JobInstance(api=api, job_name='job0', build_id=2)
+
+        self.assertIs(first.build_filters, JobInstance.BUILD_FILTERS)
+        self.assertIs(second.queue_filter, JobInstance.QUEUE_FILTER)
+        self.assertFalse(hasattr(first, '__dict__'))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_override_on_one_instance(self):
+        api         = self.apis()[0]
+        inst        = JobInstance(api=api, job_name='job0', build_id=1)
+        other       = JobInstance(api=api, job_name='job0', build_id=2)
+        filters     = FilterList().with_filter('number').with_filter('building').with_filter('url')
+
+        inst.build_filters  = filters
+        inst.queue_filter   = filters.compile()
+
+        self.assertEqual(str(inst.build_filters), str(filters))
+        self.assertEqual(str(inst.queue_filter), str(filters))
+        self.assertIs(other.build_filters, JobInstance.BUILD_FILTERS)
+        self.assertIs(other.queue_filter, JobInstance.QUEUE_FILTER)
+
+        inst.build_filters = None
+        self.assertIs(inst.build_filters, JobInstance.BUILD_FILTERS)
+
+    ####################################################################################################################
+    # a response to a filter other than the default one may carry fields the records don't have
+    ####################################################################################################################
+    def test_builds_decode_with_any_filter(self):
+        for api in self.apis():
+            for make in (
+                lambda: JobInstance(api=api, job_name='job0', build_id=4),
+                lambda: DetailedInstance(api=api, job_name='job0', build_id=4),
+                lambda: self.overridden(api),
+            ):
+                inst = make()
+
+                with self.subTest(backend=api.decoder.backend, filters=str(inst.build_filters)):
+                    self.assertTrue(inst.from_build_response(build_response(
+                        number=4, queueId=40, building=False, duration=50, result='SUCCESS', timestamp=123
+                    )))
+
+                    self.assertTrue(inst.complete)
+                    self.assertEqual(inst.result, 'SUCCESS')
+                    self.assertEqual(inst.duration_in_ms, 50)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    @staticmethod
+    def overridden(api:JenkinsAPI) -> JobInstance:
+        inst = JobInstance(api=api, job_name='job0', build_id=4)
+        inst.build_filters = DetailedInstance.build_filters
+
+        return inst
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    unittest.main()
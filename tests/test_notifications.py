@@ -0,0 +1,155 @@
+########################################################################################################################
+# Jenkins fed by its notification receiver: synthetic Notification plugin events posted to it for each phase of a
+# build, and the ones it has to turn away.  The stub in bench/stubjenkins.py only answers the polls, it knows nothing
+# of the builds the events are about
+#
+#   python -m pytest tests
+########################################################################################################################
+from    bench.stubjenkins       import StubJenkins
+import  json
+from    jenkins                 import Jenkins
+import  unittest
+import  urllib.error
+import  urllib.request
+
+
+TOKEN = 'notification-token'
+
+
+########################################################################################################################
+#
+########################################################################################################################
+class TestNotifications(unittest.TestCase):
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def setUp(self):
+        self.stub = StubJenkins(jobs=2).start()
+        self.addCleanup(self.stub.stop)
+
+        self.jenkins = Jenkins(
+            self.stub.url,
+            'user',
+            password='password',
+            notification_port=0,
+            notification_token=TOKEN
+        )
+        self.addCleanup(self.jenkins.stop)
+
+        self.assertTrue(self.jenkins.wait_initialized(10.0))
+
+    ####################################################################################################################
+    # returns the status code the receiver answered with
+    ####################################################################################################################
+    def post(self, body, url:str=None) -> int:
+        data    = body if isinstance(body, bytes) else json.dumps(body).encode()
+        request = urllib.request.Request(url or self.jenkins.notification_receiver.url, data=data, method='POST')
+
+        try:
+            with urllib.request.urlopen(request, timeout=5.0) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    ####################################################################################################################
+    # the payload the plugin sends for job0
+    ####################################################################################################################
+    @staticmethod
+    def event(phase:str, queue_id:int=500, number:int=6, **build) -> dict:
+        return {
+            'name'  : 'job0',
+            'url'   : 'job/job0/',
+            'build' : {'phase': phase, 'queue_id': queue_id, 'number': number, **build},
+        }
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_build_phases(self):
+        job = self.jenkins.get_job('job0')
+
+        self.assertEqual(self.post(self.event('QUEUED', number=1)), 200)
+
+        inst = job.find_instance(queue_id=500)
+        self.assertIsNotNone(inst)
+        self.assertIsNone(inst.build_id)
+        self.assertTrue(inst.in_queue)
+
+        self.assertEqual(self.post(self.event('STARTED')), 200)
+
+        self.assertIs(job.find_instance(build_id=6), inst)
+        self.assertFalse(inst.in_queue)
+        self.assertTrue(inst.building)
+        self.assertFalse(inst.complete)
+
+        self.assertEqual(self.post(self.event('COMPLETED', status='FAILURE', duration=1234)), 200)
+
+        self.assertTrue(inst.complete)
+        self.assertEqual(inst.result, 'FAILURE')
+        self.assertEqual(inst.duration_in_ms, 1234)
+
+        # the last word on a build the plugin already reported as completed changes nothing
+        self.assertEqual(self.post(self.event('FINALIZED', status='SUCCESS')), 200)
+
+        self.assertEqual(inst.result, 'FAILURE')
+        self.assertEqual(len([i for i in job.instances if i.queue_id == 500]), 1)
+
+    ####################################################################################################################
+    # the STARTED event was lost, the next one still puts the build where it belongs
+    ####################################################################################################################
+    def test_missed_started(self):
+        job = self.jenkins.get_job('job0')
+
+        self.post(self.event('QUEUED', number=1))
+        self.post(self.event('FINALIZED', status='SUCCESS', duration=10))
+
+        inst = job.find_instance(queue_id=500)
+        self.assertEqual(inst.build_id, 6)
+        self.assertTrue(inst.complete)
+        self.assertEqual(inst.result, 'SUCCESS')
+
+    ####################################################################################################################
+    # a build we never heard of is picked up from whichever event comes first
+    ####################################################################################################################
+    def test_unknown_build_is_added(self):
+        self.assertEqual(self.post(self.event('STARTED', queue_id=700, number=9)), 200)
+
+        inst = self.jenkins.get_job('job0').find_instance(build_id=9)
+        self.assertIsNotNone(inst)
+        self.assertTrue(inst.building)
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_wrong_token_is_forbidden(self):
+        receiver    = self.jenkins.notification_receiver
+        url         = f'http://127.0.0.1:{receiver.port}'
+
+        self.assertEqual(self.post(self.event('STARTED'), url=f'{url}/wrong'), 403)
+        self.assertEqual(self.post(self.event('STARTED'), url=f'{url}/'), 403)
+
+        self.assertIsNone(self.jenkins.get_job('job0').find_instance(queue_id=500))
+
+    ####################################################################################################################
+    #
+    ####################################################################################################################
+    def test_malformed_body_is_rejected(self):
+        for body in (
+            b'{"name": "job0", "build": ',
+            b'[1, 2, 3]',
+            {'name': 'job0'},
+            {'build': {'phase': 'STARTED', 'number': 6}},
+            self.event('STARTED', number='six'),
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body), 400)
+
+        self.assertIsNone(self.jenkins.get_job('job0').find_instance(queue_id=500))
+
+
+########################################################################################################################
+#
+########################################################################################################################
+if __name__ == '__main__':
+    unittest.main()